@@ -182,6 +182,6 @@ if __name__ == "__main__":
     for i_count in range(counter+1):
         s_name = 'hft_sp_2contracts_multiple_' + str(i_count)
         analyst.add_strategy(s_name, folder="./outputs_bt/" +s_name +"/", init_capital=500000, rf=0.02, annual_trading_days=240)    
-    analyst.run_multiple(outname='bt_backtest')
+    analyst.run_multiple(outname='bt_backtest', bSegments=True)
     kw = input('press any key to exit\n')
     
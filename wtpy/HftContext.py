@@ -1,10 +1,12 @@
 from pandas import DataFrame as df
 import pandas as pd
+import numpy as np
 import os
 import json
 
 from wtpy.wrapper import WtWrapper
-from wtpy.WtDataDefs import WtKlineData, WtHftData
+from wtpy.WtDataDefs import WtKlineData, WtHftColumnData
+from wtpy.WtCoreDefs import HFT_TICK_DTYPE, HFT_TICK_LEVELS, HFT_ORDQUE_DTYPE, HFT_ORDDTL_DTYPE, HFT_TRANS_DTYPE
 
 class HftContext:
     '''
@@ -62,19 +64,17 @@ class HftContext:
         '''
         self.__stra_info__.on_backtest_end(self)
 
-    def on_getticks(self, stdCode:str, newTicks:list, isLast:bool):
+    def on_getticks(self, stdCode:str, newTicks:np.ndarray, isLast:bool):
         key = stdCode
 
         ticks = self.__tick_cache__[key]
-        for newTick in newTicks:
-            ticks.append_item(newTick)
+        ticks.append_items(newTicks)
 
-    def on_getbars(self, stdCode:str, period:str, newBars:list, isLast:bool):
+    def on_getbars(self, stdCode:str, period:str, newBars:np.ndarray, isLast:bool):
         key = "%s#%s" % (stdCode, period)
 
         bars = self.__bar_cache__[key]
-        for newBar in newBars:
-            bars.append_bar(newBar)
+        bars.append_bars(newBars)
 
     def on_tick(self, stdCode:str, newTick:dict):
         self.__stra_info__.on_tick(self, stdCode, newTick)
@@ -82,29 +82,26 @@ class HftContext:
     def on_order_queue(self, stdCode:str, newOrdQue:dict):
         self.__stra_info__.on_order_queue(self, stdCode, newOrdQue)
 
-    def on_get_order_queue(self, stdCode:str, newOdrQues:list, isLast:bool):
+    def on_get_order_queue(self, stdCode:str, newOdrQues:np.ndarray, isLast:bool):
         key = stdCode
         items = self.__ordque_cache__[key]
-        for newItem in newOdrQues:
-            items.append_item(newItem)
+        items.append_items(newOdrQues)
 
     def on_order_detail(self, stdCode:str, newOrdDtl:dict):
         self.__stra_info__.on_order_detail(self, stdCode, newOrdDtl)
 
-    def on_get_order_detail(self, stdCode:str, newOrdDtls:list, isLast:bool):
+    def on_get_order_detail(self, stdCode:str, newOrdDtls:np.ndarray, isLast:bool):
         key = stdCode
         items = self.__orddtl_cache__[key]
-        for newItem in newOrdDtls:
-            items.append_item(newItem)
+        items.append_items(newOrdDtls)
 
     def on_transaction(self, stdCode:str, newTrans:dict):
         self.__stra_info__.on_transaction(self, stdCode, newTrans)
 
-    def on_get_transaction(self, stdCode:str, newTranses:list, isLast:bool):
+    def on_get_transaction(self, stdCode:str, newTranses:np.ndarray, isLast:bool):
         key = stdCode
         items = self.__trans_cache__[key]
-        for newItem in newTranses:
-            items.append_item(newItem)
+        items.append_items(newTranses)
 
     def on_channel_ready(self):
         self.__stra_info__.on_channel_ready(self)
@@ -121,15 +118,17 @@ class HftContext:
     def on_trade(self, localid:int, stdCode:str, isBuy:bool, qty:float, price:float, userTag:str):
         self.__stra_info__.on_trade(self, localid, stdCode, isBuy, qty, price, userTag)
 
-    def on_bar(self, code:str, period:str, newBar:dict):
+    def on_bar(self, code:str, period:str, newBar:dict, key:str = None):
         '''
         K线闭合事件响应
         @code   品种代码
         @period K线基础周期
         @times  周期倍数
         @newBar 最新K线
+        @key    K线缓存的key，为None时根据代码和周期生成
         '''        
-        key = "%s#%s" % (code, period)
+        if key is None:
+            key = "%s#%s" % (code, period)
 
         if key not in self.__bar_cache__:
             return
@@ -202,13 +201,13 @@ class HftContext:
 
         return df_bars
 
-    def stra_get_ticks(self, code:str, count:int) -> WtHftData:
+    def stra_get_ticks(self, code:str, count:int) -> WtHftColumnData:
         '''
         获取tick数据
         @code   合约代码
         @count  要拉取的tick数量
         '''
-        self.__tick_cache__[code] = WtHftData(capacity=count)
+        self.__tick_cache__[code] = WtHftColumnData(capacity=count, dtype=HFT_TICK_DTYPE, levels=HFT_TICK_LEVELS)
         cnt = self.__wrapper__.hft_get_ticks(self.__id__, code, count)
         if cnt == 0:
             return None
@@ -216,13 +215,13 @@ class HftContext:
         hftData = self.__tick_cache__[code]
         return hftData
 
-    def stra_get_order_queue(self, code:str, count:int) -> WtHftData:
+    def stra_get_order_queue(self, code:str, count:int) -> WtHftColumnData:
         '''
         获取委托队列数据
         @code   合约代码
         @count  要拉取的tick数量
         '''
-        self.__ordque_cache__[code] = WtHftData(capacity=count)
+        self.__ordque_cache__[code] = WtHftColumnData(capacity=count, dtype=HFT_ORDQUE_DTYPE)
         cnt = self.__wrapper__.hft_get_ordque(self.__id__, code, count)
         if cnt == 0:
             return None
@@ -230,13 +229,13 @@ class HftContext:
         hftData = self.__ordque_cache__[code]
         return hftData
 
-    def stra_get_order_detail(self, code:str, count:int) -> WtHftData:
+    def stra_get_order_detail(self, code:str, count:int) -> WtHftColumnData:
         '''
         获取逐笔委托数据
         @code   合约代码
         @count  要拉取的tick数量
         '''
-        self.__orddtl_cache__[code] = WtHftData(capacity=count)
+        self.__orddtl_cache__[code] = WtHftColumnData(capacity=count, dtype=HFT_ORDDTL_DTYPE)
         cnt = self.__wrapper__.hft_get_orddtl(self.__id__, code, count)
         if cnt == 0:
             return None
@@ -244,13 +243,13 @@ class HftContext:
         hftData = self.__orddtl_cache__[code]
         return hftData
 
-    def stra_get_transaction(self, code:str, count:int) -> WtHftData:
+    def stra_get_transaction(self, code:str, count:int) -> WtHftColumnData:
         '''
         获取逐笔成交数据
         @code   合约代码
         @count  要拉取的tick数量
         '''
-        self.__trans_cache__[code] = WtHftData(capacity=count)
+        self.__trans_cache__[code] = WtHftColumnData(capacity=count, dtype=HFT_TRANS_DTYPE)
         cnt = self.__wrapper__.hft_get_trans(self.__id__, code, count)
         if cnt == 0:
             return None
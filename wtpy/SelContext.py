@@ -1,10 +1,12 @@
 from pandas import DataFrame as df
 import pandas as pd
+import numpy as np
 import os
 import json
 
 from wtpy.wrapper import WtWrapper
-from wtpy.WtDataDefs import WtKlineData, WtHftData
+from wtpy.WtDataDefs import WtKlineData, WtHftColumnData
+from wtpy.WtCoreDefs import HFT_TICK_DTYPE, HFT_TICK_LEVELS
 
 class SelContext:
     '''
@@ -65,29 +67,27 @@ class SelContext:
         '''
         self.__stra_info__.on_backtest_end(self)
 
-    def on_getticks(self, stdCode:str, newTicks:list, isLast:bool):
+    def on_getticks(self, stdCode:str, newTicks:np.ndarray, isLast:bool):
         key = stdCode
 
         ticks = self.__tick_cache__[key]
-        for newTick in newTicks:
-            ticks.append_item(newTick)
+        ticks.append_items(newTicks)
 
     def on_getpositions(self, stdCode:str, qty:float, isLast:bool):
         if len(stdCode) == 0:
             return
         self.__pos_cache__[stdCode] = qty
 
-    def on_getbars(self, stdCode:str, period:str, newBars:list, isLast:bool):
+    def on_getbars(self, stdCode:str, period:str, newBars:np.ndarray, isLast:bool):
         key = "%s#%s" % (stdCode, period)
 
         bars = self.__bar_cache__[key]
-        for newBar in newBars:
-            bars.append_bar(newBar)
+        bars.append_bars(newBars)
 
     def on_tick(self, stdCode:str, newTick):
         self.__stra_info__.on_tick(self, stdCode, newTick)
 
-    def on_bar(self, stdCode:str, period:str, newBar:dict):
+    def on_bar(self, stdCode:str, period:str, newBar:dict, key:str = None):
         pass
 
     def on_calculate(self):
@@ -155,14 +155,14 @@ class SelContext:
 
         return df_bars
 
-    def stra_get_ticks(self, stdCode:str, count:int) -> WtHftData:
+    def stra_get_ticks(self, stdCode:str, count:int) -> WtHftColumnData:
         '''
         获取tick数据
         @stdCode   合约代码
         @count  要拉取的tick数量
         '''
-        self.__bar_cache__[stdCode] = WtHftData(capacity=count)
-        cnt = self.__wrapper__.cta_get_ticks(self.__id__, stdCode, count)
+        self.__tick_cache__[stdCode] = WtHftColumnData(capacity=count, dtype=HFT_TICK_DTYPE, levels=HFT_TICK_LEVELS)
+        cnt = self.__wrapper__.sel_get_ticks(self.__id__, stdCode, count)
         if cnt == 0:
             return None
         
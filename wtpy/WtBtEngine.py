@@ -12,6 +12,7 @@ from .SessionMgr import SessionMgr, SessionInfo
 from .ContractMgr import ContractMgr, ContractInfo
 
 from .CodeHelper import CodeHelper
+from .WtBtOutputs import convert_outputs
 
 import os
 import json
@@ -31,6 +32,7 @@ class WtBtEngine:
         self.__idx_writer__ = None  #指标输出模块
 
         self.__dump_config__ = bDumpCfg #是否保存最终配置
+        self.__output_format__ = None   #回测结果的二进制输出格式
 
         if eType == eType.ET_CTA:
             self.__wrapper__.initialize_cta(logCfg, isFile)   #初始化CTA环境
@@ -57,6 +59,14 @@ class WtBtEngine:
             self.__config__["env"] = dict()
             self.__config__["env"]["mocker"] = "cta"
 
+    def enable_light_tick(self, bEnabled:bool = True):
+        '''
+        启用轻量级tick对象\n
+        启用以后策略on_tick收到的是WtTickData而不是dict，字段在访问时才解析，只读取price、time等少数字段的策略开销会小很多\n
+        WtTickData同样支持newTick["price"]的写法
+        '''
+        self.__wrapper__.enable_light_tick(bEnabled)
+
     def set_writer(self, writer:BaseIndexWriter):
         '''
         设置指标输出模块
@@ -254,6 +264,26 @@ class WtBtEngine:
     def get_context(self, id:int):
         return self.__context__
 
+    def set_output_format(self, fmt:str = "npz"):
+        '''
+        设置回测结果的二进制输出格式\n
+        同步回测结束后会把outputs_bt下的csv结果转存一份，后续分析时优先读取二进制文件\n
+        @fmt    parquet、feather或者npz，为None则只输出csv
+        '''
+        self.__output_format__ = fmt
+
+    def __get_stra_name__(self) -> str:
+        '''
+        获取当前回测的策略名称
+        '''
+        if self.__context__ is not None:
+            return self.__context__.__stra_info__.name()
+
+        for key in ["cta", "hft", "sel"]:
+            if key in self.__config__ and "strategy" in self.__config__[key]:
+                return self.__config__[key]["strategy"]["id"]
+        return None
+
     def run_backtest(self, bAsync:bool = False, bNeedDump:bool = True):
         '''
         运行框架
@@ -265,6 +295,12 @@ class WtBtEngine:
 
         self.__wrapper__.run_backtest(bNeedDump = bNeedDump, bAsync = bAsync)
 
+        # 异步回测时结果还没有输出，只有同步回测可以直接转存
+        if self.__output_format__ is not None and not bAsync and bNeedDump:
+            straName = self.__get_stra_name__()
+            if straName is not None:
+                convert_outputs("./outputs_bt/%s/" % (straName), self.__output_format__)
+
     def cta_step(self, remark:str = "") -> bool:
         '''
         CTA策略单步执行
@@ -0,0 +1,158 @@
+'''
+回测输出文件的读写模块\n
+回测引擎输出的trades.csv、closes.csv、funds.csv、signals.csv可以转存为parquet、feather或者npz格式\n
+读取时优先使用不比csv旧的二进制文件，没有则透明地回退到csv
+'''
+import os
+import numpy as np
+import pandas as pd
+from pandas import DataFrame as df
+
+try:
+    import pyarrow
+    has_arrow = True
+except ImportError:
+    has_arrow = False
+
+OUTPUT_NAMES = ["trades", "closes", "funds", "signals"]
+
+# 读取时的优先顺序
+OUTPUT_FORMATS = ["parquet", "feather", "npz", "csv"]
+
+# npz中文本列空值掩码的前缀
+NA_PREFIX = "__na__"
+
+def get_formats() -> list:
+    '''
+    当前环境可用的输出格式，parquet和feather依赖pyarrow
+    '''
+    if has_arrow:
+        return OUTPUT_FORMATS
+    return ["npz", "csv"]
+
+def output_path(folder:str, name:str, fmt:str = "csv") -> str:
+    '''
+    输出文件路径\n
+    @folder 输出目录，如./outputs_bt/name/\n
+    @name   文件名，不带扩展名，如funds\n
+    @fmt    文件格式
+    '''
+    return os.path.join(folder, "%s.%s" % (name, fmt))
+
+def write_output(data:df, folder:str, name:str, fmt:str = "npz") -> str:
+    '''
+    将数据写入二进制文件\n
+    @data   要写入的数据\n
+    @fmt    文件格式，parquet、feather或者npz，没有安装pyarrow时自动改为npz\n
+    @return 写入的文件路径
+    '''
+    if fmt not in OUTPUT_FORMATS:
+        raise Exception("unsupported output format: %s" % (fmt))
+
+    if fmt in ["parquet", "feather"] and not has_arrow:
+        print("pyarrow not installed, %s falls back to npz" % (fmt))
+        fmt = "npz"
+
+    filename = output_path(folder, name, fmt)
+    if fmt == "csv":
+        data.to_csv(filename, index=False)
+    elif fmt == "parquet":
+        data.to_parquet(filename, index=False)
+    elif fmt == "feather":
+        data.reset_index(drop=True).to_feather(filename)
+    else:
+        # 文本列转成定长unicode数组，读取时不需要pickle
+        # 空值单独存一个掩码，读取时还原成NaN，和csv读出来的一致
+        arrays = dict()
+        for col in data.columns:
+            values = data[col].to_numpy()
+            if values.dtype.kind not in "biufM":
+                mask = data[col].isna().to_numpy()
+                values = data[col].fillna("").astype(str).to_numpy().astype(str)
+                if mask.any():
+                    arrays[NA_PREFIX + col] = mask
+            arrays[col] = values
+        arrays["__columns__"] = np.array(data.columns, dtype=str)
+        np.savez(filename, **arrays)
+    return filename
+
+def convert_outputs(folder:str, fmt:str = "npz", names:list = OUTPUT_NAMES, bRemoveCsv:bool = False) -> list:
+    '''
+    将目录下的csv输出文件转存为二进制格式，已经是最新的文件会跳过\n
+    @folder     输出目录\n
+    @fmt        文件格式，parquet、feather或者npz\n
+    @names      要转换的文件名\n
+    @bRemoveCsv 转换完成后是否删除csv文件\n
+    @return 转换过的文件名
+    '''
+    if fmt in ["parquet", "feather"] and not has_arrow:
+        fmt = "npz"
+
+    converted = list()
+    for name in names:
+        csvfile = output_path(folder, name, "csv")
+        if not os.path.exists(csvfile):
+            continue
+
+        target = output_path(folder, name, fmt)
+        if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(csvfile):
+            write_output(pd.read_csv(csvfile), folder, name, fmt)
+            converted.append(name)
+
+        if bRemoveCsv:
+            os.remove(csvfile)
+    return converted
+
+def find_output(folder:str, name:str) -> tuple:
+    '''
+    查找可以读取的输出文件\n
+    @return (文件路径, 格式)，没有找到则为(None, None)
+    '''
+    csvfile = output_path(folder, name, "csv")
+    csvtime = os.path.getmtime(csvfile) if os.path.exists(csvfile) else None
+    for fmt in get_formats()[:-1]:
+        filename = output_path(folder, name, fmt)
+        if not os.path.exists(filename):
+            continue
+
+        # 二进制文件比csv旧，说明回测重新跑过，要以csv为准
+        if csvtime is not None and os.path.getmtime(filename) < csvtime:
+            continue
+        return filename, fmt
+
+    if csvtime is not None:
+        return csvfile, "csv"
+    return None, None
+
+def read_output(folder:str, name:str, usecols:list = None) -> df:
+    '''
+    读取回测输出文件\n
+    @folder     输出目录，如./outputs_bt/name/\n
+    @name       文件名，不带扩展名，如funds\n
+    @usecols    只读取的列，为None则读取全部列\n
+    @return 数据，文件不存在则为None
+    '''
+    filename, fmt = find_output(folder, name)
+    if filename is None:
+        return None
+
+    if fmt == "parquet":
+        return pd.read_parquet(filename, columns=usecols)
+    elif fmt == "feather":
+        return pd.read_feather(filename, columns=usecols)
+    elif fmt == "npz":
+        # npz是按列延迟加载的，只读取需要的列
+        with np.load(filename, allow_pickle=False) as data:
+            columns = [str(col) for col in data["__columns__"]]
+            if usecols is not None:
+                columns = [col for col in columns if col in usecols]
+            arrays = dict()
+            for col in columns:
+                values = data[col]
+                if NA_PREFIX + col in data:
+                    values = values.astype(object)
+                    values[data[NA_PREFIX + col]] = np.nan
+                arrays[col] = values
+            return df(arrays)
+    else:
+        return pd.read_csv(filename, usecols=usecols)
@@ -1,6 +1,5 @@
 from ctypes import c_uint, c_void_p, CFUNCTYPE, POINTER, c_char_p, c_bool, c_ulong, c_double
 from ctypes import Structure, c_char, c_int32, c_uint16, c_uint32, c_uint64, addressof, sizeof
-from copy import copy
 import numpy as np
 import pandas as pd
 from typing import Any
@@ -146,39 +145,196 @@ class WTSOrdDtlStruct(WTSStruct):
     _pack_ = 1
 
 
-class CacheList(list):
+def struct_dtype(st:type) -> np.dtype:
+    '''
+    根据ctypes结构体生成内存布局完全一致的numpy结构化类型\n
+    字段偏移和总长度都直接取自ctypes，所以_pack_的效果也会保留\n
+    @st     ctypes结构体类型
+    '''
+    names = list()
+    formats = list()
+    offsets = list()
+    for fname, ftype in st._fields_:
+        names.append(fname)
+        offsets.append(getattr(st, fname).offset)
+        if hasattr(ftype, "_length_"):
+            if ftype._type_ is c_char:
+                formats.append("S%d" % ftype._length_)
+            else:
+                formats.append((np.dtype(ftype._type_), (ftype._length_,)))
+        else:
+            formats.append(np.dtype(ftype))
+    return np.dtype({"names":names, "formats":formats, "offsets":offsets, "itemsize":sizeof(st)})
+
+def read_struct_array(addr:int, count:int, dtype:np.dtype, bCopy:bool = True) -> np.ndarray:
+    '''
+    把C接口传过来的一整块连续结构体内存一次性拷贝成numpy结构化数组\n
+    @addr   第一条数据的内存地址
+    @count  数据条数
+    @dtype  与结构体内存布局一致的numpy类型
+    @bCopy  是否拷贝，不拷贝时返回的是C内存的视图，回调返回以后就失效了，只能在回调内部使用
+    '''
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    buf = (c_char*(count*dtype.itemsize)).from_address(addr)
+    ret = np.frombuffer(buf, dtype=dtype, count=count)
+    if bCopy:
+        ret = ret.copy()
+    return ret
+
+BAR_DTYPE = struct_dtype(WTSBarStruct)
+TICK_DTYPE = struct_dtype(WTSTickStruct)
+TRANS_DTYPE = struct_dtype(WTSTransStruct)
+ORDQUE_DTYPE = struct_dtype(WTSOrdQueStruct)
+ORDDTL_DTYPE = struct_dtype(WTSOrdDtlStruct)
+
+# WtKlineData使用的K线记录类型，字段和append_bar的dict保持一致
+KLINE_DTYPE = np.dtype([("bartime", np.int64), ("open", np.float64), ("high", np.float64), 
+                ("low", np.float64), ("close", np.float64), ("volume", np.float64)])
+
+# 高频数据列式缓存(WtHftColumnData)使用的记录类型，字段名和策略拿到的dict保持一致
+# time字段为action_date*1000000000+action_time
+HFT_TICK_DTYPE = np.dtype([("time", np.int64), ("open", np.float64), ("high", np.float64), ("low", np.float64), 
+                ("price", np.float64), ("upper_limit", np.float64), ("lower_limit", np.float64), 
+                ("total_volume", np.uint32), ("volume", np.uint32), ("total_turnover", np.float64), ("turn_over", np.float64), 
+                ("open_interest", np.uint32), ("diff_interest", np.int32),
+                ("bidprice", np.float64, (10,)), ("bidqty", np.uint32, (10,)), 
+                ("askprice", np.float64, (10,)), ("askqty", np.uint32, (10,))])
+
+HFT_TRANS_DTYPE = np.dtype([("time", np.int64), ("index", np.uint32), ("ttype", np.int32), ("side", np.int32), 
+                ("price", np.float64), ("volume", np.uint32), ("askorder", np.int32), ("bidorder", np.int32)])
+
+HFT_ORDQUE_DTYPE = np.dtype([("time", np.int64), ("side", np.int32), ("price", np.float64), 
+                ("order_items", np.uint32), ("qsize", np.uint32), ("volumes", np.uint32, (50,))])
+
+HFT_ORDDTL_DTYPE = np.dtype([("time", np.int64), ("index", np.uint32), ("side", np.int32), 
+                ("price", np.float64), ("volume", np.uint32), ("otype", np.int32)])
+
+# 档位字段还原成dict时，只保留数量不为0的档位
+HFT_TICK_LEVELS = {"bidprice":"bidqty", "bidqty":"bidqty", "askprice":"askqty", "askqty":"askqty"}
+
+# 记录类型字段名和C结构体字段名不一致的映射
+HFT_FIELD_ALIAS = {"bidprice":"bid_prices", "bidqty":"bid_qty", "askprice":"ask_prices", "askqty":"ask_qty"}
+
+def to_hft_records(rawItems:np.ndarray, dtype:np.dtype) -> np.ndarray:
+    '''
+    把C结构体数组按列转换成高频数据记录数组\n
+    @rawItems   read_struct_array读出来的结构体数组
+    @dtype      目标记录类型，如HFT_TICK_DTYPE
+    '''
+    ret = np.empty(len(rawItems), dtype=dtype)
+    for fname in dtype.names:
+        if fname == "time":
+            ret["time"] = rawItems["action_date"].astype(np.int64)*1000000000 + rawItems["action_time"]
+        else:
+            ret[fname] = rawItems[HFT_FIELD_ALIAS.get(fname, fname)]
+    return ret
+
+class CacheList:
+    '''
+    C接口读取数据的缓存\n
+    底层是一个预分配、按需扩容的numpy结构化数组，dtype和ctypes结构体的内存布局一致\n
+    回调传过来的每一块数据都直接整块拷贝进去，to_record/to_pandas不需要再遍历一次
+    '''
+    def __init__(self, struct:type, dtype:np.dtype):
+        self.__struct__ = struct
+        self.__dtype__ = dtype
+        self.__data__ = np.empty(0, dtype=dtype)
+        self.__size__ = 0
+
+    def __len__(self) -> int:
+        return self.__size__
+
+    def __iter__(self):
+        for i in range(self.__size__):
+            yield self[i]
+
+    def __getitem__(self, idx):
+        '''
+        按下标访问时还原成ctypes结构体，和之前list存放结构体副本的用法保持一致
+        '''
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self.__size__))]
+
+        if idx < 0:
+            idx += self.__size__
+        if idx < 0 or idx >= self.__size__:
+            raise IndexError("index out of range")
+        return self.__struct__.from_buffer_copy(self.__data__[idx:idx+1].tobytes())
+
+    @property
+    def data(self) -> np.ndarray:
+        '''
+        有效数据部分的numpy结构化数组(视图)
+        '''
+        return self.__data__[:self.__size__]
+
+    def reserve(self, count:int):
+        '''
+        预留空间，容量不够时按倍数扩容
+        '''
+        if count <= len(self.__data__):
+            return
+
+        newCap = max(count, len(self.__data__)*2)
+        newData = np.empty(newCap, dtype=self.__dtype__)
+        newData[:self.__size__] = self.__data__[:self.__size__]
+        self.__data__ = newData
+
+    def append(self, item:Structure):
+        self.reserve(self.__size__ + 1)
+        self.__data__[self.__size__] = np.frombuffer(bytes(item), dtype=self.__dtype__, count=1)[0]
+        self.__size__ += 1
+
+    def extend(self, items:np.ndarray):
+        '''
+        追加一整块结构化数组，dtype必须和缓存一致\n
+        @items  结构化数组，如np.frombuffer从网络或文件读到的原始结构体数据
+        '''
+        count = len(items)
+        self.reserve(self.__size__ + count)
+        self.__data__[self.__size__:self.__size__+count] = items
+        self.__size__ += count
+
+    def to_bytes(self) -> bytes:
+        '''
+        有效数据的原始内存，和C结构体数组的布局一致
+        '''
+        return self.data.tobytes()
+
+    def on_read_data(self, addr:int, count:int):
+        self.reserve(self.__size__ + count)
+        self.__data__[self.__size__:self.__size__+count] = read_struct_array(addr, count, self.__dtype__, False)
+        self.__size__ += count
+
+    def on_data_count(self, count:int):
+        self.reserve(self.__size__ + count)
+
     def to_record(self) -> np.recarray:
-        data = np.empty(len(self), dtype=self[0].fields)
-        for k, v in enumerate(self):
-            data[k] = v.values
-        return data.view(np.recarray)
+        return self.data.view(np.recarray)
 
     def to_pandas(self) -> pd.DataFrame:
-        return pd.DataFrame(self.to_record())
+        data = self.data
+        columns = dict()
+        for fname in data.dtype.names:
+            col = data[fname]
+            # 档位这类数组字段，每行放一个数组，保持和之前一样的列结构
+            columns[fname] = list(col) if col.ndim > 1 else col
+        return pd.DataFrame(columns)
 
 class BarList(CacheList):
-    def on_read_bar(self, curBar:POINTER(WTSBarStruct), count:int, isLast:bool):
-        bsSize = sizeof(WTSBarStruct)
-        addr = addressof(curBar.contents)
-        for i in range(count):
-            thisBar = WTSBarStruct.from_address(addr)
-            self.append(copy(thisBar))
-            addr += bsSize
+    def __init__(self):
+        super().__init__(WTSBarStruct, BAR_DTYPE)
 
-    def on_data_count(self, count:int):
-        pass
+    def on_read_bar(self, curBar:POINTER(WTSBarStruct), count:int, isLast:bool):
+        self.on_read_data(addressof(curBar.contents), count)
 
 class TickList(CacheList):
-    def on_read_tick(self, curTick:POINTER(WTSTickStruct), count:int, isLast:bool):
-        tsSize = sizeof(WTSTickStruct)
-        addr = addressof(curTick.contents)
-        for i in range(count):
-            thisTick = WTSTickStruct.from_address(addr)
-            self.append(copy(thisTick))
-            addr += tsSize
+    def __init__(self):
+        super().__init__(WTSTickStruct, TICK_DTYPE)
 
-    def on_data_count(self, count:int):
-        pass
+    def on_read_tick(self, curTick:POINTER(WTSTickStruct), count:int, isLast:bool):
+        self.on_read_data(addressof(curTick.contents), count)
 
 # 回调函数定义
 #策略初始化回调
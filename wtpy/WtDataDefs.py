@@ -1,59 +1,168 @@
 import numpy as np
 from pandas import DataFrame
+from wtpy.WtCoreDefs import WTSTickStruct
 
 class WtKlineData:
+    '''
+    K线数据容器\n
+    内部采用环形缓冲区存储，每列分配2倍容量的空间，新K线同时写入pos和pos+capacity两个位置\n
+    这样[head, head+size)始终是一段连续内存，追加K线是O(1)的，读取各列时直接返回视图，不需要拷贝
+    '''
     def __init__(self, size:int, bAlloc:bool = True):
         self.capacity:int = size
         self.size:int = 0
+        self._head:int = 0      #环形缓冲区中最早一条K线的位置
 
         if bAlloc:
-            self.bartimes = np.zeros(self.capacity, np.int64)
-            self.opens = np.zeros(self.capacity)
-            self.highs = np.zeros(self.capacity)
-            self.lows = np.zeros(self.capacity)
-            self.closes = np.zeros(self.capacity)
-            self.volumes = np.zeros(self.capacity)
+            self.__alloc__()
         else:
-            self.bartimes = None
-            self.opens = None
-            self.highs = None
-            self.lows = None
-            self.closes = None
-            self.volumes = None
+            self._bartimes = None
+            self._opens = None
+            self._highs = None
+            self._lows = None
+            self._closes = None
+            self._volumes = None
+
+    def __alloc__(self):
+        cap = self.capacity*2
+        self._bartimes = np.zeros(cap, np.int64)
+        self._opens = np.zeros(cap)
+        self._highs = np.zeros(cap)
+        self._lows = np.zeros(cap)
+        self._closes = np.zeros(cap)
+        self._volumes = np.zeros(cap)
+
+    def __is_ring__(self) -> bool:
+        return self._closes is not None and len(self._closes) == 2*self.capacity
+
+    def __to_ring__(self):
+        '''
+        非环形存储(如slice出来的数据)追加数据时，先一次性转换成环形存储
+        '''
+        bartimes = self.bartimes
+        opens = self.opens
+        highs = self.highs
+        lows = self.lows
+        closes = self.closes
+        volumes = self.volumes
+
+        cnt = self.size
+        self._head = 0
+        self.__alloc__()
+        for col, src in ((self._bartimes, bartimes), (self._opens, opens), (self._highs, highs),
+                (self._lows, lows), (self._closes, closes), (self._volumes, volumes)):
+            if src is None or cnt == 0:
+                continue
+            col[:cnt] = src[:cnt]
+            col[self.capacity:self.capacity+cnt] = src[:cnt]
+
+    def __window__(self, col:np.ndarray) -> np.ndarray:
+        if col is None:
+            return None
+        return col[self._head:self._head+self.size]
+
+    @property
+    def bartimes(self) -> np.ndarray:
+        return self.__window__(self._bartimes)
+
+    @property
+    def opens(self) -> np.ndarray:
+        return self.__window__(self._opens)
+
+    @property
+    def highs(self) -> np.ndarray:
+        return self.__window__(self._highs)
+
+    @property
+    def lows(self) -> np.ndarray:
+        return self.__window__(self._lows)
+
+    @property
+    def closes(self) -> np.ndarray:
+        return self.__window__(self._closes)
+
+    @property
+    def volumes(self) -> np.ndarray:
+        return self.__window__(self._volumes)
 
     def append_bar(self, newBar:dict):
+        if not self.__is_ring__():
+            self.__to_ring__()
 
-        pos = self.size
-        if pos == self.capacity:
-            self.bartimes[:-1] = self.bartimes[1:]
-            self.opens[:-1] = self.opens[1:]
-            self.highs[:-1] = self.highs[1:]
-            self.lows[:-1] = self.lows[1:]
-            self.closes[:-1] = self.closes[1:]
-            self.volumes[:-1] = self.volumes[1:]
+        cap = self.capacity
+        if cap == 0:
+            return
 
-            pos = -1
+        pos = (self._head + self.size) % cap
+        mirror = pos + cap
+
+        bartime = newBar["bartime"]
+        self._bartimes[pos] = bartime
+        self._bartimes[mirror] = bartime
+        val = newBar["open"]
+        self._opens[pos] = val
+        self._opens[mirror] = val
+        val = newBar["high"]
+        self._highs[pos] = val
+        self._highs[mirror] = val
+        val = newBar["low"]
+        self._lows[pos] = val
+        self._lows[mirror] = val
+        val = newBar["close"]
+        self._closes[pos] = val
+        self._closes[mirror] = val
+        val = newBar["volume"]
+        self._volumes[pos] = val
+        self._volumes[mirror] = val
+
+        if self.size == cap:
+            # 缓冲区已满，覆盖掉最早的一条，头指针后移
+            self._head = (self._head + 1) % cap
         else:
             self.size += 1
-        self.bartimes[pos] = newBar["bartime"]
-        self.opens[pos] = newBar["open"]
-        self.highs[pos] = newBar["high"]
-        self.lows[pos] = newBar["low"]
-        self.closes[pos] = newBar["close"]
-        self.volumes[pos] = newBar["volume"]
+
+    def append_bars(self, newBars:np.ndarray):
+        '''
+        批量追加K线，用于拉取历史数据时整块写入\n
+        @newBars    numpy结构化数组，字段和append_bar的dict一致(bartime/open/high/low/close/volume)
+        '''
+        if not self.__is_ring__():
+            self.__to_ring__()
+
+        cap = self.capacity
+        cnt = len(newBars)
+        if cap == 0 or cnt == 0:
+            return
+
+        if cnt >= cap:
+            # 新数据比缓冲区还长，只保留最后capacity条，直接从头铺满
+            newBars = newBars[-cap:]
+            pos = np.arange(cap)
+            self._head = 0
+            self.size = cap
+        else:
+            pos = (self._head + self.size + np.arange(cnt)) % cap
+            total = self.size + cnt
+            if total > cap:
+                self._head = (self._head + total - cap) % cap
+                self.size = cap
+            else:
+                self.size = total
+
+        mirror = pos + cap
+        for col, field in ((self._bartimes, "bartime"), (self._opens, "open"), (self._highs, "high"),
+                (self._lows, "low"), (self._closes, "close"), (self._volumes, "volume")):
+            vals = newBars[field]
+            col[pos] = vals
+            col[mirror] = vals
 
     def is_empty(self) -> bool:
         return self.size==0
 
     def clear(self):
         self.size = 0
-
-        self.bartimes:np.ndarray = np.zeros(self.capacity, np.int64)
-        self.opens:np.ndarray = np.zeros(self.capacity)
-        self.highs:np.ndarray = np.zeros(self.capacity)
-        self.lows:np.ndarray = np.zeros(self.capacity)
-        self.closes:np.ndarray = np.zeros(self.capacity)
-        self.volumes:np.ndarray = np.zeros(self.capacity)
+        self._head = 0
+        self.__alloc__()
 
     def get_bar(self, iLoc:int = -1) -> dict:
         if self.is_empty():
@@ -79,19 +188,19 @@ class WtKlineData:
         ret.size = cnt
 
         if bCopy:
-            ret.bartimes = bartimes.copy()
-            ret.opens = self.opens[iStart:iEnd].copy()
-            ret.highs = self.highs[iStart:iEnd].copy()
-            ret.lows = self.lows[iStart:iEnd].copy()
-            ret.closes = self.closes[iStart:iEnd].copy()
-            ret.volumes = self.volumes[iStart:iEnd].copy()
+            ret._bartimes = bartimes.copy()
+            ret._opens = self.opens[iStart:iEnd].copy()
+            ret._highs = self.highs[iStart:iEnd].copy()
+            ret._lows = self.lows[iStart:iEnd].copy()
+            ret._closes = self.closes[iStart:iEnd].copy()
+            ret._volumes = self.volumes[iStart:iEnd].copy()
         else:
-            ret.bartimes = bartimes
-            ret.opens = self.opens[iStart:iEnd]
-            ret.highs = self.highs[iStart:iEnd]
-            ret.lows = self.lows[iStart:iEnd]
-            ret.closes = self.closes[iStart:iEnd]
-            ret.volumes = self.volumes[iStart:iEnd]
+            ret._bartimes = bartimes
+            ret._opens = self.opens[iStart:iEnd]
+            ret._highs = self.highs[iStart:iEnd]
+            ret._lows = self.lows[iStart:iEnd]
+            ret._closes = self.closes[iStart:iEnd]
+            ret._volumes = self.volumes[iStart:iEnd]
 
         return ret
 
@@ -129,7 +238,7 @@ class WtHftData:
 
     def clear(self):
         self.size = 0
-        self.items = []*self.capacity
+        self.items = [None]*self.capacity
 
     def get_item(self, iLoc:int=-1) -> dict:
         if self.is_empty():
@@ -139,4 +248,223 @@ class WtHftData:
 
     def to_df(self) -> DataFrame:
         ret = DataFrame(self.items)
-        return ret
\ No newline at end of file
+        return ret
+
+class WtHftColumnData:
+    '''
+    列式存储的高频数据容器(tick/委托队列/逐笔委托/逐笔成交)\n
+    每个字段一列numpy数组，档位类字段为2维数组，存储方式和WtKlineData一样是镜像的环形缓冲区\n
+    追加数据是O(1)的，按列读取直接返回连续内存的视图；get_item/items返回和WtHftData一样的dict
+    '''
+    def __init__(self, capacity:int, dtype:np.dtype, levels:dict = None):
+        '''
+        @capacity   容量
+        @dtype      记录类型，如HFT_TICK_DTYPE
+        @levels     档位字段还原成dict时，用来过滤空档位的字段映射，如HFT_TICK_LEVELS
+        '''
+        self.capacity:int = capacity
+        self.size:int = 0
+        self._head:int = 0
+        self._dtype = dtype
+        self._levels = levels if levels is not None else dict()
+        self.__alloc__()
+
+    def __alloc__(self):
+        self._columns = dict()
+        for fname in self._dtype.names:
+            ftype = self._dtype.fields[fname][0]
+            self._columns[fname] = np.zeros((self.capacity*2,) + ftype.shape, ftype.base)
+
+    def __getattr__(self, name:str):
+        # 只有常规属性找不到的时候才会进来，用于支持ticks.price这样的列访问
+        columns = self.__dict__.get("_columns")
+        if columns is None or name not in columns:
+            raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+        return self.get_column(name)
+
+    def __getitem__(self, name:str) -> np.ndarray:
+        return self.get_column(name)
+
+    @property
+    def columns(self) -> list:
+        return list(self._dtype.names)
+
+    def get_column(self, name:str) -> np.ndarray:
+        '''
+        按列读取，返回的是缓冲区的视图，不会拷贝数据
+        @name   字段名
+        '''
+        return self._columns[name][self._head:self._head+self.size]
+
+    def __next_pos__(self) -> int:
+        cap = self.capacity
+        pos = (self._head + self.size) % cap
+        if self.size == cap:
+            self._head = (self._head + 1) % cap
+        else:
+            self.size += 1
+        return pos
+
+    def append_item(self, newItem:dict):
+        if self.capacity == 0:
+            return
+
+        pos = self.__next_pos__()
+        mirror = pos + self.capacity
+        for fname, col in self._columns.items():
+            if col.ndim > 1:
+                # dict里的档位是去掉了空档位的list，先清零再写入
+                val = newItem.get(fname, [])
+                col[pos] = 0
+                col[pos, :len(val)] = val
+                col[mirror] = col[pos]
+            else:
+                val = newItem.get(fname, 0)
+                col[pos] = val
+                col[mirror] = val
+
+    def append_items(self, newItems:np.ndarray):
+        '''
+        批量追加数据
+        @newItems   numpy结构化数组，类型和构造时传入的dtype一致
+        '''
+        cap = self.capacity
+        cnt = len(newItems)
+        if cap == 0 or cnt == 0:
+            return
+
+        if cnt >= cap:
+            newItems = newItems[-cap:]
+            pos = np.arange(cap)
+            self._head = 0
+            self.size = cap
+        else:
+            pos = (self._head + self.size + np.arange(cnt)) % cap
+            total = self.size + cnt
+            if total > cap:
+                self._head = (self._head + total - cap) % cap
+                self.size = cap
+            else:
+                self.size = total
+
+        mirror = pos + cap
+        for fname, col in self._columns.items():
+            vals = newItems[fname]
+            col[pos] = vals
+            col[mirror] = vals
+
+    def is_empty(self) -> bool:
+        return self.size==0
+
+    def clear(self):
+        self.size = 0
+        self._head = 0
+        self.__alloc__()
+
+    def get_item(self, iLoc:int=-1) -> dict:
+        if self.is_empty():
+            return None
+
+        item = dict()
+        for fname in self._columns:
+            val = self.get_column(fname)[iLoc]
+            if val.ndim > 0:
+                mask = self.get_column(self._levels.get(fname, fname))[iLoc] != 0
+                item[fname] = val[mask].tolist()
+            else:
+                item[fname] = val.item()
+        return item
+
+    @property
+    def items(self) -> list:
+        '''
+        兼容WtHftData的用法，逐条转成dict，数据量大时尽量直接按列访问
+        '''
+        return [self.get_item(i) for i in range(self.size)]
+
+    def to_df(self) -> DataFrame:
+        data = dict()
+        for fname in self._columns:
+            col = self.get_column(fname)
+            data[fname] = list(col) if col.ndim > 1 else col
+        return DataFrame(data)
+
+class WtTickData:
+    '''
+    轻量级的tick对象，用于替代on_tick里每笔都新建的dict\n
+    构造时只把C结构体整块拷贝一份，各字段在访问时才解析，档位数据也是访问时才生成list\n
+    支持tick.price和tick["price"]两种写法，字段名和原来的dict保持一致
+    '''
+    __slots__ = ("_tick",)
+
+    def __init__(self, realTick:WTSTickStruct):
+        # C接口的指针在回调返回以后就失效了，所以这里必须拷贝一份
+        self._tick = WTSTickStruct.from_buffer_copy(realTick)
+
+    def __getitem__(self, key:str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __getattr__(self, name:str):
+        # 没有单独定义的字段(如exchg、trading_date等)直接从结构体里取
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._tick, name)
+
+    def get(self, key:str, defVal = None):
+        try:
+            return self[key]
+        except KeyError:
+            return defVal
+
+    @property
+    def time(self) -> int:
+        return self._tick.action_date * 1000000000 + self._tick.action_time
+
+    @property
+    def price(self) -> float:
+        return self._tick.price
+
+    @property
+    def open(self) -> float:
+        return self._tick.open
+
+    @property
+    def high(self) -> float:
+        return self._tick.high
+
+    @property
+    def low(self) -> float:
+        return self._tick.low
+
+    @property
+    def volume(self) -> int:
+        return self._tick.volume
+
+    @property
+    def bidprice(self) -> list:
+        tick = self._tick
+        return [tick.bid_prices[i] for i in range(10) if tick.bid_qty[i] != 0]
+
+    @property
+    def bidqty(self) -> list:
+        return [qty for qty in self._tick.bid_qty if qty != 0]
+
+    @property
+    def askprice(self) -> list:
+        tick = self._tick
+        return [tick.ask_prices[i] for i in range(10) if tick.ask_qty[i] != 0]
+
+    @property
+    def askqty(self) -> list:
+        return [qty for qty in self._tick.ask_qty if qty != 0]
+
+    def to_dict(self) -> dict:
+        tick = dict()
+        for key in ["time", "open", "high", "low", "price", "upper_limit", "lower_limit", 
+                "total_volume", "volume", "total_turnover", "turn_over", "open_interest", "diff_interest",
+                "bidprice", "bidqty", "askprice", "askqty"]:
+            tick[key] = getattr(self, key)
+        return tick
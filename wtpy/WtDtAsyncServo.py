@@ -0,0 +1,328 @@
+'''
+WtDtServo的异步远程客户端\n
+基于asyncio，连接池中的连接保持长连接，每个连接上可以流水线发送多个请求\n
+多个代码可以并发查询，返回的数据类型和WtDtRemoteServo一致，都是BarList/TickList
+'''
+import asyncio
+import gzip
+import json
+from collections import deque
+from urllib.parse import urlsplit
+
+from wtpy.WtCoreDefs import BarList, TickList
+from wtpy.WtDtServo import BINARY_MIME, check_item_size, decode_binary, decode_binary_batch, from_columns, from_records
+
+class AsyncHttpConnection:
+    '''
+    HTTP/1.1长连接\n
+    请求按顺序写出，响应由读取协程按同样的顺序分发，在途请求数不超过流水线深度
+    '''
+    def __init__(self, host:str, port:int, pipeline:int = 4, timeout:float = 30):
+        '''
+        @pipeline   流水线深度，即一个连接上最多同时在途的请求数\n
+        @timeout    单个请求的超时时间，单位秒
+        '''
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        self.__reader__ = None
+        self.__writer__ = None
+        self.__read_task__ = None
+        self.__pending__ = deque()
+        self.__inflight__ = 0
+        self.__send_lock__ = asyncio.Lock()
+        self.__window__ = asyncio.Semaphore(pipeline)
+
+        # 服务端是否支持长连接，确认之前不做流水线，不支持时每个请求都重新建立连接
+        self.__persistent__ = None
+        self.__idle__ = asyncio.Event()
+        self.__idle__.set()
+
+    @property
+    def is_open(self) -> bool:
+        return self.__writer__ is not None and not self.__writer__.is_closing()
+
+    @property
+    def inflight(self) -> int:
+        return self.__inflight__
+
+    async def __open__(self):
+        self.__reader__, self.__writer__ = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        self.__read_task__ = asyncio.ensure_future(self.__read_loop__(self.__reader__))
+
+    def close(self, exc:Exception = None):
+        '''
+        关闭连接，还没有收到响应的请求都以exc结束
+        '''
+        if self.__writer__ is not None:
+            self.__writer__.close()
+        self.__writer__ = None
+        self.__reader__ = None
+
+        if self.__read_task__ is not None and self.__read_task__ is not asyncio.current_task():
+            self.__read_task__.cancel()
+        self.__read_task__ = None
+
+        exc = exc or ConnectionResetError("connection closed")
+        while len(self.__pending__) > 0:
+            fut = self.__pending__.popleft()
+            if not fut.done():
+                fut.set_exception(exc)
+        self.__idle__.set()
+
+    async def __read_response__(self, reader:asyncio.StreamReader) -> tuple:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionResetError("connection closed by server")
+
+        items = line.decode("latin-1").split()
+        version = items[0]
+        status = int(items[1])
+
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, val = line.decode("latin-1").split(":", 1)
+            headers[key.strip().lower()] = val.strip()
+
+        connection = headers.get("connection", "").lower()
+        bKeepAlive = connection != "close" and (version != "HTTP/1.0" or connection == "keep-alive")
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            blocks = list()
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if size == 0:
+                    # 跳过trailer
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                blocks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(blocks)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            # 没有长度信息，只能读到连接关闭
+            body = await reader.read()
+            bKeepAlive = False
+
+        if headers.get("content-encoding", "") == "gzip":
+            body = gzip.decompress(body)
+        return status, headers, body, bKeepAlive
+
+    async def __read_loop__(self, reader:asyncio.StreamReader):
+        try:
+            while True:
+                status, headers, body, bKeepAlive = await self.__read_response__(reader)
+                self.__persistent__ = bKeepAlive
+                if len(self.__pending__) > 0:
+                    fut = self.__pending__.popleft()
+                    if not fut.done():
+                        fut.set_result((status, headers, body))
+                if len(self.__pending__) == 0:
+                    self.__idle__.set()
+
+                if not bKeepAlive:
+                    self.close()
+                    return
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.close(e)
+
+    async def request(self, path:str, body:bytes, headers:dict) -> tuple:
+        '''
+        发送POST请求\n
+        @return (状态码, 响应头, 响应体)，响应头的键都是小写
+        '''
+        async with self.__window__:
+            self.__inflight__ += 1
+            try:
+                async with self.__send_lock__:
+                    if not self.__persistent__:
+                        await self.__idle__.wait()
+
+                    if not self.is_open:
+                        await self.__open__()
+
+                    lines = ["POST %s HTTP/1.1" % (path), "Host: %s:%d" % (self.host, self.port), "Content-Length: %d" % (len(body))]
+                    lines.extend("%s: %s" % (key, val) for key, val in headers.items())
+                    fut = asyncio.get_running_loop().create_future()
+                    self.__pending__.append(fut)
+                    self.__idle__.clear()
+                    self.__writer__.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+                    await self.__writer__.drain()
+
+                try:
+                    return await asyncio.wait_for(fut, self.timeout)
+                except asyncio.TimeoutError:
+                    # 超时以后响应的顺序无法保证，只能丢弃这个连接
+                    self.close(asyncio.TimeoutError())
+                    raise
+            finally:
+                self.__inflight__ -= 1
+
+class AsyncConnectionPool:
+    '''
+    连接池，新请求分配给在途请求最少的连接
+    '''
+    def __init__(self, host:str, port:int, size:int = 4, pipeline:int = 4, timeout:float = 30, retries:int = 1):
+        '''
+        @size       连接数\n
+        @pipeline   每个连接的流水线深度\n
+        @timeout    单个请求的超时时间，单位秒\n
+        @retries    连接被服务端断开时的重试次数，查询请求都是幂等的，可以安全重试
+        '''
+        self.retries = retries
+        self.__conns__ = [AsyncHttpConnection(host, port, pipeline, timeout) for i in range(max(1, size))]
+
+    async def request(self, path:str, body:bytes, headers:dict) -> tuple:
+        for i in range(self.retries + 1):
+            conn = min(self.__conns__, key=lambda item: item.inflight)
+            try:
+                return await conn.request(path, body, headers)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                if i == self.retries:
+                    raise
+
+    def close(self):
+        for conn in self.__conns__:
+            conn.close()
+
+class WtDtAsyncRemoteServo:
+    '''
+    WtDtServo的异步远程客户端，接口和WtDtRemoteServo一致，但是都是协程\n
+    用法:\n
+        async with WtDtAsyncRemoteServo("http://127.0.0.1:8081") as servo:\n
+            bars = await servo.get_bars("CFFEX.IF.HOT", "m1", dataCount=1000)
+    '''
+    def __init__(self, url:str = "http://127.0.0.1:8081", poolSize:int = 4, pipeline:int = 4, timeout:float = 30):
+        '''
+        @url        服务地址，只支持http\n
+        @poolSize   连接池大小\n
+        @pipeline   每个连接的流水线深度\n
+        @timeout    单个请求的超时时间，单位秒
+        '''
+        parts = urlsplit(url)
+        if parts.scheme != "http":
+            raise Exception("Only http is supported: %s" % (url))
+
+        self.remote_url = url
+        self.__prefix__ = parts.path.rstrip("/")
+        self.__pool__ = AsyncConnectionPool(parts.hostname, parts.port or 80, poolSize, pipeline, timeout)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.__pool__.close()
+
+    async def __post__(self, path:str, datas:dict) -> tuple:
+        headers = {
+            "Content-Type": "application/json",
+            "Accept": "%s, text/json" % (BINARY_MIME),
+            "Accept-Encoding": "gzip",
+            "Connection": "keep-alive"
+        }
+        status, rspHeaders, body = await self.__pool__.request(self.__prefix__ + path, json.dumps(datas).encode("utf-8"), headers)
+        if status != 200:
+            raise Exception("Request %s failed with status %d" % (path, status))
+        return rspHeaders, body
+
+    def __make_query__(self, fromTime:int, dataCount:int, endTime:int, **kwargs) -> dict:
+        if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
+            raise Exception('Only one of fromTime and dataCount must be valid at the same time')
+
+        data = kwargs
+        data["etime"] = endTime
+        if fromTime is not None:
+            data["stime"] = fromTime
+        else:
+            data["count"] = dataCount
+        return data
+
+    async def __query__(self, path:str, data:dict, cacheType:type, key:str):
+        headers, body = await self.__post__(path, data)
+        cache = cacheType()
+        if headers.get("content-type", "").startswith(BINARY_MIME):
+            check_item_size(headers.get("x-item-size"), cache.data.dtype)
+            return decode_binary(body, cache)
+
+        resObj = json.loads(body.decode("utf-8"))
+        if resObj["result"] < 0:
+            print(resObj["message"])
+            return None
+        return from_records(cache, resObj[key])
+
+    async def __query_batch__(self, path:str, data:dict, cacheType:type) -> dict:
+        headers, body = await self.__post__(path, data)
+        if headers.get("content-type", "").startswith(BINARY_MIME):
+            check_item_size(headers.get("x-item-size"), cacheType().data.dtype)
+            return decode_binary_batch(body, cacheType)
+
+        resObj = json.loads(body.decode("utf-8"))
+        if resObj["result"] < 0:
+            print(resObj["message"])
+            return None
+        return {code: None if columns is None else from_columns(cacheType(), columns) for code, columns in resObj["data"].items()}
+
+    async def get_bars(self, stdCode:str, period:str, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> BarList:
+        '''
+        获取K线数据\n
+        @stdCode    标准合约代码\n
+        @period     基础K线周期，m1/m5/d\n
+        @fromTime   开始时间，日线数据格式yyyymmdd，分钟线数据为格式为yyyymmddHHMM\n
+        @endTime    结束时间，日线数据格式yyyymmdd，分钟线数据为格式为yyyymmddHHMM，为0则读取到最后一条
+        '''
+        data = self.__make_query__(fromTime, dataCount, endTime, code=stdCode, period=period)
+        return await self.__query__("/getbars", data, BarList, "bars")
+
+    async def get_ticks(self, stdCode:str, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> TickList:
+        '''
+        获取tick数据\n
+        @stdCode    标准合约代码\n
+        @fromTime   开始时间，格式为yyyymmddHHMM\n
+        @endTime    结束时间，格式为yyyymmddHHMM，为0则读取到最后一条
+        '''
+        data = self.__make_query__(fromTime, dataCount, endTime, code=stdCode)
+        return await self.__query__("/getticks", data, TickList, "ticks")
+
+    async def get_bars_batch(self, codes:list, period:str, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> dict:
+        '''
+        通过批量接口一次请求获取多个代码的K线数据\n
+        @return {code: BarList}，没有数据的代码对应None
+        '''
+        data = self.__make_query__(fromTime, dataCount, endTime, codes=list(codes), period=period)
+        return await self.__query_batch__("/getbatchbars", data, BarList)
+
+    async def get_ticks_batch(self, codes:list, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> dict:
+        '''
+        通过批量接口一次请求获取多个代码的tick数据\n
+        @return {code: TickList}，没有数据的代码对应None
+        '''
+        data = self.__make_query__(fromTime, dataCount, endTime, codes=list(codes))
+        return await self.__query_batch__("/getbatchticks", data, TickList)
+
+    async def get_bars_multi(self, codes:list, period:str, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> dict:
+        '''
+        每个代码单独请求，并发分布到连接池的各个连接上\n
+        和get_bars_batch相比，单个代码的数据可以先到先处理，也可以利用服务端对单个代码的缓存\n
+        @return {code: BarList}，没有数据的代码对应None
+        '''
+        results = await asyncio.gather(*[self.get_bars(code, period, fromTime, dataCount, endTime) for code in codes])
+        return dict(zip(codes, results))
+
+    async def get_ticks_multi(self, codes:list, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> dict:
+        '''
+        每个代码单独请求，并发分布到连接池的各个连接上\n
+        @return {code: TickList}，没有数据的代码对应None
+        '''
+        results = await asyncio.gather(*[self.get_ticks(code, fromTime, dataCount, endTime) for code in codes])
+        return dict(zip(codes, results))
@@ -1,16 +1,30 @@
 from wtpy.WtUtilDefs import singleton
 from wtpy.wrapper import WtDtServoApi
-from wtpy.WtCoreDefs import BarList, TickList, WTSBarStruct, WTSTickStruct
+from wtpy.WtCoreDefs import BarList, TickList, WTSBarStruct, WTSTickStruct, CacheList
+from wtpy.WtWebServer import serve_app
 
-from flask import Flask, session, redirect, request, make_response
+from flask import Flask, session, redirect, request, make_response, Response
 from flask_compress  import Compress
 
 import urllib.request
 import io
 import gzip
+import struct
+import os
+import re
+import time
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 
 import json
 
+# 二进制传输模式，响应体就是C结构体数组的原始内存，两端的字节序必须一致
+BINARY_MIME = "application/octet-stream"
+# 分块传输时每块的字节数，会按结构体大小对齐
+BINARY_CHUNK_SIZE = 1024*1024
+
 def pack_rsp(obj):
     rsp = make_response(json.dumps(obj))
     rsp.headers["content-type"]= "text/json;charset=utf-8"
@@ -33,6 +47,391 @@ def get_param(json_data, key:str, type=str, defVal = ""):
     else:
         return type(json_data[key])
 
+def want_binary(json_data) -> bool:
+    '''
+    客户端是否接受二进制格式，请求头Accept中带application/octet-stream或者请求参数format为binary
+    '''
+    if get_param(json_data, "format") == "binary":
+        return True
+    return BINARY_MIME in request.headers.get("Accept", "")
+
+def encode_json(obj) -> tuple:
+    '''
+    编码json响应，返回(mimetype, body, headers)，可以直接放到缓存里
+    '''
+    return ("text/json;charset=utf-8", json.dumps(obj).encode("utf-8"), dict())
+
+def encode_binary(cache:CacheList) -> tuple:
+    '''
+    将数据编码成结构体数组的原始内存，不再逐条转成dict\n
+    响应头X-Data-Count为数据条数，X-Item-Size为单条结构体的字节数，客户端用来校验结构体版本
+    '''
+    data = cache.data
+    headers = {
+        "X-Data-Count": str(len(data)),
+        "X-Item-Size": str(data.dtype.itemsize)
+    }
+    return (BINARY_MIME, data.tobytes(), headers)
+
+def encode_binary_batch(caches:dict, itemsize:int) -> tuple:
+    '''
+    多个代码的数据合并成一个二进制响应\n
+    响应体开头是4字节的索引长度和json格式的索引[[code, count],...]，count为-1表示没有数据\n
+    后面按索引的顺序紧接着各个代码的结构体数组
+    '''
+    index = [[code, -1 if cache is None else len(cache)] for code, cache in caches.items()]
+    head = json.dumps(index).encode("utf-8")
+    blocks = [struct.pack("<I", len(head)), head]
+    blocks.extend(cache.data.tobytes() for cache in caches.values() if cache is not None)
+    headers = {
+        "X-Data-Count": str(sum(max(0, item[1]) for item in index)),
+        "X-Item-Size": str(itemsize)
+    }
+    return (BINARY_MIME, b"".join(blocks), headers)
+
+def pack_entry(entry:tuple, chunksize:int = BINARY_CHUNK_SIZE):
+    '''
+    将编码好的数据打包成响应，二进制数据分块流式返回
+    '''
+    mimetype, body, headers = entry
+    if mimetype != BINARY_MIME:
+        rsp = make_response(body)
+        rsp.headers["content-type"] = mimetype
+        return rsp
+
+    def generate():
+        view = memoryview(body)
+        for idx in range(0, len(view), chunksize):
+            yield bytes(view[idx:idx+chunksize])
+
+    rsp = Response(generate(), mimetype=BINARY_MIME)
+    for key in headers:
+        rsp.headers[key] = headers[key]
+    return rsp
+
+def scan_folder(folder:str) -> dict:
+    '''
+    扫描目录下的全部文件\n
+    @return 文件路径到(修改时间, 大小)的映射
+    '''
+    files = dict()
+    folders = [folder]
+    while len(folders) > 0:
+        try:
+            entries = list(os.scandir(folders.pop()))
+        except OSError:
+            continue
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            files[entry.path] = (st.st_mtime_ns, st.st_size)
+    return files
+
+# 交易所代码，文件名中的交易所前缀要去掉
+EXCHANGES = ["CFFEX", "SHFE", "DCE", "CZCE", "INE", "GFEX", "SSE", "SZSE", "BSE"]
+# 品种类型，股票代码SSE.STK.600000中间的STK，数据文件名中没有
+SEC_TYPES = ["STK", "IDX", "ETF"]
+# 连续合约的后缀
+CONT_SUFFIXES = ["HOT", "2ND"]
+# csv和bin数据文件名中的周期后缀，如_m5、_d1、_tick_20210107
+PERIOD_SUFFIX = re.compile(r"_(tick(_\d+)?|[mdsMDS]\d+)$")
+
+def get_code_parts(name:str, folders:list = None) -> list:
+    '''
+    将合约代码或者数据文件名拆成交易所以外的各段\n
+    CFFEX.IF.HOT、CFFEX.IF_HOT、IF_HOT都拆成[IF, HOT]，SSE.STK.600000和600000都拆成[600000]\n
+    @folders    数据文件所在的上两级目录名，为None表示name是标准合约代码，第一段总是交易所
+    '''
+    parts = [part for part in re.split("[._]", name) if len(part) > 0]
+    if len(parts) == 0:
+        return parts
+
+    if folders is None:
+        bExchg = True
+    else:
+        bExchg = parts[0].upper() in EXCHANGES or parts[0] in folders
+    if len(parts) > 1 and bExchg:
+        parts = parts[1:]
+    return [part for part in parts if part.upper() not in SEC_TYPES]
+
+def get_part_tokens(parts:list, bProduct:bool) -> set:
+    '''
+    由代码的各段生成缓存失效标记，合约标记是各段拼接后的小写，品种标记是@加上开头的字母\n
+    @bProduct   是否生成品种标记
+    '''
+    if len(parts) == 0:
+        return set()
+
+    tokens = {"".join(parts).rstrip("+-").lower()}
+    product = re.match("[A-Za-z]+", parts[0])
+    if bProduct and product is not None:
+        tokens.add("@" + product.group().lower())
+    return tokens
+
+def get_code_tokens(stdCode:str) -> set:
+    '''
+    合约代码对应的缓存失效标记，和get_file_tokens的规则一致\n
+    SHFE.rb.2210对应rb2210，SSE.STK.600000对应600000\n
+    主力和次主力合约如SHFE.rb.HOT由具体合约拼接而成，还对应品种标记@rb，任何rb合约的数据变化都要失效
+    '''
+    parts = get_code_parts(stdCode)
+    bCont = len(parts) > 1 and parts[-1].upper() in CONT_SUFFIXES
+    return get_part_tokens(parts, bCont)
+
+def get_file_tokens(filepath:str) -> set:
+    '''
+    数据文件对应的缓存失效标记，和get_code_tokens对应\n
+    his/min1/SHFE/rb2210.dsb对应rb2210和@rb，his/min5/CFFEX/CFFEX.IF_HOT.dsb对应ifhot和@if\n
+    bin/ticks/CFFEX.IF.HOT_tick_20210107.dsb也对应ifhot和@if\n
+    @return 失效标记，无法识别时为空
+    '''
+    stem = os.path.splitext(os.path.basename(filepath))[0]
+    stem = PERIOD_SUFFIX.sub("", stem)
+    folders = os.path.dirname(filepath).replace("\\", "/").split("/")[-2:]
+    return get_part_tokens(get_code_parts(stem, folders), True)
+
+class ResponseCache:
+    '''
+    查询结果的LRU缓存，缓存的是编码好的响应数据，命中时不需要再读取和序列化\n
+    总字节数超过预算时淘汰最久没有访问的数据\n
+    后台线程定时扫描存储目录，只失效数据文件有变化的合约相关的缓存，识别不了合约的文件有变化时全部失效\n
+    缓存为空时不扫描，存储目录很大时也不会一直占用磁盘
+    '''
+    def __init__(self, maxBytes:int = 256*1024*1024, checkInterval:float = 5):
+        '''
+        @maxBytes       缓存的字节数上限，为0则不缓存\n
+        @checkInterval  扫描存储目录的间隔，单位秒，为0则不扫描
+        '''
+        self.max_bytes = maxBytes
+        self.check_interval = checkInterval
+
+        self.__items__ = OrderedDict()
+        self.__bytes__ = 0
+        self.__tokens__ = dict()    #缓存键到失效标记
+        self.__index__ = dict()     #失效标记到缓存键
+        self.__lock__ = threading.Lock()
+
+        self.__folder__ = None
+        self.__files__ = None   #上次扫描的结果，缓存为空时不扫描，置为None
+        self.__since__ = 0      #缓存从空变为非空的时间，没有上次扫描结果时，之后修改过的文件都算有变化
+        self.__watcher__ = None
+
+    def set_folder(self, folder:str):
+        '''
+        设置要监控的存储目录，并启动后台扫描线程
+        '''
+        with self.__lock__:
+            self.__folder__ = folder
+            self.__files__ = None
+            self.__clear__()
+
+        if self.__watcher__ is None:
+            self.__watcher__ = threading.Thread(target=self.__watch__, daemon=True)
+            self.__watcher__.start()
+
+    def __watch__(self):
+        while True:
+            time.sleep(self.check_interval if self.check_interval > 0 else 1)
+            if self.check_interval > 0:
+                self.check()
+
+    def check(self):
+        '''
+        扫描存储目录，失效有变化的文件对应的缓存\n
+        扫描在锁外进行，不阻塞查询
+        '''
+        folder = self.__folder__
+        if folder is None:
+            return
+
+        if len(self.__items__) == 0:
+            self.__files__ = None
+            return
+
+        since = self.__since__
+        files = scan_folder(folder)
+        last = self.__files__
+        if last is None:
+            # 留1秒的余量，有的文件系统修改时间精度不高
+            changed = [path for path, sig in files.items() if sig[0] >= since - 1000000000]
+        else:
+            changed = [path for path, sig in files.items() if last.get(path) != sig]
+            changed.extend([path for path in last if path not in files])
+        self.__files__ = files
+
+        tokens = set()
+        bUnknown = False
+        for path in changed:
+            fileTokens = get_file_tokens(path)
+            if len(fileTokens) == 0:
+                bUnknown = True
+                break
+            tokens.update(fileTokens)
+
+        with self.__lock__:
+            if bUnknown:
+                self.__clear__()
+                return
+
+            for token in tokens:
+                for key in list(self.__index__.get(token, [])):
+                    self.__remove__(key)
+
+    def __clear__(self):
+        self.__items__.clear()
+        self.__tokens__.clear()
+        self.__index__.clear()
+        self.__bytes__ = 0
+
+    def __remove__(self, key:tuple):
+        entry = self.__items__.pop(key, None)
+        if entry is None:
+            return
+
+        self.__bytes__ -= len(entry[1])
+        for token in self.__tokens__.pop(key):
+            keys = self.__index__[token]
+            keys.discard(key)
+            if len(keys) == 0:
+                self.__index__.pop(token)
+
+    def clear(self):
+        with self.__lock__:
+            self.__clear__()
+
+    def get(self, key:tuple) -> tuple:
+        if self.max_bytes <= 0:
+            return None
+
+        with self.__lock__:
+            entry = self.__items__.get(key)
+            if entry is not None:
+                self.__items__.move_to_end(key)
+            return entry
+
+    def put(self, key:tuple, entry:tuple, codes:list):
+        '''
+        @key    缓存键\n
+        @entry  编码好的响应\n
+        @codes  响应中包含的合约代码，数据文件变化时用于失效
+        '''
+        size = len(entry[1])
+        if size > self.max_bytes:
+            return
+
+        tokens = set()
+        for code in codes:
+            tokens.update(get_code_tokens(code))
+
+        with self.__lock__:
+            self.__remove__(key)
+            if len(self.__items__) == 0:
+                self.__since__ = time.time_ns()
+
+            self.__items__[key] = entry
+            self.__tokens__[key] = tokens
+            for token in tokens:
+                self.__index__.setdefault(token, set()).add(key)
+            self.__bytes__ += size
+            while self.__bytes__ > self.max_bytes:
+                self.__remove__(next(iter(self.__items__)))
+
+    @property
+    def size(self) -> int:
+        return self.__bytes__
+
+    @property
+    def count(self) -> int:
+        return len(self.__items__)
+
+def to_columns(cache:CacheList) -> dict:
+    '''
+    按列转换成可以json序列化的dict，批量查询的json格式用
+    '''
+    data = cache.data
+    columns = dict()
+    for fname in data.dtype.names:
+        col = data[fname]
+        if col.dtype.kind == "S":
+            col = np.char.decode(col)
+        columns[fname] = col.tolist()
+    return columns
+
+def from_columns(cache:CacheList, columns:dict) -> CacheList:
+    '''
+    将to_columns生成的列数据还原到cache中
+    '''
+    dtype = cache.data.dtype
+    count = len(next(iter(columns.values()))) if len(columns) > 0 else 0
+    items = np.zeros(count, dtype=dtype)
+    for fname, values in columns.items():
+        if fname in dtype.names:
+            items[fname] = values
+    cache.extend(items)
+    return cache
+
+def from_records(cache:CacheList, records:list) -> CacheList:
+    '''
+    将json格式的逐条数据还原到cache中，服务端不支持二进制格式时用
+    '''
+    if len(records) == 0:
+        return cache
+    return from_columns(cache, {key: [item[key] for item in records] for key in records[0]})
+
+def check_item_size(itemsize, dtype:np.dtype):
+    '''
+    校验服务端的结构体大小，不一致说明两端的结构体版本不同\n
+    @itemsize   响应头X-Item-Size的值，没有则不校验
+    '''
+    if itemsize is None:
+        return
+
+    itemsize = int(itemsize)
+    if itemsize != dtype.itemsize:
+        raise Exception('Struct size mismatch: %d from server, %d expected' % (itemsize, dtype.itemsize))
+
+def decode_binary(body:bytes, cache:CacheList) -> CacheList:
+    '''
+    将二进制响应解码到cache中
+    '''
+    dtype = cache.data.dtype
+    if len(body) % dtype.itemsize != 0:
+        raise Exception('Incomplete binary data: %d bytes left' % (len(body) % dtype.itemsize))
+    cache.extend(np.frombuffer(body, dtype=dtype))
+    return cache
+
+def decode_binary_batch(body:bytes, cacheType:type) -> dict:
+    '''
+    解码批量查询的二进制响应，格式见encode_binary_batch\n
+    @return {code: cache}，没有数据的代码对应None
+    '''
+    dtype = cacheType().data.dtype
+    view = memoryview(body)
+    headLen = struct.unpack("<I", view[:4])[0]
+    index = json.loads(bytes(view[4:4+headLen]).decode("utf-8"))
+    offset = 4 + headLen
+    caches = dict()
+    for code, count in index:
+        if count < 0:
+            caches[code] = None
+            continue
+
+        size = count*dtype.itemsize
+        if offset + size > len(view):
+            raise Exception('Incomplete binary data of %s' % (code))
+
+        cache = cacheType()
+        cache.extend(np.frombuffer(view[offset:offset+size], dtype=dtype, count=count))
+        caches[code] = cache
+        offset += size
+    return caches
+
 def httpPost(url, datas:dict, encoding='utf-8') -> dict:
     headers = {
         'User-Agent': 'Mozilla/4.0 (compatible; MSIE 5.5; Windows NT)',
@@ -54,6 +453,101 @@ def httpPost(url, datas:dict, encoding='utf-8') -> dict:
     else:
         return None
 
+def httpPostBinary(url, datas:dict, cache:CacheList, encoding='utf-8'):
+    '''
+    以二进制格式请求数据，边接收边解码到cache中\n
+    服务端不支持二进制格式(旧版本)或者请求出错时，返回的是json，按httpPost的方式解析\n
+    @cache  接收数据的缓存，BarList或者TickList\n
+    @return 二进制格式返回cache，json格式返回解析后的dict
+    '''
+    headers = {
+        'User-Agent': 'Mozilla/4.0 (compatible; MSIE 5.5; Windows NT)',
+        'Accept': '%s, text/json' % (BINARY_MIME),
+        'Accept-encoding': 'gzip'
+    }
+    data = json.dumps(datas).encode("utf-8")
+    request = urllib.request.Request(url, data, headers)
+    f = urllib.request.urlopen(request)
+    rspHeaders = f.headers
+    ctype = rspHeaders.get('Content-Type', '')
+    ec = rspHeaders.get('Content-Encoding')
+    if ec == 'gzip':
+        cs = io.BytesIO(f.read())
+        f.close()
+        f = gzip.GzipFile(fileobj=cs)
+
+    if not ctype.startswith(BINARY_MIME):
+        ret = json.loads(f.read().decode(encoding))
+        f.close()
+        return ret
+
+    dtype = cache.data.dtype
+    itemsize = dtype.itemsize
+    try:
+        check_item_size(rspHeaders.get('X-Item-Size'), dtype)
+    except Exception:
+        f.close()
+        raise
+
+    cache.reserve(len(cache) + int(rspHeaders.get('X-Data-Count', 0)))
+
+    # 分块读取，不完整的结构体留到下一块拼接
+    rest = b''
+    while True:
+        chunk = f.read(BINARY_CHUNK_SIZE)
+        if not chunk:
+            break
+        if rest:
+            chunk = rest + chunk
+        count = len(chunk)//itemsize
+        cache.extend(np.frombuffer(chunk, dtype=dtype, count=count))
+        rest = chunk[count*itemsize:]
+    f.close()
+
+    if rest:
+        raise Exception('Incomplete binary data: %d bytes left' % (len(rest)))
+    return cache
+
+def httpPostBatch(url, datas:dict, cacheType:type, encoding='utf-8') -> dict:
+    '''
+    批量请求多个代码的数据，优先使用二进制格式\n
+    @cacheType  数据缓存类型，BarList或者TickList\n
+    @return 和json响应一致的dict，data为{code: cache}，没有数据的代码对应None
+    '''
+    headers = {
+        'User-Agent': 'Mozilla/4.0 (compatible; MSIE 5.5; Windows NT)',
+        'Accept': '%s, text/json' % (BINARY_MIME),
+        'Accept-encoding': 'gzip'
+    }
+    data = json.dumps(datas).encode("utf-8")
+    request = urllib.request.Request(url, data, headers)
+    f = urllib.request.urlopen(request)
+    rspHeaders = f.headers
+    ctype = rspHeaders.get('Content-Type', '')
+    ec = rspHeaders.get('Content-Encoding')
+    if ec == 'gzip':
+        cs = io.BytesIO(f.read())
+        f.close()
+        f = gzip.GzipFile(fileobj=cs)
+
+    if not ctype.startswith(BINARY_MIME):
+        ret = json.loads(f.read().decode(encoding))
+        f.close()
+        if ret["result"] == 0:
+            ret["data"] = {code: None if columns is None else from_columns(cacheType(), columns) for code, columns in ret["data"].items()}
+        return ret
+
+    body = f.read()
+    f.close()
+    check_item_size(rspHeaders.get('X-Item-Size'), cacheType().data.dtype)
+    caches = decode_binary_batch(body, cacheType)
+
+    return {
+        "result":0,
+        "message":"Ok",
+        "data":caches
+    }
+
 @singleton
 class WtDtServo:
 
@@ -64,6 +558,18 @@ class WtDtServo:
         self.local_api = None
         self.server_inst = None
         self.remote_api = None    
+        # 批量查询的线程数，所有请求共用一个线程池
+        self.batch_workers = 4
+        self.__batch_pool__ = None
+        self.__batch_lock__ = threading.Lock()
+        self.__serve_opts__ = {
+            "backend": "werkzeug",
+            "workers": 16,
+            "timeout": 60,
+            "maxPending": 64
+        }
+        # 服务端查询结果缓存
+        self.__rsp_cache__ = ResponseCache()
 
     def __check_config__(self):
         '''
@@ -109,6 +615,16 @@ class WtDtServo:
 
     def setStorage(self, path:str = "./storage/"):
         self.__config__["data"]["store"]["path"] = path
+
+    def setCache(self, maxBytes:int = 256*1024*1024, checkInterval:float = 5):
+        '''
+        设置服务端查询结果缓存\n
+        @maxBytes       缓存的字节数上限，为0则关闭缓存\n
+        @checkInterval  扫描存储目录的间隔，单位秒，数据文件有变化的合约相关的缓存会失效，为0则不扫描
+        '''
+        self.__rsp_cache__.max_bytes = maxBytes
+        self.__rsp_cache__.check_interval = checkInterval
+        self.__rsp_cache__.clear()
     
     def commitConfig(self):
         if self.remote_api is not None:
@@ -125,8 +641,24 @@ class WtDtServo:
         except OSError as oe:
             print(oe)
 
+    def setServeOptions(self, backend:str = "werkzeug", workers:int = 16, timeout:float = 60, maxPending:int = 64):
+        '''
+        设置web服务的运行后端，在runServer之前调用\n
+        底层接口的调用已经串行化，多个工作线程可以安全地同时处理请求\n
+        @backend    werkzeug-每个连接一个线程(默认)，pooled-固定线程池，waitress-waitress服务(需要安装)\n
+        @workers    工作线程数\n
+        @timeout    连接上读写的超时时间，单位秒\n
+        @maxPending 工作线程都忙时允许排队的连接数
+        '''
+        self.__serve_opts__ = {
+            "backend": backend,
+            "workers": workers,
+            "timeout": timeout,
+            "maxPending": maxPending
+        }
+
     def __server_impl__(self, port:int, host:str):
-        self.server_inst.run(port = port, host = host)
+        serve_app(self.server_inst, host, port, **self.__serve_opts__)
         
     def runServer(self, port:int = 8081, host="0.0.0.0", bSync:bool = True):
         if self.remote_api is not None:
@@ -152,27 +684,34 @@ class WtDtServo:
             endTime = get_param(json_data, "etime", int)
 
             if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
-                ret = {
+                return pack_rsp({
                     "result":-1,
                     "message":"Only one of stime and count must be valid at the same time"
-                }
-            else:
+                })
+
+            bBinary = want_binary(json_data)
+            key = ("bars", bBinary, stdCode, period, fromTime, dataCount, endTime)
+            entry = self.__rsp_cache__.get(key)
+            if entry is None:
                 bars = self.local_api.get_bars(stdCode=stdCode, period=period, fromTime=fromTime, dataCount=dataCount, endTime=endTime)
                 if bars is None:
-                    ret = {
+                    return pack_rsp({
                         "result":-2,
                         "message":"Data not found"
-                    }
+                    })
+
+                if bBinary:
+                    entry = encode_binary(bars)
                 else:
                     bar_list = [curBar.to_dict  for curBar in bars]
-                    
-                    ret = {
+                    entry = encode_json({
                         "result":0,
                         "message":"Ok",
                         "bars": bar_list
-                    }
+                    })
+                self.__rsp_cache__.put(key, entry, [stdCode])
 
-            return pack_rsp(ret)
+            return pack_entry(entry)
 
         @app.route("/getticks", methods=["POST"])
         def on_get_ticks():
@@ -186,17 +725,24 @@ class WtDtServo:
             endTime = get_param(json_data, "etime", int)
 
             if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
-                ret = {
+                return pack_rsp({
                     "result":-1,
                     "message":"Only one of stime and count must be valid at the same time"
-                }
-            else:
+                })
+
+            bBinary = want_binary(json_data)
+            key = ("ticks", bBinary, stdCode, fromTime, dataCount, endTime)
+            entry = self.__rsp_cache__.get(key)
+            if entry is None:
                 ticks = self.local_api.get_ticks(stdCode=stdCode, fromTime=fromTime, dataCount=dataCount, endTime=endTime)
                 if ticks is None:
-                    ret = {
+                    return pack_rsp({
                         "result":-2,
                         "message":"Data not found"
-                    }
+                    })
+
+                if bBinary:
+                    entry = encode_binary(ticks)
                 else:
                     tick_list = list()
                     for curTick in ticks:
@@ -211,16 +757,109 @@ class WtDtServo:
                         curTick.pop("ask_qty")
 
                         tick_list.append(curTick)
-                    
-                    ret = {
+
+                    entry = encode_json({
                         "result":0,
                         "message":"Ok",
                         "ticks": tick_list
-                    }
+                    })
+                self.__rsp_cache__.put(key, entry, [stdCode])
 
-            return pack_rsp(ret)
+            return pack_entry(entry)
+
+        @app.route("/getbatchbars", methods=["POST"])
+        def on_get_batch_bars():
+            bSucc, json_data = parse_data()
+            if not bSucc:
+                return pack_rsp(json_data)
+
+            codes = json_data.get("codes", [])
+            period = get_param(json_data, "period")
+            fromTime = get_param(json_data, "stime", int, None)
+            dataCount = get_param(json_data, "count", int, None)
+            endTime = get_param(json_data, "etime", int)
+
+            if not isinstance(codes, list) or len(codes) == 0:
+                return pack_rsp({
+                    "result":-1,
+                    "message":"codes must be a non-empty list"
+                })
+
+            if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
+                return pack_rsp({
+                    "result":-1,
+                    "message":"Only one of stime and count must be valid at the same time"
+                })
+
+            bBinary = want_binary(json_data)
+            key = ("batchbars", bBinary, tuple(codes), period, fromTime, dataCount, endTime)
+            entry = self.__rsp_cache__.get(key)
+            if entry is None:
+                fetcher = lambda code: self.local_api.get_bars(stdCode=code, period=period, fromTime=fromTime, dataCount=dataCount, endTime=endTime)
+                if bBinary:
+                    entry = encode_binary_batch(self.__fetch_batch__(codes, fetcher), BarList().data.dtype.itemsize)
+                else:
+                    # json格式按列编码，编码也放在读取线程里做
+                    def encoder(code):
+                        bars = fetcher(code)
+                        return None if bars is None else to_columns(bars)
+
+                    entry = encode_json({
+                        "result":0,
+                        "message":"Ok",
+                        "data":self.__fetch_batch__(codes, encoder)
+                    })
+                self.__rsp_cache__.put(key, entry, codes)
+
+            return pack_entry(entry)
+
+        @app.route("/getbatchticks", methods=["POST"])
+        def on_get_batch_ticks():
+            bSucc, json_data = parse_data()
+            if not bSucc:
+                return pack_rsp(json_data)
+
+            codes = json_data.get("codes", [])
+            fromTime = get_param(json_data, "stime", int, None)
+            dataCount = get_param(json_data, "count", int, None)
+            endTime = get_param(json_data, "etime", int)
+
+            if not isinstance(codes, list) or len(codes) == 0:
+                return pack_rsp({
+                    "result":-1,
+                    "message":"codes must be a non-empty list"
+                })
+
+            if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
+                return pack_rsp({
+                    "result":-1,
+                    "message":"Only one of stime and count must be valid at the same time"
+                })
+
+            bBinary = want_binary(json_data)
+            key = ("batchticks", bBinary, tuple(codes), fromTime, dataCount, endTime)
+            entry = self.__rsp_cache__.get(key)
+            if entry is None:
+                fetcher = lambda code: self.local_api.get_ticks(stdCode=code, fromTime=fromTime, dataCount=dataCount, endTime=endTime)
+                if bBinary:
+                    entry = encode_binary_batch(self.__fetch_batch__(codes, fetcher), TickList().data.dtype.itemsize)
+                else:
+                    # json格式按列编码，编码也放在读取线程里做
+                    def encoder(code):
+                        ticks = fetcher(code)
+                        return None if ticks is None else to_columns(ticks)
+
+                    entry = encode_json({
+                        "result":0,
+                        "message":"Ok",
+                        "data":self.__fetch_batch__(codes, encoder)
+                    })
+                self.__rsp_cache__.put(key, entry, codes)
+
+            return pack_entry(entry)
 
         self.commitConfig()
+        self.__rsp_cache__.set_folder(self.__config__["data"]["store"]["path"])
         if bSync:
             self.__server_impl__(port, host)
         else:
@@ -229,6 +868,22 @@ class WtDtServo:
             self.worker.setDaemon(True)
             self.worker.start()
 
+    def __fetch_batch__(self, codes:list, fetcher) -> dict:
+        '''
+        多线程读取多个代码的数据\n
+        底层接口的调用由WtDtServoApi串行化，数据拷贝和编码可以和下一个代码的读取重叠\n
+        @fetcher    单个代码的读取函数，参数为代码\n
+        @return     {code: 读取结果}，和codes的顺序一致
+        '''
+        if len(codes) == 0:
+            return dict()
+
+        # 多个请求线程可能同时第一次进来，加锁保证只创建一个线程池
+        with self.__batch_lock__:
+            if self.__batch_pool__ is None:
+                self.__batch_pool__ = ThreadPoolExecutor(max_workers=max(1, self.batch_workers))
+        return dict(zip(codes, self.__batch_pool__.map(fetcher, codes)))
+
     def get_bars(self, stdCode:str, period:str, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> BarList:
         '''
         获取K线数据\n
@@ -264,6 +919,43 @@ class WtDtServo:
 
         return self.local_api.get_ticks(stdCode=stdCode, fromTime=fromTime, dataCount=dataCount, endTime=endTime)
 
+    def get_bars_batch(self, codes:list, period:str, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> dict:
+        '''
+        批量获取多个代码的K线数据\n
+        @codes      标准合约代码列表\n
+        @period     基础K线周期，m1/m5/d\n
+        @fromTime   开始时间，日线数据格式yyyymmdd，分钟线数据为格式为yyyymmddHHMM\n
+        @endTime    结束时间，日线数据格式yyyymmdd，分钟线数据为格式为yyyymmddHHMM，为0则读取到最后一条\n
+        @return     {code: BarList}，没有数据的代码对应None
+        '''
+        if self.remote_api is not None:
+            return self.remote_api.get_bars_batch(codes=codes, period=period, fromTime=fromTime, dataCount=dataCount, endTime=endTime)
+
+        self.commitConfig()
+
+        if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
+            raise Exception('Only one of fromTime and dataCount must be valid at the same time')
+
+        return self.__fetch_batch__(codes, lambda code: self.local_api.get_bars(stdCode=code, period=period, fromTime=fromTime, dataCount=dataCount, endTime=endTime))
+
+    def get_ticks_batch(self, codes:list, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> dict:
+        '''
+        批量获取多个代码的tick数据\n
+        @codes      标准合约代码列表\n
+        @fromTime   开始时间，格式为yyyymmddHHMM\n
+        @endTime    结束时间，格式为yyyymmddHHMM，为0则读取到最后一条\n
+        @return     {code: TickList}，没有数据的代码对应None
+        '''
+        if self.remote_api is not None:
+            return self.remote_api.get_ticks_batch(codes=codes, fromTime=fromTime, dataCount=dataCount, endTime=endTime)
+
+        self.commitConfig()
+
+        if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
+            raise Exception('Only one of fromTime and dataCount must be valid at the same time')
+
+        return self.__fetch_batch__(codes, lambda code: self.local_api.get_ticks(stdCode=code, fromTime=fromTime, dataCount=dataCount, endTime=endTime))
+
 class WtDtRemoteServo:
 
     def __init__(self, url:str="http://127.0.0.1:8081"):
@@ -292,11 +984,15 @@ class WtDtRemoteServo:
         elif dataCount is not None:
             data["count"] = dataCount
 
-        resObj = httpPost(url, data)
+        resObj = httpPostBinary(url, data, BarList())
+        if isinstance(resObj, BarList):
+            return resObj
+
         if resObj["result"] < 0:
             print(resObj["message"])
             return None
 
+        # 服务端不支持二进制格式时，从json还原
         barCache = BarList()
         for curBar in resObj["bars"]:
             bs = WTSBarStruct()
@@ -337,11 +1033,15 @@ class WtDtRemoteServo:
         elif dataCount is not None:
             data["count"] = dataCount
 
-        resObj = httpPost(url, data)
+        resObj = httpPostBinary(url, data, TickList())
+        if isinstance(resObj, TickList):
+            return resObj
+
         if resObj["result"] < 0:
             print(resObj["message"])
             return None
 
+        # 服务端不支持二进制格式时，从json还原
         tickCache = TickList()
         for curTick in resObj["ticks"]:
             ts = WTSTickStruct()
@@ -375,3 +1075,61 @@ class WtDtRemoteServo:
 
             tickCache.append(ts)
         return tickCache
+
+    def get_bars_batch(self, codes:list, period:str, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> dict:
+        '''
+        批量获取多个代码的K线数据，一次请求返回全部代码\n
+        @codes      标准合约代码列表\n
+        @period     基础K线周期，m1/m5/d\n
+        @fromTime   开始时间，日线数据格式yyyymmdd，分钟线数据为格式为yyyymmddHHMM\n
+        @endTime    结束时间，日线数据格式yyyymmdd，分钟线数据为格式为yyyymmddHHMM，为0则读取到最后一条\n
+        @return     {code: BarList}，没有数据的代码对应None
+        '''
+        if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
+            raise Exception('Only one of fromTime and dataCount must be valid at the same time')
+
+        url = self.remote_url + "/getbatchbars"
+        data = {
+            "codes":list(codes),
+            "period":period,
+            "etime":endTime
+        }
+
+        if fromTime is not None:
+            data["stime"] = fromTime
+        elif dataCount is not None:
+            data["count"] = dataCount
+
+        resObj = httpPostBatch(url, data, BarList)
+        if resObj["result"] < 0:
+            print(resObj["message"])
+            return None
+        return resObj["data"]
+
+    def get_ticks_batch(self, codes:list, fromTime:int = None, dataCount:int = None, endTime:int = 0) -> dict:
+        '''
+        批量获取多个代码的tick数据，一次请求返回全部代码\n
+        @codes      标准合约代码列表\n
+        @fromTime   开始时间，格式为yyyymmddHHMM\n
+        @endTime    结束时间，格式为yyyymmddHHMM，为0则读取到最后一条\n
+        @return     {code: TickList}，没有数据的代码对应None
+        '''
+        if (fromTime is None and dataCount is None) or (fromTime is not None and dataCount is not None):
+            raise Exception('Only one of fromTime and dataCount must be valid at the same time')
+
+        url = self.remote_url + "/getbatchticks"
+        data = {
+            "codes":list(codes),
+            "etime":endTime
+        }
+
+        if fromTime is not None:
+            data["stime"] = fromTime
+        elif dataCount is not None:
+            data["count"] = dataCount
+
+        resObj = httpPostBatch(url, data, TickList)
+        if resObj["result"] < 0:
+            print(resObj["message"])
+            return None
+        return resObj["data"]
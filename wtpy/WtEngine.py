@@ -100,6 +100,14 @@ class WtEngine:
     def push_quote_from_extended_parser(self, id:str, newTick, bNeedSlice:bool):
         self.__wrapper__.push_quote_from_exetended_parser(id, newTick, bNeedSlice)
 
+    def enable_light_tick(self, bEnabled:bool = True):
+        '''
+        启用轻量级tick对象\n
+        启用以后策略on_tick收到的是WtTickData而不是dict，字段在访问时才解析，只读取price、time等少数字段的策略开销会小很多\n
+        WtTickData同样支持newTick["price"]的写法
+        '''
+        self.__wrapper__.enable_light_tick(bEnabled)
+
     def set_writer(self, writer:BaseIndexWriter):
         '''
         设置指标输出模块
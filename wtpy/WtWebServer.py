@@ -0,0 +1,154 @@
+'''
+Web服务的运行后端\n
+默认使用werkzeug后端，即flask自带的每个连接一个线程的服务，socket.io的长轮询和websocket不会占满工作线程\n
+WtDtServo可以选择固定线程池的pooled后端，或者waitress后端(需要安装)，限制同时处理的请求数\n
+WtMonSvr始终每个连接一个线程，pooled后端只限制socket.io以外的请求的并发数，见ConcurrencyLimiter\n
+werkzeug每个响应以后都会关闭连接，需要长连接和流水线时使用waitress后端
+'''
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import waitress
+    has_waitress = True
+except ImportError:
+    has_waitress = False
+
+SERVE_BACKENDS = ["werkzeug", "pooled", "waitress"]
+
+def get_backends() -> list:
+    '''
+    当前环境可用的后端，waitress需要单独安装
+    '''
+    if has_waitress:
+        return SERVE_BACKENDS
+    return ["werkzeug", "pooled"]
+
+class PooledWSGIServer(BaseWSGIServer):
+    '''
+    固定线程池的WSGI服务\n
+    每个连接由线程池中的一个线程处理，工作线程都忙时新连接最多排队maxPending个\n
+    排队也满了以后不再accept，后续连接留在内核的backlog里，不会无限制地创建线程
+    '''
+    multithread = True
+    request_queue_size = 128
+
+    def __init__(self, host:str, port:int, app, workers:int = 16, timeout:float = 60, maxPending:int = 64):
+        '''
+        @workers    工作线程数\n
+        @timeout    连接上读写的超时时间，单位秒，慢客户端超时以后释放工作线程\n
+        @maxPending 工作线程都忙时允许排队的连接数
+        '''
+        handler = type("PooledRequestHandler", (WSGIRequestHandler,), {
+            "protocol_version": "HTTP/1.1",
+            "timeout": timeout
+        })
+        super().__init__(host, port, app, handler=handler)
+
+        self.workers = workers
+        self.__executor__ = ThreadPoolExecutor(max_workers=workers)
+        self.__pending__ = threading.BoundedSemaphore(workers + maxPending)
+
+    def process_request(self, request, client_address):
+        self.__pending__.acquire()
+        try:
+            self.__executor__.submit(self.__process__, request, client_address)
+        except Exception:
+            self.__pending__.release()
+            self.shutdown_request(request)
+            raise
+
+    def __process__(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.__pending__.release()
+
+    def server_close(self):
+        super().server_close()
+        self.__executor__.shutdown(wait=False)
+
+def make_server(app, host:str, port:int, workers:int = 16, timeout:float = 60, maxPending:int = 64) -> PooledWSGIServer:
+    '''
+    创建pooled后端的服务，调用serve_forever开始服务，shutdown停止
+    '''
+    return PooledWSGIServer(host, port, app, workers, timeout, maxPending)
+
+class ConcurrencyLimiter:
+    '''
+    限制同时处理的请求数的WSGI中间件，用在每个连接一个线程的服务上\n
+    bypass中的路径不受限制，socket.io的长轮询和websocket会长时间占用线程，不能计入并发数\n
+    超过并发数的请求最多排队maxPending个，排队满了或者等待超时返回503
+    '''
+    def __init__(self, app, limit:int = 16, timeout:float = 60, maxPending:int = 64, bypass:list = []):
+        '''
+        @app        被包装的WSGI应用\n
+        @limit      同时处理的请求数\n
+        @timeout    排队等待的超时时间，单位秒\n
+        @maxPending 允许排队的请求数\n
+        @bypass     不受限制的路径前缀
+        '''
+        self.app = app
+        self.timeout = timeout
+        self.bypass = tuple(bypass)
+        self.__running__ = threading.BoundedSemaphore(limit)
+        self.__pending__ = threading.BoundedSemaphore(limit + maxPending)
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "").startswith(self.bypass):
+            return self.app(environ, start_response)
+
+        if not self.__pending__.acquire(blocking=False):
+            return self.__busy__(start_response)
+
+        if not self.__running__.acquire(timeout=self.timeout):
+            self.__pending__.release()
+            return self.__busy__(start_response)
+
+        try:
+            result = self.app(environ, start_response)
+        except Exception:
+            self.__release__()
+            raise
+        # 响应体可能是延迟生成的，发送完以后才释放
+        return ClosingIterator(result, self.__release__)
+
+    def __release__(self):
+        self.__running__.release()
+        self.__pending__.release()
+
+    def __busy__(self, start_response):
+        start_response("503 Service Unavailable", [("Content-Type", "text/plain"), ("Retry-After", "1")])
+        return [b"server busy"]
+
+def serve_app(app, host:str, port:int, backend:str = "werkzeug", workers:int = 16, timeout:float = 60, maxPending:int = 64):
+    '''
+    运行WSGI应用，阻塞直到服务结束\n
+    @backend    werkzeug-flask自带的开发服务器，每个连接一个线程，pooled-固定线程池，waitress-waitress服务(需要安装)\n
+    @workers    工作线程数\n
+    @timeout    连接上读写的超时时间，单位秒\n
+    @maxPending 工作线程都忙时允许排队的连接数
+    '''
+    if backend == "waitress":
+        if not has_waitress:
+            raise Exception("waitress not installed, use pooled backend instead")
+
+        # waitress的输出缓冲超过高水位时暂停从应用读取，大响应不会全部堆在内存里
+        waitress.serve(app, host=host, port=port, threads=workers, channel_timeout=timeout,
+                connection_limit=workers + maxPending, backlog=PooledWSGIServer.request_queue_size)
+    elif backend == "werkzeug":
+        app.run(host=host, port=port, threaded=True)
+    elif backend == "pooled":
+        server = make_server(app, host, port, workers, timeout, maxPending)
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+    else:
+        raise Exception("unsupported serve backend: %s" % (backend))
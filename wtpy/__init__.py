@@ -6,7 +6,7 @@ from .WtEngine import WtEngine
 from .WtBtEngine import WtBtEngine
 from .WtDtEngine import WtDtEngine
 from .WtCoreDefs import WTSTickStruct,WTSBarStruct,EngineType
-from .WtDataDefs import WtKlineData,WtHftData
+from .WtDataDefs import WtKlineData,WtHftData,WtHftColumnData,WtTickData
 from .ExtToolDefs import BaseDataReporter, BaseIndexWriter
 from .ExtModuleDefs import BaseExtExecuter, BaseExtParser
 from .WtMsgQue import WtMsgQue, WtMQClient, WtMQServer
@@ -17,5 +17,5 @@ from wtpy.wrapper.ContractLoader import ContractLoader,LoaderType
 
 __all__ = ["BaseCtaStrategy", "BaseSelStrategy", "BaseHftStrategy", "WtEngine", "CtaContext", "SelContext", "HftContext", 
             "WtBtEngine", "WtDtEngine", "WtExecApi","WTSTickStruct","WTSBarStruct","BaseIndexWriter","BaseIndexWriter",
-            "EngineType", "WtKlineData", "WtHftData","ContractLoader", "BaseDataReporter", "BaseExtParser", "BaseExtExecuter",
+            "EngineType", "WtKlineData", "WtHftData", "WtHftColumnData", "WtTickData", "ContractLoader", "BaseDataReporter", "BaseExtParser", "BaseExtExecuter",
             "LoaderType", "WtDtServo", "WtMsgQue", "WtMQClient", "WtMQServer"]
\ No newline at end of file
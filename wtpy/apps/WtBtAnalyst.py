@@ -3,11 +3,12 @@ import pandas as pd
 import numpy as np
 from dateutil.parser import parse
 from collections import Counter
-from datetime import datetime
 
 import math
 import json
+import multiprocessing
 from xlsxwriter import Workbook
+from wtpy.WtBtOutputs import read_output
 
 
 class Calculate():
@@ -31,7 +32,7 @@ class Calculate():
     # 潜在上行比率
     def calculate_upside_ratio(self):
         acess_return = np.sum(self.ret - self.mar)
-        downside_std = self.ret[self.ret.apply(lambda x: x < 0)].std()
+        downside_std = self.ret[self.ret < 0].std()
         upside_ratio = acess_return / downside_std
         return upside_ratio
 
@@ -45,7 +46,7 @@ class Calculate():
     # 索提诺比率
     def sortion_ratio(self):
         expect_return = self.ret.mean()
-        downside_std = self.ret[self.ret.apply(lambda x: x < 0)].std()
+        downside_std = self.ret[self.ret < 0].std()
         sortion_ratio = (expect_return - self.daily_rf) / downside_std
         return sortion_ratio
 
@@ -82,7 +83,7 @@ class Calculate():
 
     # 单笔最大回撤
     def single_largest_maxdrawdown(self):
-        single_largest_mdd = self.ret[self.ret.apply(lambda x: x < 0)]
+        single_largest_mdd = self.ret[self.ret < 0]
         if len(single_largest_mdd) == 0:
             single_largest_mxd = 0
             return single_largest_mxd
@@ -112,21 +113,13 @@ class Calculate():
 
     # 衰落时间
     def decay_time(self):
-        netvalue = (self.ret+1).cumprod()
+        netvalue = (self.ret+1).cumprod().values
 
-        ser = []
-        temp = netvalue[0]
-        ss = 0
-        for x in netvalue:
-            if x >= temp:
-                ss = 0
-                ser.append(ss)
-                temp = x
-
-            else:
-                ss = ss + 1
-                ser.append(ss)
-        ss = max(pd.Series(ser))
+        # 创新高的位置计数归零，其余位置为距离上一次新高的周期数
+        idx = np.arange(len(netvalue))
+        reset = netvalue >= np.maximum.accumulate(netvalue)
+        ser = idx - np.maximum.accumulate(np.where(reset, idx, 0))
+        ss = ser.max()
         return ss
 
 def fmtNAN(val, defVal = 0):
@@ -135,6 +128,33 @@ def fmtNAN(val, defVal = 0):
 
     return val
 
+def split_runs(flags:np.ndarray) -> tuple:
+    '''
+    将布尔序列切分成连续相同取值的区间\n
+    @flags  布尔序列\n
+    @return (每段的起始位置, 每段的长度, 每段的取值)
+    '''
+    flags = np.asarray(flags, dtype=bool)
+    if len(flags) == 0:
+        empty = np.array([], dtype=np.int64)
+        return empty, empty, np.array([], dtype=bool)
+
+    starts = np.concatenate(([0], np.flatnonzero(flags[1:] != flags[:-1]) + 1))
+    lengths = np.diff(np.append(starts, len(flags)))
+    return starts, lengths, flags[starts]
+
+def longest_run(starts:np.ndarray, lengths:np.ndarray, mask:np.ndarray) -> tuple:
+    '''
+    找出mask选中的区间里最长的一段，长度相同时取最早的一段\n
+    @return (长度, 起始位置)，没有区间时返回(0, None)
+    '''
+    if not mask.any():
+        return 0, None
+
+    cands = np.flatnonzero(mask)
+    best = cands[np.argmax(lengths[cands])]
+    return int(lengths[best]), int(starts[best])
+
 def continue_trading_analysis(data, x_value) -> dict:
     '''
     连续交易分析
@@ -142,30 +162,16 @@ def continue_trading_analysis(data, x_value) -> dict:
     mean = data['profit'].mean()
     std = data['profit'].std()
     z_score = (x_value - mean) / std
-    times = 0
-    win_time = 0
-    ltimes = 0
-    loss_time = 0
-    for i in range(len(data)-1):
-        sss = data['profit'][i]
-        if sss > 0:
-            times += 1
-            ltimes = 0
-            rem = i
-            if times > win_time:
-                win_time = times
-                con_win_p_end = rem
-        else:
-            times = 0
-            ltimes += 1
-            rem = i
-            if ltimes > loss_time:
-                loss_time = ltimes
-                con_loss_p_end = rem
+
+    # 最后一笔交易不参与统计
+    profits = data['profit'].values
+    starts, lengths, flags = split_runs(profits[:-1] > 0)
+    win_time, win_start = longest_run(starts, lengths, flags)
+    loss_time, loss_start = longest_run(starts, lengths, ~flags)
 
     capital = 500000
-    con_win_profit = (data['profit'].loc[con_win_p_end-win_time + 1:con_win_p_end]).sum()
-    con_lose_loss = (data['profit'].loc[con_loss_p_end-loss_time + 1:con_loss_p_end]).sum()
+    con_win_profit = 0 if win_start is None else profits[win_start:win_start+win_time].sum()
+    con_lose_loss = 0 if loss_start is None else profits[loss_start:loss_start+loss_time].sum()
     # con_win_p_end, win_time 连续盈利结束位置，连续盈利最大次数
     # con_loss_p_end，loss_time 连续亏损结束位置，连续亏损最大次数
 
@@ -207,7 +213,7 @@ def extreme_trading(data, time_of_std=1):
     sin_profit_mistd = avgprof - (std * time_of_std)
 
     # 极端交易数量
-    extreme_result = data[data['profit'].apply(lambda x: x > sin_profit_plstd or x < sin_profit_mistd)]
+    extreme_result = data[(data['profit'] > sin_profit_plstd) | (data['profit'] < sin_profit_mistd)]
     extreme_num = len(extreme_result)
 
     # 极端交易盈亏 1 Std. Deviation of Avg. Trade
@@ -224,105 +230,69 @@ def extreme_trading(data, time_of_std=1):
 
 def average_profit(data):
     '''
-    连续交易分析之平均收益
-    '''
-    data = data['profit']
-    win = 0
-    li = []
-    lose = 0
-    li_2 = []
-    dic= []
-    dicc = []
-    for i in range(1, len(data) - 1):
-        if (data[i] > 0) == (data[i - 1] > 0):
-            if data[i] > 0:
-                c = 1
-                win = win + c
-            else:
-                c = 1
-                lose = lose + c
-            if (data[i] > 0) == ((data[i + 1]) > 0):
-                pass
-            else:
-                if data[i] > 0:
-                    dis = {str(win): data[i-win:i+1].sum()}
-                    dic.append(dis)
-                    li.append(win)
-                    win = 0
-
-                else:
-                    dis = {str(lose): data[i-lose:i+1].sum()}
-                    dicc.append(dis)
-                    li_2.append(lose)
-                    lose = 0
-        else:
-            win = 0
-            lose = 0
+    连续交易分析之平均收益\n
+    连续次数按照序列长度减1统计，最后一个序列（到最后一笔交易为止）不统计
+    '''
+    data = data['profit'].values
+    starts, lengths, flags = split_runs(data > 0)
+    ends = starts + lengths - 1
+    valid = (lengths >= 2) & (ends <= len(data) - 2)
+
+    win_mask = valid & flags
+    lose_mask = valid & ~flags
+    li = (lengths[win_mask] - 1).tolist()
+    li_2 = (lengths[lose_mask] - 1).tolist()
     number_win = Counter(li)
     number_lose = Counter(li_2)
-    ss = pd.DataFrame()
-    for x in dic:
-        df = pd.DataFrame([x])
-        ss = pd.concat([ss, df.T])
-    win_ss = ss.reset_index()
-    win_ss = win_ss.groupby('index').mean()
-
-    ss2 = pd.DataFrame()
-    for y in dicc:
-        df = pd.DataFrame([y])
-        ss2 = pd.concat([ss2, df.T])
-    lose_ss = ss2.reset_index()
-    lose_ss = lose_ss.groupby('index').mean()
+
+    # 每段单独求和，和按切片求和的结果保持一致
+    win_sums = [data[start:start+cnt].sum() for start, cnt in zip(starts[win_mask], lengths[win_mask])]
+    lose_sums = [data[start:start+cnt].sum() for start, cnt in zip(starts[lose_mask], lengths[lose_mask])]
+    win_ss = pd.DataFrame({'index':[str(x) for x in li], 0:win_sums}).groupby('index').mean()
+    lose_ss = pd.DataFrame({'index':[str(x) for x in li_2], 0:lose_sums}).groupby('index').mean()
     result = {'连续盈利次数': number_win,
               '连续亏损次数': number_lose,
               '每个序列平均收益': win_ss,
               '每个序列平均亏损': lose_ss}
     return result
 
-def stat_closes_by_day(df_closes:df, capital) -> df:
+def stat_closes_by_period(df_closes:df, periods:pd.Series, capital) -> df:
     '''
-    按天统计平仓数据
+    按周期统计平仓数据\n
+    @periods    每笔平仓对应的周期标签
     '''
-    df_closes['day'] = df_closes['opentime']
-    df_closes['win'] = df_closes['profit'].apply(lambda x: 1 if x > 0 else 0)
-    df_closes['times'] = 1
-    df_closes['gross_profit'] = df_closes['profit'].apply(lambda x: x if x > 0 else 0)
-    df_closes['gross_loss'] = df_closes['profit'].apply(lambda x: x if x < 0 else 0)
-    profit = df_closes.groupby(df_closes['day']).sum()
+    profits = df_closes['profit']
+    stats = pd.DataFrame({
+        'profit': profits,
+        'gross_profit': profits.where(profits > 0, 0),
+        'gross_loss': profits.where(profits < 0, 0),
+        'times': 1,
+        'win': (profits > 0).astype(int)
+    })
+    profit = stats.groupby(periods.values).sum()
+    profit.index.name = periods.name
     profit['win_rate'] = profit['win'] / profit['times']
     profit['profit_ratio'] = profit['profit']*100.0/capital
     res = profit[['profit', 'gross_profit', 'gross_loss', 'times', 'win_rate','profit_ratio']]
     return res.iloc[::-1]
 
+def stat_closes_by_day(df_closes:df, capital) -> df:
+    '''
+    按天统计平仓数据
+    '''
+    return stat_closes_by_period(df_closes, df_closes['opentime'].rename('day'), capital)
+
 def stat_closes_by_month(df_closes:df, capital) -> df:
     '''
     按月统计平仓数据
     '''
-    df_closes['month'] = df_closes['opentime'].apply(lambda x: x.strftime("%Y/%m"))
-    df_closes['win'] = df_closes['profit'].apply(lambda x: 1 if x > 0 else 0)
-    df_closes['times'] = 1
-    df_closes['gross_profit'] = df_closes['profit'].apply(lambda x: x if x > 0 else 0)
-    df_closes['gross_loss'] = df_closes['profit'].apply(lambda x: x if x < 0 else 0)
-    profit = df_closes.groupby(df_closes['month']).sum()
-    profit['win_rate'] = profit['win'] / profit['times']
-    profit['profit_ratio'] = profit['profit']*100.0/capital
-    res = profit[['profit', 'gross_profit', 'gross_loss', 'times', 'win_rate','profit_ratio']]
-    return res.iloc[::-1]
+    return stat_closes_by_period(df_closes, df_closes['opentime'].dt.strftime("%Y/%m").rename('month'), capital)
 
 def stat_closes_by_year(df_closes:df, capital) -> df:
     '''
     按年统计平仓数据
     '''
-    df_closes['year'] = df_closes['opentime'].apply(lambda x: x.strftime("%Y"))
-    df_closes['win'] = df_closes['profit'].apply(lambda x: 1 if x > 0 else 0)
-    df_closes['times'] = 1
-    df_closes['gross_profit'] = df_closes['profit'].apply(lambda x: x if x > 0 else 0)
-    df_closes['gross_loss'] = df_closes['profit'].apply(lambda x: x if x < 0 else 0)
-    profit = df_closes.groupby(df_closes['year']).sum()
-    profit['win_rate'] = profit['win'] / profit['times']
-    profit['profit_ratio'] = profit['profit']*100.0/capital
-    res = profit[['profit', 'gross_profit', 'gross_loss', 'times', 'win_rate','profit_ratio']]
-    return res.iloc[::-1]
+    return stat_closes_by_period(df_closes, df_closes['opentime'].dt.strftime("%Y").rename('year'), capital)
 
 def time_analysis(df_closes:df) -> dict:
     '''
@@ -450,19 +420,19 @@ def performance_summary(input_data, input_data1, capital = 500000, rf = 0.00, pe
     # 指标class
     factors = Calculate(ret, mar, rf, period, trade)
     # 毛利
-    profit = input_data[input_data['profit'].apply(lambda x: x >= 0)]
+    profit = input_data[input_data['profit'] >= 0]
     total_profit = 0 if len(profit)==0 else profit['profit'].sum()
     # 毛损
-    loss = input_data[input_data['profit'].apply(lambda x: x < 0)]
+    loss = input_data[input_data['profit'] < 0]
     total_loss = 0 if len(loss)==0 else loss['profit'].sum()
     # 净利
     net_profit = total_profit + total_loss
     input_data1['adjust_profit'] = (input_data1['profit'] - input_data1['transaction_fee']) if len(input_data1)>0 else 0
     # 调整毛利
-    adjust_profit = input_data1[input_data1['adjust_profit'].apply(lambda x: x >= 0)]
+    adjust_profit = input_data1[input_data1['adjust_profit'] >= 0]
     total_adjust_profit = 0 if len(adjust_profit)==0 else adjust_profit['adjust_profit'].sum()
     # 调整毛损
-    adjust_loss = input_data1[input_data1['adjust_profit'].apply((lambda x: x < 0))]
+    adjust_loss = input_data1[input_data1['adjust_profit'] < 0]
     total_adjust_loss = 0 if len(adjust_loss)==0 else adjust_loss['adjust_profit'].sum()
     # 调整净利
     adjust_net_profit = total_adjust_profit + total_adjust_loss
@@ -475,7 +445,7 @@ def performance_summary(input_data, input_data1, capital = 500000, rf = 0.00, pe
     # 已付手续费
     paid_trading_fee = input_data1['transaction_fee'].sum() if len(input_data1)>0 else 0
     # 单笔最大亏损
-    single_loss = input_data[input_data['profit'].apply(lambda x: x < 0)]
+    single_loss = input_data[input_data['profit'] < 0]
     single_largest_loss = 0 if len(single_loss)==0 else abs(single_loss['profit'].min())
     # 平仓交易最大亏损
     trading_loss = single_largest_loss
@@ -556,20 +526,9 @@ def do_trading_analyze(df_closes, df_funds):
     avg_bars_in_winner = total_winbarcnts / wintimes if wintimes > 0 else "N/A"
     avg_bars_in_loser = total_losebarcnts / losetimes if losetimes > 0 else "N/A"
 
-    consecutive_wins = 0
-    consecutive_loses = 0
-
-    for idx, row in df_closes.iterrows():
-        profit = row["profit"]
-        if profit > 0:
-            consecutive_wins += 1
-            consecutive_loses = 0
-        else:
-            consecutive_wins = 0
-            consecutive_loses += 1
-
-        max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
-        max_consecutive_loses = max(max_consecutive_loses, consecutive_loses)
+    starts, lengths, flags = split_runs(df_closes["profit"].values > 0)
+    max_consecutive_wins = longest_run(starts, lengths, flags)[0]
+    max_consecutive_loses = longest_run(starts, lengths, ~flags)[0]
 
     summary = dict()
 
@@ -599,10 +558,17 @@ def do_trading_analyze(df_closes, df_funds):
     summary = summary.reset_index()
     return summary
 
-def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
+def calc_trading_stats(df_closes:df, df_funds:df, capital = 500000) -> dict:
     '''
-    交易分析
+    交易分析的计算部分，不涉及任何输出\n
+    @return 统计结果dict\n
+            trading:    总体交易分析（所有交易、多头、空头）\n
+            extreme:    极端交易\n
+            continuous: 连续交易系列分析\n
+            win_series/lose_series: 连续盈利/亏损序列统计\n
+            by_day/by_month/by_year: 日度/月度/年度绩效
     '''
+    df_closes = df_closes.copy()
     res = average_profit(df_closes)
     rr = res.get('连续盈利次数')
     df = pd.DataFrame([rr]).T
@@ -611,8 +577,8 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
 
     every_series_profit = res.get('每个序列平均收益')
     every_series_profit = every_series_profit.reset_index()
-    df['index'] = df['index'].apply(lambda x: int(x))
-    every_series_profit['index'] = every_series_profit['index'].apply(lambda x: int(x))
+    df['index'] = df['index'].astype(int)
+    every_series_profit['index'] = every_series_profit['index'].astype(int)
     f_result = df.merge(every_series_profit)
     f_result = f_result.sort_values('index')
     f_result.columns = ['连续次数', '出现次数', '每个序列平均收益']
@@ -624,8 +590,8 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
 
     every_series_loss = res.get('每个序列平均亏损')
     every_series_loss = every_series_loss.reset_index()
-    df_2['index'] = df_2['index'].apply(lambda x: int(x))
-    every_series_loss['index'] = every_series_loss['index'].apply(lambda x: int(x))
+    df_2['index'] = df_2['index'].astype(int)
+    every_series_loss['index'] = every_series_loss['index'].astype(int)
     f_2_result = df_2.merge(every_series_loss)
     f_2_result = f_2_result.sort_values('index')
     f_2_result.columns = ['连续次数', '出现次数', '每个序列平均亏损']
@@ -637,8 +603,8 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     ss = extreme_trading(df_closes)
     extre_pro = ss.get('单笔净利 +1倍标准差')
     extre_los = ss.get('单笔盈利 - 标准差')
-    data1 = df_closes[df_closes['profit'].apply(lambda x: x > extre_pro)]
-    data2 = df_closes[df_closes['profit'].apply(lambda x: x < extre_los)]
+    data1 = df_closes[df_closes['profit'] > extre_pro]
+    data2 = df_closes[df_closes['profit'] < extre_los]
     ss_1 = extreme_trading(data1)
     ss_2 = extreme_trading(data2)
     ss_1 = pd.DataFrame([ss_1]).T
@@ -648,6 +614,41 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     sss = pd.concat([ss, sss], axis=1)
     sss.columns = ['总计', '极端盈利', '极端亏损']
 
+    trade_s = do_trading_analyze(df_closes, df_funds)
+    data_1 = df_closes[df_closes['direct'].str.contains('LONG', regex=False, na=False)]
+    trade_s_long = do_trading_analyze(data_1, df_funds)
+    data_2 = df_closes[df_closes['direct'].str.contains('SHORT', regex=False, na=False)]
+    trade_s_short = do_trading_analyze(data_2, df_funds)
+    trade_s = trade_s.merge(trade_s_long, how='inner', on='index')
+    trade_s = trade_s.merge(trade_s_short,how='inner', on='index')
+    trade_s.columns =['类别', '所有交易', '多头', '空头']
+    trade_s.fillna(value=0, inplace=True)
+
+
+    df_closes['opentime'] = pd.to_datetime((df_closes['opentime'] // 10000).astype(str), format='%Y%m%d')
+    return {
+        "trading": trade_s,
+        "extreme": sss,
+        "continuous": s,
+        "win_series": f_result,
+        "lose_series": f_2_result,
+        "by_day": stat_closes_by_day(df_closes, capital),
+        "by_month": stat_closes_by_month(df_closes, capital),
+        "by_year": stat_closes_by_year(df_closes, capital)
+    }
+
+def write_trading_sheet(workbook:Workbook, stats:dict, trade_count:int):
+    '''
+    将交易分析的结果输出到excel\n
+    @stats          calc_trading_stats的结果\n
+    @trade_count    平仓交易笔数，图表要引用交易列表中的数据
+    '''
+    trade_s = stats["trading"]
+    sss = stats["extreme"]
+    s = stats["continuous"]
+    f_result = stats["win_series"]
+    f_2_result = stats["lose_series"]
+
     title_format = workbook.add_format({
         'font_size':    16,
         'bold':         True,
@@ -675,16 +676,6 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     })
     worksheet = workbook.add_worksheet('交易分析')
 
-    trade_s = do_trading_analyze(df_closes, df_funds)
-    data_1 = df_closes[df_closes['direct'].apply(lambda x: 'LONG' in x)]
-    trade_s_long = do_trading_analyze(data_1, df_funds)
-    data_2 = df_closes[df_closes['direct'].apply(lambda x: 'SHORT' in x)]
-    trade_s_short = do_trading_analyze(data_2, df_funds)
-    trade_s = trade_s.merge(trade_s_long, how='inner', on='index')
-    trade_s = trade_s.merge(trade_s_short,how='inner', on='index')
-    trade_s.columns =['类别', '所有交易', '多头', '空头']
-    trade_s.fillna(value=0, inplace=True)
-
     worksheet.write_row('A1', ['总体交易分析'], title_format)
     worksheet.write_row('B3', ['所有交易','多头交易','空头交易'], index_format)
     worksheet.write_column('A4', trade_s['类别'], index_format)
@@ -720,7 +711,7 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     next_row += len(f_2_result) + 3
     worksheet.write_row('A%d'%next_row, ['全部交易'], title_format)
     chart_col = workbook.add_chart({'type': 'scatter'})
-    length = len(df_closes)
+    length = trade_count
     sheetName = '交易列表'
     chart_col.add_series(
         {
@@ -739,7 +730,7 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     next_row += 30
     worksheet.write_row('A%d'%next_row, ['潜在盈利'], title_format)
     chart_col = workbook.add_chart({'type': 'scatter'})
-    length = len(df_closes)
+    length = trade_count
     sheetName = '交易列表'
     chart_col.add_series(
         {
@@ -760,7 +751,7 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     next_row += 30
     worksheet.write_row('A%d'%next_row, ['潜在亏损'], title_format)
     chart_col = workbook.add_chart({'type': 'scatter'})
-    length = len(df_closes)
+    length = trade_count
     sheetName = '交易列表'
     chart_col.add_series(
         {
@@ -782,8 +773,7 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     # 周期分析
     worksheet = workbook.add_worksheet('周期分析')
 
-    df_closes['opentime'] = df_closes['opentime'].apply(lambda x: parse(str(int(x / 10000))))
-    res = stat_closes_by_day(df_closes.copy(), capital)    
+    res = stats["by_day"]
     worksheet.write_row('A1', ['日度绩效分析'], title_format)
     worksheet.write_row('A3', ['期间','盈利(¤)','盈利(%)','毛利','毛损','交易次数','胜率(%)'], index_format)
     worksheet.write_column('A4', res.index, date_format)
@@ -795,7 +785,7 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     worksheet.write_column('G4', res["win_rate"]*100, value_format)
   
     next_row = 5 + len(res)
-    res = stat_closes_by_month(df_closes.copy(), capital)
+    res = stats["by_month"]
     worksheet.write_row('A%d'%(next_row+1), ['月度绩效分析'], title_format)
     worksheet.write_row('A%d'%(next_row+3), ['期间','盈利(¤)','盈利(%)','毛利','毛损','交易次数','胜率(%)'], index_format)
     worksheet.write_column('A%d'%(next_row+4), res.index, index_format)
@@ -807,7 +797,7 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     worksheet.write_column('G%d'%(next_row+4), res["win_rate"]*100, value_format)
 
     next_row = next_row + 4 + len(res)
-    res = stat_closes_by_year(df_closes.copy(), capital) 
+    res = stats["by_year"]
     worksheet.write_row('A%d'%(next_row+1), ['年度绩效分析'], title_format)
     worksheet.write_row('A%d'%(next_row+3), ['期间','盈利(¤)','盈利(%)','毛利','毛损','交易次数','胜率(%)'], index_format)
     worksheet.write_column('A%d'%(next_row+4), res.index, index_format)
@@ -818,16 +808,26 @@ def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     worksheet.write_column('F%d'%(next_row+4), res["times"], value_format)
     worksheet.write_column('G%d'%(next_row+4), res["win_rate"]*100, value_format)
 
-def strategy_analyze(workbook:Workbook, df_closes, df_trades, capital, rf = 0.0, period = 240):
+def trading_analyze(workbook:Workbook, df_closes, df_funds, capital = 500000):
     '''
-    策略分析
+    交易分析
     '''
+    write_trading_sheet(workbook, calc_trading_stats(df_closes, df_funds, capital), len(df_closes))
 
+def calc_strategy_stats(df_closes:df, df_trades:df, capital, rf = 0.0, period = 240) -> dict:
+    '''
+    策略分析的计算部分，不涉及任何输出\n
+    @return 统计结果dict\n
+            performance:    策略绩效概要（所有交易、多头、空头）\n
+            ratios:         绩效比率\n
+            time:           时间分析
+    '''
+    df_closes = df_closes.copy()
     # 截取开仓明细
-    data1_open = df_trades[df_trades['action'].apply(lambda x: 'OPEN' in x)].reset_index()
+    data1_open = df_trades[df_trades['action'].str.contains('OPEN', regex=False, na=False)].reset_index()
     data1_open = data1_open.drop(columns=['index'])
     # 截取平仓明细
-    data1_close = df_trades[df_trades['action'].apply(lambda x: 'CLOSE' in x)].reset_index()
+    data1_close = df_trades[df_trades['action'].str.contains('CLOSE', regex=False, na=False)].reset_index()
     data1_close = data1_close.drop(columns=['index'])
 
     # 将平仓明细字段重命名，并跟开仓明细合并成一个大表
@@ -847,10 +847,10 @@ def strategy_analyze(workbook:Workbook, df_closes, df_trades, capital, rf = 0.0,
     # 合并数据
     after_merge = pd.merge(df_closes, clean_data, how='inner', on='opentime')
 
-    data_long = df_closes[df_closes['direct'].apply(lambda x:'LONG' in x )].reset_index()
-    after_merge_long = after_merge[after_merge['direct'].apply(lambda x: 'LONG' in x)].reset_index()
-    data_short = df_closes[df_closes['direct'].apply(lambda x: 'SHORT' in x)].reset_index()
-    after_merge_short = after_merge[after_merge['direct'].apply(lambda x: 'SHORT' in x)].reset_index()
+    data_long = df_closes[df_closes['direct'].str.contains('LONG', regex=False, na=False)].reset_index()
+    after_merge_long = after_merge[after_merge['direct'].str.contains('LONG', regex=False, na=False)].reset_index()
+    data_short = df_closes[df_closes['direct'].str.contains('SHORT', regex=False, na=False)].reset_index()
+    after_merge_short = after_merge[after_merge['direct'].str.contains('SHORT', regex=False, na=False)].reset_index()
 
     # 全部平仓明细进行绩效分析
     result1 = performance_summary(df_closes, after_merge, capital=capital, rf=rf, period=period)
@@ -875,6 +875,23 @@ def strategy_analyze(workbook:Workbook, df_closes, df_trades, capital, rf = 0.0,
     result1 = result1.merge(result1_2,how='inner',on='策略绩效概要')
     result1 = result1.merge(result1_3,how='inner',on='策略绩效概要')
 
+    result1.fillna(value=0, inplace=True)
+    return {
+        "performance": result1,
+        "ratios": result2,
+        "time": result3
+    }
+
+def write_strategy_sheet(workbook:Workbook, stats:dict, trade_count:int):
+    '''
+    将策略分析的结果输出到excel\n
+    @stats          calc_strategy_stats的结果\n
+    @trade_count    平仓交易笔数，图表要引用交易列表中的数据
+    '''
+    result1 = stats["performance"]
+    result2 = stats["ratios"]
+    result3 = stats["time"]
+
     sheetName = '策略分析'
     worksheet = workbook.add_worksheet(sheetName)
 
@@ -896,7 +913,6 @@ def strategy_analyze(workbook:Workbook, df_closes, df_trades, capital, rf = 0.0,
         'align':        'right',  # 水平居中
         'valign':       'vcenter'  # 垂直居中
     })
-    result1.fillna(value=0, inplace=True)
     worksheet.write_row('A1', ['策略绩效概要'], title_format)    
     worksheet.write_row('B3', ['所有交易','多头交易','空头交易'], index_format)
     worksheet.write_column('A4', result1['策略绩效概要'], index_format)
@@ -915,7 +931,7 @@ def strategy_analyze(workbook:Workbook, df_closes, df_trades, capital, rf = 0.0,
     # 这里开始画图
     worksheet.write_row('A49', ['详细权益曲线'], title_format)
     chart_col = workbook.add_chart({'type': 'line'})
-    length = len(df_closes)
+    length = trade_count
     sheetName = '交易列表'
     chart_col.add_series(
         {
@@ -970,7 +986,33 @@ def strategy_analyze(workbook:Workbook, df_closes, df_trades, capital, rf = 0.0,
     chart_col.set_title({'name': '潜在盈利与亏损'})
     worksheet.insert_chart('A111', chart_col)
 
-def output_closes(workbook:Workbook, df_closes:df, capital = 500000):
+def strategy_analyze(workbook:Workbook, df_closes, df_trades, capital, rf = 0.0, period = 240):
+    '''
+    策略分析
+    '''
+    write_strategy_sheet(workbook, calc_strategy_stats(df_closes, df_trades, capital, rf, period), len(df_closes))
+
+def calc_closes_table(df_closes:df, capital = 500000) -> df:
+    '''
+    生成交易列表，在平仓明细的基础上补充进出场时间、盈亏比例和累计权益
+    '''
+    df_closes = df_closes.copy()
+    df_closes['entrytime'] = pd.to_datetime(df_closes['opentime'].astype(str), format='%Y%m%d%H%M')
+    df_closes['exittime'] = pd.to_datetime(df_closes['closetime'].astype(str), format='%Y%m%d%H%M')
+    df_closes['entertag'] = df_closes['entertag'].fillna('')
+    df_closes['exittag'] = df_closes['exittag'].fillna('')
+    df_closes["profit_ratio"] = df_closes["profit"]*100/capital
+    df_closes["total_profit_ratio"] = df_closes["totalprofit"]*100/capital
+    df_closes["max_profit_ratio"] = df_closes["maxprofit"]*100/capital
+    df_closes["max_loss_ratio"] = df_closes["maxloss"]*100/capital
+    df_closes["balance"] = df_closes['totalprofit']+capital
+    return df_closes
+
+def write_closes_sheet(workbook:Workbook, df_closes:df):
+    '''
+    将交易列表输出到excel\n
+    @df_closes  calc_closes_table的结果
+    '''
     worksheet = workbook.add_worksheet('交易列表')
     title_format = workbook.add_format({
         'font_size':    16,
@@ -998,28 +1040,19 @@ def output_closes(workbook:Workbook, df_closes:df, capital = 500000):
     })
     
 
-    df_closes['entrytime'] = df_closes['opentime'].apply(lambda x: datetime.strptime(str(x), '%Y%m%d%H%M'))
-    df_closes['exittime'] = df_closes['closetime'].apply(lambda x: datetime.strptime(str(x), '%Y%m%d%H%M'))
-
     worksheet.write_row('A1', ['交易列表'], title_format)    
     worksheet.write_row('A3', ['编号', '代码','方向','进场时间','进场价格','进场标记','出场时间','出场价格','出场标记',
     '盈利¤','盈利%','累计盈利¤','累计盈利%','潜在盈利¤','潜在盈利%','潜在亏损¤','潜在亏损%','累计权益'], index_format)
-    df_closes["profit_ratio"] = df_closes["profit"]*100/capital
-    df_closes["total_profit_ratio"] = df_closes["totalprofit"]*100/capital
-    df_closes["max_profit_ratio"] = df_closes["maxprofit"]*100/capital
-    df_closes["max_loss_ratio"] = df_closes["maxloss"]*100/capital
 
     worksheet.write_column('A4', df_closes.index+1, value_format)
     worksheet.write_column('B4', df_closes['code'], value_format)
     worksheet.write_column('C4', df_closes['direct'], value_format)
     worksheet.write_column('D4', df_closes['entrytime'], time_format)
     worksheet.write_column('E4', df_closes['openprice'], value_format)
-    ay = df_closes['entertag'].apply(lambda x: x if type(x)==str else '' if math.isnan(x) else x)
-    worksheet.write_column('F4', ay, value_format)
+    worksheet.write_column('F4', df_closes['entertag'], value_format)
     worksheet.write_column('G4', df_closes['exittime'], time_format)
     worksheet.write_column('H4', df_closes['closeprice'], value_format)
-    ay = df_closes['exittag'].apply(lambda x: x if type(x)==str else '' if math.isnan(x) else x)
-    worksheet.write_column('I4', ay, value_format)
+    worksheet.write_column('I4', df_closes['exittag'], value_format)
 
     worksheet.write_column('J4', df_closes['profit'], value_format)
     worksheet.write_column('K4', df_closes['profit_ratio'], value_format)
@@ -1029,11 +1062,38 @@ def output_closes(workbook:Workbook, df_closes:df, capital = 500000):
     worksheet.write_column('O4', df_closes['max_profit_ratio'], value_format)
     worksheet.write_column('P4', df_closes['maxloss'], value_format)
     worksheet.write_column('Q4', df_closes['max_loss_ratio'], value_format)
-    worksheet.write_column('R4', df_closes['totalprofit']+capital, value_format)
+    worksheet.write_column('R4', df_closes['balance'], value_format)
 
-def summary_analyze(df_funds:df, capital = 5000000, rf = 0, period = 240) -> dict:
+def output_closes(workbook:Workbook, df_closes:df, capital = 500000):
+    write_closes_sheet(workbook, calc_closes_table(df_closes, capital))
+
+def calc_drawdown(ayNetVals:np.ndarray) -> tuple:
     '''
-    概要分析
+    计算最大回撤和最大上涨\n
+    回撤只在净值下跌的周期统计，上涨只在净值上涨的周期统计\n
+    @ayNetVals  净值序列\n
+    @return     (最大回撤, 最大上涨)
+    '''
+    if len(ayNetVals) < 2:
+        return 0.0, 0.0
+
+    maxub = np.maximum.accumulate(ayNetVals)
+    minub = np.minimum.accumulate(ayNetVals)
+    profit = (ayNetVals[1:] - ayNetVals[:-1])/ayNetVals[:-1]
+    falldown = np.abs((ayNetVals[1:] - maxub[1:])/maxub[1:])
+    riseup = np.abs((ayNetVals[1:] - minub[1:])/minub[1:])
+
+    down = profit <= 0
+    mdd = max(0.0, falldown[down].max()) if down.any() else 0.0
+    mup = max(0.0, riseup[~down].max()) if (~down).any() else 0.0
+    return mdd, mup
+
+def calc_funds_stats(df_funds:df, capital = 5000000, rf = 0, period = 240) -> dict:
+    '''
+    逐日资金分析的计算部分，不涉及任何输出\n
+    @return 统计结果dict\n
+            summary:    概要指标，天数、累计收益、年化收益、胜率、最大回撤、最大上涨、标准差、下行标准差、夏普、索提诺、卡尔马\n
+            daily:      逐日绩效DataFrame
     '''
     init_capital = capital
     annual_days = period
@@ -1041,12 +1101,12 @@ def summary_analyze(df_funds:df, capital = 5000000, rf = 0, period = 240) -> dic
 
     #先做资金统计吧
     print("anayzing fund data……")
+    df_funds = df_funds.copy()
     df_funds["dynbalance"] += init_capital
     ayBal = df_funds["dynbalance"]              # 每日期末动态权益
 
     #生成每日期初动态权益
-    ayPreBal = np.array(ayBal.tolist()[:-1])  
-    ayPreBal = np.insert(ayPreBal, 0, init_capital)    #每日期初权益
+    ayPreBal = np.concatenate(([init_capital], ayBal.values[:-1]))    #每日期初权益
     df_funds["prebalance"] = ayPreBal
 
     #统计期末权益大于期初权益的天数，即盈利天数
@@ -1067,22 +1127,7 @@ def summary_analyze(df_funds:df, capital = 5000000, rf = 0, period = 240) -> dic
         sr = 9999.0
 
     #计算最大回撤和最大上涨
-    maxub = ayNetVals[0]
-    minub = maxub
-    mdd = 0.0
-    midd = 0.0
-    mup = 0.0
-    for idx in range(1,len(ayNetVals)):
-        maxub = max(maxub, ayNetVals[idx])
-        minub = min(minub, ayNetVals[idx])
-        profit = (ayNetVals[idx] - ayNetVals[idx-1])/ayNetVals[idx-1]
-        falldown = (ayNetVals[idx] - maxub)/maxub
-        riseup = (ayNetVals[idx] - minub)/minub
-        if profit <= 0:
-            midd = max(midd, abs(profit))
-            mdd = max(mdd, abs(falldown))
-        else:
-            mup = max(mup, abs(riseup))
+    mdd, mup = calc_drawdown(ayNetVals.values)
     #索提诺比率
     if down_delta != 0.0:
         sortino = (ar-rf)/down_delta
@@ -1093,10 +1138,31 @@ def summary_analyze(df_funds:df, capital = 5000000, rf = 0, period = 240) -> dic
     else:
         calmar = 999999.0
 
+    #  计算峰值
+    upper = np.maximum.accumulate(ayNetVals.values)
+    #  回撤指标
+    temp = 1-(ayNetVals.values)/upper
+    #  计算衰落时间
+    idx = np.arange(len(upper))
+    reset = np.concatenate(([True], upper[1:] > upper[:-1]))
+    down_time = idx - np.maximum.accumulate(np.where(reset, idx, 0))
+
+    ayDates = df_funds['date'].astype(str)
+    daily = pd.DataFrame({
+        "date": ayDates.str[:4]+'/'+ayDates.str[4:6]+'/'+ayDates.str[6:8],
+        "balance": ayBal.values,
+        "profit": ayBal.values-init_capital,
+        "netvalue": ayNetVals.values,
+        "daily_profit": ayBal.values-ayPreBal,
+        "daily_return": ayDailyReturn.values,
+        "peak": upper,
+        "drawdown": temp,
+        "max_drawdown": np.maximum.accumulate(temp),
+        "min_daily_return": np.minimum.accumulate(ayDailyReturn.values),
+        "decay_time": down_time
+    })
 
-    # key_indicator = ['交易天数', '累积收益（%）', '年化收益率（%）', '胜率（%）', '最大回撤（%）', '最大上涨（%）', '标准差（%）',
-    #         '下行波动率（%）', 'Sharpe比率', 'Sortino比率', 'Calmar比率']
-    return {
+    summary = {
         "days": days,
         "total_return":(ayNetVals.iloc[-1]-1)*100, 
         "annual_return":ar*100, 
@@ -1109,69 +1175,25 @@ def summary_analyze(df_funds:df, capital = 5000000, rf = 0, period = 240) -> dic
         "sortino_ratio":sortino, 
         "calmar_ratio":calmar
     }
+    return {
+        "summary": summary,
+        "daily": daily
+    }
 
+def summary_analyze(df_funds:df, capital = 5000000, rf = 0, period = 240) -> dict:
+    '''
+    概要分析
+    '''
+    return calc_funds_stats(df_funds, capital, rf, period)["summary"]
 
-def funds_analyze(workbook:Workbook, df_funds:df, capital = 5000000, rf = 0, period = 240):
+def write_funds_sheet(workbook:Workbook, stats:dict, capital = 5000000):
     '''
-    逐日资金分析
+    将逐日资金分析的结果输出到excel\n
+    @stats  calc_funds_stats的结果
     '''
     init_capital = capital
-    annual_days = period
-    days = len(df_funds)
-
-    #先做资金统计吧
-    print("anayzing fund data……")
-    df_funds["dynbalance"] += init_capital
-    ayBal = df_funds["dynbalance"]              # 每日期末动态权益
-
-    #生成每日期初动态权益
-    ayPreBal = np.array(ayBal.tolist()[:-1])  
-    ayPreBal = np.insert(ayPreBal, 0, init_capital)    #每日期初权益
-    df_funds["prebalance"] = ayPreBal
-
-    #统计期末权益大于期初权益的天数，即盈利天数
-    windays = len(df_funds[df_funds["dynbalance"]>df_funds["prebalance"]])
-
-    #每日净值
-    ayNetVals = (ayBal/init_capital)
-    
-    ar = math.pow(ayNetVals.iloc[-1], annual_days/days) - 1       #年化收益率=总收益率^(年交易日天数/统计天数)
-    ayDailyReturn = ayBal/ayPreBal-1 #每日收益率
-    delta = fmtNAN(ayDailyReturn.std(axis=0)*math.pow(annual_days,0.5),0)       #年化标准差=每日收益率标准差*根号下(年交易日天数)
-    down_delta = fmtNAN(ayDailyReturn[ayDailyReturn<0].std(axis=0)*math.pow(annual_days,0.5), 0)    #下行标准差=每日亏损收益率标准差*根号下(年交易日天数)
-
-    #sharpe率
-    if delta != 0.0:
-        sr = (ar-rf)/delta
-    else:
-        sr = 9999.0
-
-    #计算最大回撤和最大上涨
-    maxub = ayNetVals[0]
-    minub = maxub
-    mdd = 0.0
-    midd = 0.0
-    mup = 0.0
-    for idx in range(1,len(ayNetVals)):
-        maxub = max(maxub, ayNetVals[idx])
-        minub = min(minub, ayNetVals[idx])
-        profit = (ayNetVals[idx] - ayNetVals[idx-1])/ayNetVals[idx-1]
-        falldown = (ayNetVals[idx] - maxub)/maxub
-        riseup = (ayNetVals[idx] - minub)/minub
-        if profit <= 0:
-            midd = max(midd, abs(profit))
-            mdd = max(mdd, abs(falldown))
-        else:
-            mup = max(mup, abs(riseup))
-    #索提诺比率
-    if down_delta != 0.0:
-        sortino = (ar-rf)/down_delta
-    else:
-        sortino = 0.0
-    if mdd != 0.0:
-        calmar = ar/mdd
-    else:
-        calmar = 999999.0
+    summary = stats["summary"]
+    daily = stats["daily"]
 
     #输出到excel
     sheetName = '逐日绩效概览'
@@ -1232,14 +1254,15 @@ def funds_analyze(workbook:Workbook, df_funds:df, capital = 5000000, rf = 0, per
 
     key_indicator = ['交易天数', '累积收益（%）', '年化收益率（%）', '胜率（%）', '最大回撤（%）', '最大上涨（%）', '标准差（%）',
             '下行波动率（%）', 'Sharpe比率', 'Sortino比率', 'Calmar比率']
-    key_data = [(ayNetVals.iloc[-1]-1)*100, ar*100, (windays/days)*100, mdd*100, mup*100, delta*100, down_delta*100, sr, sortino, calmar]
+    key_data = [summary["total_return"], summary["annual_return"], summary["win_rate"], summary["max_falldown"], summary["max_profratio"], 
+            summary["std"], summary["down_std"], summary["sharpe_ratio"], summary["sortino_ratio"], summary["calmar_ratio"]]
     worksheet.write_row('A2', key_indicator, indicator_format)
-    worksheet.write_column('A3', [days], fund_data_format)
+    worksheet.write_column('A3', [summary["days"]], fund_data_format)
     worksheet.write_row('B3', key_data, fund_data_format_3)
 
     #   画图   #
     chart_col = workbook.add_chart({'type': 'line'})
-    length = days
+    length = len(daily)
     chart_col.add_series(                                   # 给图表设置格式，填充内容
         {
             'name': '=逐日绩效分析!$B$1',
@@ -1302,160 +1325,393 @@ def funds_analyze(workbook:Workbook, df_funds:df, capital = 5000000, rf = 0, per
         'valign':   'vcenter',  # 垂直居中
     })
 
-    ayDates = df_funds['date'].apply(lambda x: str(x)[:4]+'/'+str(x)[4:6]+'/'+str(x)[6:8])
-    worksheet.write_column('A3', ayDates, date_format)
-    worksheet.write_column('B3', range(len(df_funds)), fund_data_format)
-    initial = [init_capital]*len(df_funds)
+    worksheet.write_column('A3', daily["date"], date_format)
+    worksheet.write_column('B3', range(len(daily)), fund_data_format)
+    initial = [init_capital]*len(daily)
     worksheet.write_column('C3', initial, fund_data_format)
     worksheet.write_column('D3', '/', fund_data_format)
-    worksheet.write_column('E3', ayBal, fund_data_format)
-    worksheet.write_column('F3', ayBal-init_capital, fund_data_format_2)
-    worksheet.write_column('G3', ayNetVals, fund_data_format_4)
-    worksheet.write_column('H3', ayBal-ayPreBal, profit_format)
-    worksheet.write_column('I3', ayDailyReturn, percent_format)
-    #  计算峰值
-    upper = np.maximum.accumulate(ayNetVals)
-    worksheet.write_column('J3', upper, fund_data_format_4)
-    #  回撤指标
-    temp = 1-(ayNetVals)/(np.maximum.accumulate(ayNetVals))
-    worksheet.write_column('K3', temp, percent_format)
-    worksheet.write_column('L3', np.maximum.accumulate(temp), percent_format)
-    worksheet.write_column('M3', np.minimum.accumulate(ayDailyReturn), percent_format)
-    #  计算衰落时间
-    down_time = [0]
-    for i in range(1, len(upper)):
-        if upper[i] > upper[i-1]:
-            down_time.append(0)
-        else:
-            l = down_time[i-1]
-            down_time.append(l+1)
-    worksheet.write_column('N3', down_time, fund_data_format)
+    worksheet.write_column('E3', daily["balance"], fund_data_format)
+    worksheet.write_column('F3', daily["profit"], fund_data_format_2)
+    worksheet.write_column('G3', daily["netvalue"], fund_data_format_4)
+    worksheet.write_column('H3', daily["daily_profit"], profit_format)
+    worksheet.write_column('I3', daily["daily_return"], percent_format)
+    worksheet.write_column('J3', daily["peak"], fund_data_format_4)
+    worksheet.write_column('K3', daily["drawdown"], percent_format)
+    worksheet.write_column('L3', daily["max_drawdown"], percent_format)
+    worksheet.write_column('M3', daily["min_daily_return"], percent_format)
+    worksheet.write_column('N3', daily["decay_time"].tolist(), fund_data_format)
 
-class WtBtAnalyst:
+def funds_analyze(workbook:Workbook, df_funds:df, capital = 5000000, rf = 0, period = 240):
+    '''
+    逐日资金分析
+    '''
+    write_funds_sheet(workbook, calc_funds_stats(df_funds, capital, rf, period), capital)
 
-    def __init__(self):
-        self.__strategies__ = dict()
-        return
+def result_to_dict(result:dict) -> dict:
+    '''
+    将分析结果转成可以直接序列化的dict，DataFrame转成记录列表
+    '''
+    if isinstance(result, pd.DataFrame):
+        return result.reset_index().to_dict(orient="records") if result.index.name is not None else result.to_dict(orient="records")
+    elif isinstance(result, pd.Series):
+        return result.to_dict()
+    elif isinstance(result, dict):
+        return {str(k):result_to_dict(v) for k, v in result.items()}
+    elif isinstance(result, np.generic):
+        return result.item()
+    return result
 
-    def add_strategy(self,  sname:str, folder:str, init_capital:float, rf:float=0.02, annual_trading_days:int = 240):
-        self.__strategies__[sname] = {
-            "folder": folder,
-            "cap":init_capital,
-            "rf":rf,
-            "atd":annual_trading_days
-        }
+def render_excel(result:dict, filename:str):
+    '''
+    将WtBtAnalyst.analyze的结果输出到excel\n
+    @result     分析结果\n
+    @filename   excel文件名
+    '''
+    workbook = Workbook(filename)
+    if "strategy" in result:
+        trade_count = len(result["closes"])
+        write_strategy_sheet(workbook, result["strategy"], trade_count)
+        write_closes_sheet(workbook, result["closes"])
+        write_trading_sheet(workbook, result["trading"], trade_count)
+    write_funds_sheet(workbook, result["funds"], result["capital"])
+    workbook.close()
+
+def render_json(result:dict, filename:str = None) -> str:
+    '''
+    将WtBtAnalyst.analyze的结果转成json\n
+    @filename   输出文件名，为None则只返回字符串
+    '''
+    content = json.dumps(result_to_dict(result), indent=4, ensure_ascii=False, default=str)
+    if filename is not None:
+        f = open(filename, "w", encoding="utf-8")
+        f.write(content)
+        f.close()
+    return content
+
+def render_html(result:dict, filename:str = None) -> str:
+    '''
+    将WtBtAnalyst.analyze的结果转成html表格\n
+    @filename   输出文件名，为None则只返回字符串
+    '''
+    titles = {
+        "funds": "逐日绩效分析",
+        "strategy": "策略分析",
+        "trading": "交易分析",
+        "closes": "交易列表"
+    }
+    parts = ['<html><head><meta charset="utf-8"><title>%s</title></head><body>' % (result.get("name", ""))]
+    for key in ["funds", "strategy", "trading", "closes"]:
+        if key not in result:
+            continue
+
+        parts.append("<h2>%s</h2>" % (titles[key]))
+        item = result[key]
+        if isinstance(item, pd.DataFrame):
+            parts.append(item.to_html())
+            continue
+
+        for name, val in item.items():
+            parts.append("<h3>%s</h3>" % (name))
+            if isinstance(val, pd.DataFrame):
+                parts.append(val.to_html())
+            else:
+                parts.append(pd.DataFrame(pd.Series(val), columns=["值"]).to_html())
+    parts.append("</body></html>")
 
-    def run_new(self, outFileName:str = ''):
-        if len(self.__strategies__.keys()) == 0:
-            raise Exception("strategies is empty")
+    content = "\n".join(parts)
+    if filename is not None:
+        f = open(filename, "w", encoding="utf-8")
+        f.write(content)
+        f.close()
+    return content
 
-        for sname in self.__strategies__:
-            sInfo = self.__strategies__[sname]
-            folder = sInfo["folder"]
-            print("start PnL analyzing for strategy %s……" % (sname))
+def aggregate_funds(funds:dict, weights:dict = None) -> df:
+    '''
+    将多个策略的逐日资金按日期对齐后加权汇总成组合资金\n
+    某个策略在某一天没有数据时，该日之前沿用最近一天的数据，之后视为0\n
+    同一策略分段回测的结果要用stitch_funds拼接，不能用这种方式汇总\n
 
-            df_funds = pd.read_csv(folder + "funds.csv")
-            df_closes = pd.read_csv(folder + "closes.csv")
-            df_trades = pd.read_csv(folder + "trades.csv")
+    @funds      策略名称到funds.csv数据的dict\n
+    @weights    策略名称到权重的dict，为None或者没有指定的策略权重为1\n
+    @return 组合的逐日资金，列和funds.csv一致
+    '''
+    snames = [sname for sname in funds if len(funds[sname]) > 0]
+    if len(snames) == 0:
+        return df()
+
+    columns = funds[snames[0]].columns
+    fields = columns[1:]
+    # 一次concat按日期外连接对齐，列为(策略, 字段)
+    df_all = pd.concat([funds[sname].set_index('date')[fields] for sname in snames], axis=1, keys=snames)
+    df_all = df_all.sort_index().ffill().fillna(0)
+
+    if weights is not None:
+        w = pd.Series([weights.get(sname, 1.0) for sname in snames], index=snames, dtype=float)
+        df_all = df_all.mul(w, axis=1, level=0)
+
+    df_total = df_all.T.groupby(level=1, sort=False).sum().T
+    df_total = df_total[fields].reset_index()
+    df_total.columns = columns
+    return df_total
+
+def stitch_funds(funds:list) -> df:
+    '''
+    将同一策略分段回测的逐日资金按先后顺序首尾拼接\n
+    后一段的第一天和前一段的最后一天是同一天时，后一段整体加上前一段最后一天的数值，并去掉重复的这一天\n
 
-            if len(outFileName) == 0:
-                outFileName = 'Strategy[%s]_PnLAnalyzing_%s_%s.xlsx' % (sname, df_funds['date'][0], df_funds['date'].iloc[-1])
+    @funds  按时间先后排列的funds.csv数据的list\n
+    @return 拼接后的逐日资金，列和funds.csv一致
+    '''
+    segments = [item for item in funds if len(item) > 0]
+    if len(segments) == 0:
+        return df()
+
+    fields = segments[0].columns[1:]
+    parts = [segments[0]]
+    last = segments[0].iloc[-1]
+    for seg in segments[1:]:
+        if seg.iloc[0, 0] == last.iloc[0]:
+            seg = seg.copy()
+            seg[fields] = seg[fields].add(last[fields].astype(float), axis=1)
+            seg = seg.iloc[1:]
+            if len(seg) == 0:
+                continue
+        parts.append(seg)
+        last = seg.iloc[-1]
+
+    return pd.concat(parts, ignore_index=True)
+
+def analyze_strategy(sname:str, sInfo:dict, bFull:bool = True, outFileName:str = None) -> dict:
+    '''
+    分析单个策略，只依赖参数，可以直接在子进程中执行\n
 
-            workbook = Workbook(outFileName)
-            init_capital = sInfo["cap"]
-            annual_days = sInfo["atd"]
-            rf = sInfo["rf"]
+    @sname          策略名称\n
+    @sInfo          策略信息，即WtBtAnalyst.add_strategy登记的内容\n
+    @bFull          是否做完整分析，为False则只做逐日资金分析，不读取平仓和成交明细\n
+    @outFileName    excel文件名，为None则不输出excel，为空字符串则自动命名\n
+    @return 分析结果dict，funds为逐日资金分析，完整分析时还有strategy、trading、closes，分别为策略分析、交易分析和交易列表
+    '''
+    folder = sInfo["folder"]
+    init_capital = sInfo["cap"]
+    annual_days = sInfo["atd"]
+    rf = sInfo["rf"]
+
+    df_funds = read_output(folder, "funds")
+    result = {
+        "name": sname,
+        "capital": init_capital,
+        "start_date": df_funds['date'].iloc[0] if len(df_funds)>0 else 0,
+        "end_date": df_funds['date'].iloc[-1] if len(df_funds)>0 else 0
+    }
 
-            strategy_analyze(workbook, df_closes.copy(), df_trades.copy(), capital=init_capital, rf=rf, period=annual_days)
-            output_closes(workbook, df_closes.copy(), capital=init_capital)
-            trading_analyze(workbook, df_closes.copy(), df_funds.copy(), capital=init_capital)
-            funds_analyze(workbook, df_funds.copy(), capital=init_capital, rf=rf, period=annual_days)
-            workbook.close()
+    if bFull:
+        df_closes = read_output(folder, "closes")
+        df_trades = read_output(folder, "trades")
+        result["strategy"] = calc_strategy_stats(df_closes, df_trades, capital=init_capital, rf=rf, period=annual_days)
+        result["closes"] = calc_closes_table(df_closes, capital=init_capital)
+        result["trading"] = calc_trading_stats(df_closes, df_funds, capital=init_capital)
 
-            print("PnL analyzing of strategy %s done" % (sname))
+    result["funds"] = calc_funds_stats(df_funds, capital=init_capital, rf=rf, period=annual_days)
 
+    if outFileName is not None:
+        if len(outFileName) == 0:
+            outFileName = 'Strategy[%s]_PnLAnalyzing_%s_%s.xlsx' % (sname, result["start_date"], result["end_date"])
+        render_excel(result, outFileName)
+    return result
 
-    def run(self, outFileName:str = ''):
-        if len(self.__strategies__.keys()) == 0:
-            raise Exception("strategies is empty")
+def make_comparison(results:dict) -> df:
+    '''
+    生成多策略对比表，每个策略一行\n
+    @results    策略名称到分析结果的dict
+    '''
+    rows = list()
+    for sname in results:
+        result = results[sname]
+        row = {
+            "name": sname,
+            "start_date": result["start_date"],
+            "end_date": result["end_date"]
+        }
+        row.update(result["funds"]["summary"])
 
-        for sname in self.__strategies__:
-            sInfo = self.__strategies__[sname]
-            folder = sInfo["folder"]
-            print("start PnL analyzing for strategy %s……" % (sname))
+        if "strategy" in result:
+            perf = result["strategy"]["performance"].set_index("策略绩效概要")["所有交易"]
+            for key in ["净利", "调整净利", "盈利因子", "已付手续费", "单笔最大亏损"]:
+                row[key] = perf.get(key)
 
-            df_funds = pd.read_csv(folder + "funds.csv")
-            print("fund logs loaded……")
+            trading = result["trading"]["trading"].set_index("类别")["所有交易"]
+            for key in ["交易总数量", "% 胜率", "单次平均盈亏", "最大连续盈利次数", "最大连续亏损次数"]:
+                row[key] = trading.get(key)
+        rows.append(row)
 
-            init_capital = sInfo["cap"]
-            annual_days = sInfo["atd"]
-            rf = sInfo["rf"]
-            
-            if len(outFileName) == 0:
-                outFileName = 'Strategy[%s]_PnLAnalyzing_%s_%s.xlsx' % (sname, df_funds['date'][0], df_funds['date'].iloc[-1])
-            workbook = Workbook(outFileName)
-            funds_analyze(workbook, df_funds, capital=init_capital, rf=rf, period=annual_days)
-            workbook.close()
+    return df(rows).set_index("name")
 
-            print("PnL analyzing of strategy %s done" % (sname))
+class WtBtAnalyst:
 
-    def run_simple(self):
-        if len(self.__strategies__.keys()) == 0:
-            raise Exception("strategies is empty")
+    def __init__(self):
+        self.__strategies__ = dict()
+        return
 
-        for sname in self.__strategies__:
-            sInfo = self.__strategies__[sname]
-            folder = sInfo["folder"]
+    def add_strategy(self,  sname:str, folder:str, init_capital:float, rf:float=0.02, annual_trading_days:int = 240):
+        self.__strategies__[sname] = {
+            "folder": folder,
+            "cap":init_capital,
+            "rf":rf,
+            "atd":annual_trading_days
+        }
 
-            df_funds = pd.read_csv(folder + "funds.csv")
+    def analyze(self, sname:str, bFull:bool = True) -> dict:
+        '''
+        分析单个策略，只做计算不做任何输出\n
+        计算结果可以交给render_excel、render_json、render_html输出，批量分析时也可以直接使用\n
+
+        @sname  策略名称\n
+        @bFull  是否做完整分析，为False则只做逐日资金分析，不读取平仓和成交明细\n
+        @return 分析结果dict，funds为逐日资金分析，完整分析时还有strategy、trading、closes，分别为策略分析、交易分析和交易列表
+        '''
+        return analyze_strategy(sname, self.__strategies__[sname], bFull)
+
+    def __run_all__(self, bFull:bool, worker_num:int, outFileName:str = None) -> dict:
+        '''
+        分析全部策略\n
+        worker_num大于1时用进程池并行处理，每个策略的读取、计算和excel输出都在子进程中完成
+        '''
+        if len(self.__strategies__.keys()) == 0:
+            raise Exception("strategies is empty")
 
-            init_capital = sInfo["cap"]
-            annual_days = sInfo["atd"]
-            rf = sInfo["rf"]
-            
-            filename = folder + 'summary.json'
-            sumObj = summary_analyze(df_funds, capital=init_capital, rf=rf, period=annual_days)
+        # 指定了文件名时所有策略共用一个文件，只能串行输出
+        if outFileName is not None and len(outFileName) != 0 and len(self.__strategies__) > 1:
+            worker_num = 1
+
+        snames = list(self.__strategies__.keys())
+        if worker_num <= 1 or len(snames) == 1:
+            results = dict()
+            for sname in snames:
+                print("start PnL analyzing for strategy %s……" % (sname))
+                results[sname] = analyze_strategy(sname, self.__strategies__[sname], bFull, outFileName)
+                print("PnL analyzing of strategy %s done" % (sname))
+            return results
+
+        args = [(sname, self.__strategies__[sname], bFull, outFileName) for sname in snames]
+        pool = multiprocessing.Pool(processes=min(worker_num, len(snames)))
+        try:
+            items = pool.starmap(analyze_strategy, args)
+        finally:
+            pool.close()
+            pool.join()
+        print("PnL analyzing of %d strategies done" % (len(snames)))
+        return dict(zip(snames, items))
+
+    def analyze_all(self, bFull:bool = True, worker_num:int = 1) -> dict:
+        '''
+        分析全部策略，只做计算不做任何输出\n
+        @bFull      是否做完整分析\n
+        @worker_num 工作进程数，大于1时多个策略并行分析\n
+        @return 策略名称到分析结果的dict
+        '''
+        return self.__run_all__(bFull, worker_num)
+
+    def compare(self, results:dict = None, bFull:bool = False, worker_num:int = 1, outFileName:str = None) -> df:
+        '''
+        多策略对比\n
+        @results    analyze_all的结果，为None则重新分析\n
+        @bFull      重新分析时是否做完整分析，为False则只对比资金指标\n
+        @worker_num 重新分析时的工作进程数\n
+        @outFileName    对比表输出的csv文件名，为None则不输出\n
+        @return 对比表，每个策略一行
+        '''
+        if results is None:
+            results = self.__run_all__(bFull, worker_num)
+
+        df_cmp = make_comparison(results)
+        if outFileName is not None:
+            df_cmp.to_csv(outFileName, encoding='utf-8-sig')
+        return df_cmp
+
+    def run_new(self, outFileName:str = '', worker_num:int = 1) -> df:
+        '''
+        完整分析并输出excel\n
+        @outFileName    excel文件名，为空则每个策略自动命名\n
+        @worker_num     工作进程数，大于1时多个策略并行分析\n
+        @return 多策略对比表
+        '''
+        return make_comparison(self.__run_all__(True, worker_num, outFileName))
+
+    def run(self, outFileName:str = '', worker_num:int = 1) -> df:
+        '''
+        逐日资金分析并输出excel\n
+        @outFileName    excel文件名，为空则每个策略自动命名\n
+        @worker_num     工作进程数，大于1时多个策略并行分析\n
+        @return 多策略对比表
+        '''
+        return make_comparison(self.__run_all__(False, worker_num, outFileName))
+
+    def run_simple(self, worker_num:int = 1) -> df:
+        '''
+        只计算资金概要指标，写入每个策略目录下的summary.json\n
+        @worker_num     工作进程数，大于1时多个策略并行分析\n
+        @return 多策略对比表
+        '''
+        results = self.__run_all__(False, worker_num)
+        for sname in results:
+            filename = self.__strategies__[sname]["folder"] + 'summary.json'
+            sumObj = results[sname]["funds"]["summary"].copy()
             sumObj["name"] = sname
             f = open(filename,"w")
             f.write(json.dumps(sumObj, indent=4, ensure_ascii=True))
             f.close()
+
+        return make_comparison(results)
     
-    def run_multiple(self, outname:str, outFileName:str = ''):
+    def run_multiple(self, outname:str, outFileName:str = '', weights:dict = None, bSegments:bool = True) -> dict:
+        '''
+        将全部策略的逐日资金合并后做逐日资金分析并输出excel\n
+        默认按同一策略的分段回测处理，按登记顺序首尾拼接，初始资金只算一份，和早期版本的行为一致\n
+        bSegments为False时按组合处理，各策略按日期对齐加权汇总，初始资金为各策略初始资金的加权和\n
+        @outname        组合名称\n
+        @outFileName    excel文件名，为空则自动命名\n
+        @weights        策略名称到权重的dict，为None则等权，分段模式下不使用\n
+        @bSegments      是否为同一策略的分段回测，默认为True，多个不同策略组合分析时设为False\n
+        @return 组合的分析结果
+        '''
         if len(self.__strategies__.keys()) == 0:
             raise Exception("strategies is empty")
 
-        df_funds_total = pd.DataFrame()
+        funds = dict()
         init_capital = 0
         annual_days = 0
         rf = 0
         for sname in self.__strategies__:
             sInfo = self.__strategies__[sname]
-            folder = sInfo["folder"]
-            print("start PnL analyzing for strategy %s……" % (sname))
-
-            df_funds = pd.read_csv(folder + "funds.csv")
-            print("fund logs loaded……")
-            if df_funds.shape[0]>0:
-                if df_funds_total.shape[0] == 0:
-                    df_funds_total = df_funds_total.append(pd.DataFrame(data = df_funds), ignore_index = True)
-                else:
-                    if df_funds_total.iloc[-1,0] != df_funds.iloc[0,0]:
-                        df_funds_total = df_funds_total.append(pd.DataFrame(data = df_funds), ignore_index = True)
-                    else:
-                        for i in range(df_funds.shape[0]):
-                            df_funds.iloc[i,1:] = df_funds.iloc[i,1:] + df_funds_total.iloc[-1,1:]
-                        df_funds_total = df_funds_total.append(pd.DataFrame(data = df_funds.iloc[1:,:]), ignore_index = True)
-                    
-        
-        
-            init_capital = sInfo["cap"]
+            funds[sname] = read_output(sInfo["folder"], "funds")
+
+            if bSegments:
+                init_capital = sInfo["cap"]
+            else:
+                weight = 1.0 if weights is None else weights.get(sname, 1.0)
+                init_capital += sInfo["cap"]*weight
             annual_days = sInfo["atd"]
             rf = sInfo["rf"]
-        print(df_funds_total)    
+        print("fund logs of %d strategies loaded……" % (len(funds)))
+
+        if bSegments:
+            df_funds_total = stitch_funds(list(funds.values()))
+        else:
+            df_funds_total = aggregate_funds(funds, weights)
+        if len(df_funds_total) == 0:
+            raise Exception("fund logs are empty")
+
+        result = {
+            "name": outname,
+            "capital": init_capital,
+            "start_date": df_funds_total['date'].iloc[0],
+            "end_date": df_funds_total['date'].iloc[-1],
+            "funds": calc_funds_stats(df_funds_total, capital=init_capital, rf=rf, period=annual_days)
+        }
+
         if len(outFileName) == 0:
-            outFileName = 'Strategy[%s]_PnLAnalyzing_%s_%s.xlsx' % (outname, df_funds_total['date'][0], df_funds_total['date'].iloc[-1])
-        workbook = Workbook(outFileName)
-        funds_analyze(workbook, df_funds_total, capital=init_capital, rf=rf, period=annual_days)
-        workbook.close()
+            outFileName = 'Strategy[%s]_PnLAnalyzing_%s_%s.xlsx' % (outname, result["start_date"], result["end_date"])
+        render_excel(result, outFileName)
 
-        print("PnL analyzing of strategy %s done" % (outname))
\ No newline at end of file
+        print("PnL analyzing of strategy %s done" % (outname))
+        return result
@@ -1,16 +1,22 @@
 from json import encoder
 import multiprocessing
+import queue
 import time
 import threading
 import json
 
 import os
 import math
+import random
+import datetime
+import hashlib
+import sqlite3
 import numpy as np
 import pandas as pd
 from pandas import DataFrame as df
 
 from wtpy import WtBtEngine,EngineType
+from wtpy.WtBtOutputs import read_output, find_output
 from wtpy.apps import WtBtAnalyst
 
 def fmtNAN(val, defVal = 0):
@@ -48,6 +54,313 @@ class ParamInfo:
         values.append(round(curVal, self.ndigits))
         return values
 
+class BaseSearcher:
+    '''
+    参数搜索器基类\n
+    优化器每一轮调用next_batch取一批待回测的参数，回测完成以后再通过feed把每组参数的得分传回来\n
+    得分越大越好，没有回测结果的参数得分为负无穷
+    '''
+    def __init__(self, seed:int = None):
+        self.random = random.Random(seed)
+
+    def init(self, space:dict, time_ranges:list):
+        '''
+        初始化搜索空间\n
+        @space          参数名到候选值列表的dict，候选值列表即ParamInfo.gen_array()的结果\n
+        @time_ranges    回测区间列表
+        '''
+        self.names = list(space.keys())
+        self.values = [space[name] for name in self.names]
+        self.sizes = [len(vals) for vals in self.values]
+        self.time_ranges = [tuple(item) for item in time_ranges]
+
+        self.total_groups = 1
+        for cnt in self.sizes:
+            self.total_groups *= cnt
+
+    def decode(self, genes:tuple) -> dict:
+        '''
+        将每个参数的下标转成参数dict
+        '''
+        return {name:self.values[i][genes[i]] for i, name in enumerate(self.names)}
+
+    def genes_of(self, k:int) -> tuple:
+        '''
+        将组合序号转成每个参数的下标，顺序和网格遍历一致
+        '''
+        genes = list()
+        for cnt in self.sizes:
+            genes.append(k%cnt)
+            k = k // cnt
+        return tuple(genes)
+
+    def random_genes(self) -> tuple:
+        return tuple(self.random.randrange(cnt) for cnt in self.sizes)
+
+    def sample_genes(self, count:int) -> list:
+        '''
+        不重复的随机抽取count组参数
+        '''
+        count = min(count, self.total_groups)
+        return [self.genes_of(k) for k in self.random.sample(range(self.total_groups), count)]
+
+    def next_batch(self) -> list:
+        '''
+        生成下一批待回测的参数\n
+        @return (参数dict, 回测区间)的list，为空则搜索结束
+        '''
+        return []
+
+    def feed(self, trials:list):
+        '''
+        回传上一批参数的回测得分\n
+        @trials (参数dict, 回测区间, 得分)的list，顺序和next_batch返回的一致
+        '''
+        return
+
+    def batch_of(self, genes_list:list, time_ranges:list = None) -> list:
+        if time_ranges is None:
+            time_ranges = self.time_ranges
+        return [(self.decode(genes), time_range) for genes in genes_list for time_range in time_ranges]
+
+    def mean_scores(self, count:int, trials:list, groups:int = None) -> list:
+        '''
+        按参数分组，计算每组参数在多个回测区间上的平均得分
+        '''
+        if groups is None:
+            groups = len(self.time_ranges)
+        scores = list()
+        for i in range(count):
+            items = [trial[2] for trial in trials[i*groups:(i+1)*groups]]
+            scores.append(sum(items)/len(items))
+        return scores
+
+class GridSearcher(BaseSearcher):
+    '''
+    网格搜索，遍历全部参数组合
+    '''
+    def __init__(self):
+        BaseSearcher.__init__(self)
+        self.__done__ = False
+
+    def next_batch(self) -> list:
+        if self.__done__:
+            return []
+
+        self.__done__ = True
+        return self.batch_of([self.genes_of(k) for k in range(self.total_groups)])
+
+class RandomSearcher(BaseSearcher):
+    '''
+    随机搜索，从全部参数组合中不重复的抽取n_trials组
+    '''
+    def __init__(self, n_trials:int = 50, seed:int = None):
+        BaseSearcher.__init__(self, seed)
+        self.n_trials = n_trials
+        self.__done__ = False
+
+    def next_batch(self) -> list:
+        if self.__done__:
+            return []
+
+        self.__done__ = True
+        return self.batch_of(self.sample_genes(self.n_trials))
+
+class HalvingSearcher(BaseSearcher):
+    '''
+    逐次减半搜索\n
+    先随机抽取n_trials组参数，在截短的回测区间上回测，每一轮只保留得分最高的1/eta，同时把回测区间拉长eta倍\n
+    最后一轮在完整的回测区间上回测，大部分参数只需要跑很短的区间就被淘汰了
+    '''
+    def __init__(self, n_trials:int = 81, eta:int = 3, min_ratio:float = None, seed:int = None):
+        '''
+        @n_trials   初始参数组数\n
+        @eta        每一轮的淘汰倍数\n
+        @min_ratio  第一轮回测区间占完整区间的最小比例，默认为None，即按照轮数自动计算
+        '''
+        BaseSearcher.__init__(self, seed)
+        self.n_trials = n_trials
+        self.eta = max(2, int(eta))
+        self.min_ratio = min_ratio
+
+    def init(self, space:dict, time_ranges:list):
+        BaseSearcher.init(self, space, time_ranges)
+        self.__candidates__ = self.sample_genes(self.n_trials)
+
+        rounds = 0
+        cnt = len(self.__candidates__)
+        while cnt > self.eta:
+            cnt = math.ceil(cnt/self.eta)
+            rounds += 1
+        self.__rounds__ = rounds
+        self.__round__ = 0
+
+    def __ratio__(self) -> float:
+        ratio = 1.0/(self.eta**(self.__rounds__-self.__round__))
+        if self.min_ratio is not None:
+            ratio = max(ratio, self.min_ratio)
+        return min(ratio, 1.0)
+
+    @staticmethod
+    def shrink_time_range(time_range:tuple, ratio:float) -> tuple:
+        '''
+        截取回测区间的前一部分\n
+        @time_range 回测区间，时间格式如201909100930\n
+        @ratio      截取的比例
+        '''
+        if ratio >= 1:
+            return tuple(time_range)
+
+        stime = datetime.datetime.strptime(str(time_range[0]), "%Y%m%d%H%M")
+        etime = datetime.datetime.strptime(str(time_range[1]), "%Y%m%d%H%M")
+        etime = stime + (etime-stime)*ratio
+        return (time_range[0], int(etime.strftime("%Y%m%d%H%M")))
+
+    def next_batch(self) -> list:
+        if self.__round__ > self.__rounds__ or len(self.__candidates__) == 0:
+            return []
+
+        ratio = self.__ratio__()
+        time_ranges = [self.shrink_time_range(item, ratio) for item in self.time_ranges]
+        return self.batch_of(self.__candidates__, time_ranges)
+
+    def feed(self, trials:list):
+        scores = self.mean_scores(len(self.__candidates__), trials)
+        ranked = sorted(zip(scores, range(len(scores))), key=lambda x:x[0], reverse=True)
+        keep = math.ceil(len(self.__candidates__)/self.eta)
+        self.__candidates__ = [self.__candidates__[idx] for score, idx in ranked[:keep]]
+        self.__round__ += 1
+
+class EvolutionSearcher(BaseSearcher):
+    '''
+    进化搜索（遗传算法）\n
+    每个参数取值的下标作为基因，锦标赛选择、均匀交叉、变异，每一代保留elite个最优个体
+    '''
+    def __init__(self, population:int = 20, generations:int = 10, mutation_rate:float = 0.2, elite:int = 2, seed:int = None):
+        '''
+        @population     种群大小，即每一代回测的参数组数\n
+        @generations    进化代数\n
+        @mutation_rate  每个基因的变异概率\n
+        @elite          直接保留到下一代的最优个体数
+        '''
+        BaseSearcher.__init__(self, seed)
+        self.population = population
+        self.generations = generations
+        self.mutation_rate = mutation_rate
+        self.elite = elite
+
+    def init(self, space:dict, time_ranges:list):
+        BaseSearcher.init(self, space, time_ranges)
+        self.__generation__ = 0
+        self.__fitness__ = dict()
+        self.__individuals__ = self.sample_genes(self.population)
+
+    def next_batch(self) -> list:
+        if self.__generation__ >= self.generations or len(self.__individuals__) == 0:
+            return []
+
+        return self.batch_of(self.__individuals__)
+
+    def __select__(self, ranked:list) -> tuple:
+        '''
+        锦标赛选择，ranked是按照得分从高到低排好序的个体
+        '''
+        picks = [self.random.randrange(len(ranked)) for i in range(min(3, len(ranked)))]
+        return ranked[min(picks)]
+
+    def __mutate__(self, genes:list) -> tuple:
+        for i, cnt in enumerate(self.sizes):
+            if cnt <= 1 or self.random.random() >= self.mutation_rate:
+                continue
+
+            # 一半的概率在相邻的取值上微调，一半的概率随机重置
+            if self.random.random() < 0.5:
+                genes[i] = min(cnt-1, max(0, genes[i] + self.random.choice((-1, 1))))
+            else:
+                genes[i] = self.random.randrange(cnt)
+        return tuple(genes)
+
+    def feed(self, trials:list):
+        scores = self.mean_scores(len(self.__individuals__), trials)
+        for genes, score in zip(self.__individuals__, scores):
+            self.__fitness__[genes] = score
+        self.__generation__ += 1
+
+        ranked = sorted(self.__fitness__.keys(), key=lambda x:self.__fitness__[x], reverse=True)
+        count = min(self.population, self.total_groups)
+        nextGen = list(ranked[:self.elite])
+        tries = 0
+        while len(nextGen) < count and tries < count*20:
+            tries += 1
+            father = self.__select__(ranked)
+            mother = self.__select__(ranked)
+            child = [father[i] if self.random.random() < 0.5 else mother[i] for i in range(len(self.sizes))]
+            child = self.__mutate__(child)
+            if child in nextGen:
+                continue
+            nextGen.append(child)
+
+        # 已经回测过的个体由优化器直接复用结果，不会重复回测
+        self.__individuals__ = nextGen
+
+class OptResultStore:
+    '''
+    优化结果库\n
+    用sqlite保存每一组参数的汇总结果，键为策略类型、参数、回测区间和数据版本的哈希值\n
+    优化中断以后重新启动，或者多次优化的参数有重叠时，已经有结果的参数不再重复回测
+    '''
+    def __init__(self, filename:str = "optimizer_results.db"):
+        self.filename = filename
+        self.__conn__ = None
+
+    def __getstate__(self):
+        # 数据库连接不能跨进程传递，子进程也不需要访问结果库
+        state = self.__dict__.copy()
+        state["__conn__"] = None
+        return state
+
+    def __connect__(self) -> sqlite3.Connection:
+        if self.__conn__ is None:
+            self.__conn__ = sqlite3.connect(self.filename)
+            self.__conn__.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, name TEXT, summary TEXT, updatetime TEXT)")
+            self.__conn__.commit()
+        return self.__conn__
+
+    @staticmethod
+    def make_key(strategy:str, params:dict, time_range:tuple, data_version:str) -> str:
+        '''
+        生成结果键\n
+        @strategy       策略类型标识\n
+        @params         参数，不含name、start_time、end_time\n
+        @time_range     回测区间\n
+        @data_version   数据版本
+        '''
+        content = json.dumps(obj={
+            "strategy":strategy,
+            "params":params,
+            "time_range":[int(time_range[0]), int(time_range[1])],
+            "data":data_version
+        }, sort_keys=True, default=str)
+        return hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+    def get(self, key:str) -> dict:
+        row = self.__connect__().execute("SELECT summary FROM results WHERE key=?", (key,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def put(self, key:str, name:str, summary:dict):
+        conn = self.__connect__()
+        content = json.dumps(obj=summary, default=lambda x: x.item() if hasattr(x, "item") else str(x))
+        conn.execute("REPLACE INTO results (key, name, summary, updatetime) VALUES (?,?,?,?)", 
+                (key, name, content, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        conn.commit()
+
+    def close(self):
+        if self.__conn__ is not None:
+            self.__conn__.close()
+            self.__conn__ = None
+
 class WtCtaOptimizer:
     '''
     参数优化器\n
@@ -66,6 +379,18 @@ class WtCtaOptimizer:
         self.env_params = dict()
 
         self.cpp_stra_module = None
+        self.dump_summary = False
+        self.objective = "交易净盈亏"
+        self.maximize = True
+
+        self.__pool__ = None
+        self.__persistent__ = True
+        self.__task_seq__ = 0   #常驻模式下的任务序号，用于识别崩溃的进程丢失的任务
+
+        self.result_store = None
+        self.data_version = None
+        self.__task_keys__ = dict()
+        self.output_format = None
         return
 
     def add_mutable_param(self, name:str, start_val, end_val, step_val, ndigits = 1):
@@ -157,20 +482,152 @@ class WtCtaOptimizer:
 
         self.env_params["time_ranges"].append([start_time,end_time])
 
+    def set_result_store(self, filename:str = "optimizer_results.db", data_version:str = None):
+        '''
+        设置优化结果库，每完成一组回测就写入一次，重新启动时已经有结果的参数会直接跳过\n
+
+        @filename       sqlite数据库文件名，为None则关闭结果库\n
+        @data_version   数据版本，默认为None，即根据存储目录下文件的大小和修改时间自动生成，数据更新以后旧的结果自动失效
+        '''
+        if self.result_store is not None:
+            self.result_store.close()
+
+        self.result_store = OptResultStore(filename) if filename is not None else None
+        self.data_version = data_version
+
+    def set_output_format(self, fmt:str = "npz"):
+        '''
+        设置回测结果的二进制输出格式，每组回测结束后会把csv结果转存一份，后续分析时优先读取\n
+
+        @fmt    parquet、feather或者npz，为None则只输出csv
+        '''
+        self.output_format = fmt
+
+    def __get_data_version__(self) -> str:
+        '''
+        获取数据版本，没有指定的时候用存储目录下文件的大小和修改时间生成
+        '''
+        if self.data_version is not None:
+            return self.data_version
+
+        hasher = hashlib.sha1()
+        hasher.update(str(self.env_params["storage_type"]).encode("utf-8"))
+        hasher.update(json.dumps(self.env_params["db_config"], sort_keys=True, default=str).encode("utf-8"))
+        folder = self.env_params["storage_path"]
+        if folder is not None and os.path.exists(folder):
+            for root, dirs, files in os.walk(folder):
+                dirs.sort()
+                for filename in sorted(files):
+                    filepath = os.path.join(root, filename)
+                    st = os.stat(filepath)
+                    hasher.update(("%s|%d|%d" % (os.path.relpath(filepath, folder), st.st_size, st.st_mtime_ns)).encode("utf-8"))
+        self.data_version = hasher.hexdigest()
+        return self.data_version
+
+    def __task_key__(self, params:dict) -> str:
+        if self.cpp_stra_module is not None:
+            strategy = "%s:%s" % (self.cpp_stra_module, self.cpp_stra_type)
+        else:
+            strategy = "%s.%s" % (self.strategy_type.__module__, self.strategy_type.__qualname__)
+
+        values = {k:v for k, v in params.items() if k not in ("name", "start_time", "end_time")}
+        time_range = (params["start_time"], params["end_time"])
+        return OptResultStore.make_key(strategy, values, time_range, self.__get_data_version__())
+
+    def __load_cached__(self, tasks:list) -> tuple:
+        '''
+        从结果库中查找已经完成的任务\n
+        @return (已有的结果dict, 还需要回测的任务list)
+        '''
+        if self.result_store is None:
+            return dict(), tasks
+
+        cached = dict()
+        pending = list()
+        for params in tasks:
+            straName = params["name"]
+            key = self.__task_key__(params)
+            summary = self.result_store.get(key)
+            if summary is None:
+                self.__task_keys__[straName] = key
+                pending.append(params)
+                continue
+
+            # 重叠的优化任务命名前缀可能不同，以本次的名称为准
+            if "name" in summary:
+                summary["name"] = straName
+            cached[straName] = summary
+
+        if len(cached) > 0:
+            print("结果库中已有%d组结果，跳过回测" % (len(cached)))
+        return cached, pending
+
+    def __on_result__(self, name:str, summary:dict):
+        '''
+        收到一组回测结果，如果设置了结果库就立即写入，中断以后可以从这里恢复
+        '''
+        if self.result_store is None or name not in self.__task_keys__:
+            return
+
+        self.result_store.put(self.__task_keys__.pop(name), name, summary)
+
+    def __gen_param_space__(self) -> dict:
+        '''
+        生成各个可变参数的候选值
+        '''
+        param_values = dict()
+        for name in self.mutable_params:
+            param_values[name] = self.mutable_params[name].gen_array()
+        return param_values
+
+    def __make_group__(self, values:dict, start_time:int, end_time:int) -> dict:
+        '''
+        生成一组回测参数，并按照参数值自动命名\n
+        @values     可变参数的取值
+        '''
+        thisGrp = self.fixed_params.copy()  #复制固定参数
+        endix = ''
+        for name in self.mutable_params.keys():
+            curVal = values[name]
+            tname = type(curVal)
+            if tname.__name__ == "list":
+                val_str  = ''
+                for item in curVal:
+                    val_str += str(item)
+                    val_str += "_"
+
+                val_str = val_str[:-1]
+                thisGrp[name] = curVal
+                endix += name 
+                endix += "_"
+                endix += val_str
+                endix += "_"
+            else:
+                thisGrp[name] = curVal
+                endix += name 
+                endix += "_"
+                endix += str(curVal)
+                endix += "_"
+
+        endix = endix[:-1]
+        straName = self.name_prefix + endix
+        straName += "_%d_%d" % (start_time, end_time)
+        thisGrp["name"] = straName
+        thisGrp["start_time"] = start_time
+        thisGrp["end_time"] = end_time
+        return thisGrp
+
     def __gen_tasks__(self, markerfile:str = "strategies.json"):
         '''
         生成回测任务
         '''
         param_names = self.mutable_params.keys()
-        param_values = dict()
         # 先生成各个参数的变量数组
         # 并计算总的参数有多少组
+        param_values = self.__gen_param_space__()
         total_groups = 1
         for name in param_names:
-            paramInfo = self.mutable_params[name]
-            values = paramInfo.gen_array()
-            param_values[name] = values
-            total_groups *= len(values)
+            total_groups *= len(param_values[name])
 
         #再生成最终每一组的参数dict
         param_groups = list()
@@ -181,39 +638,14 @@ class WtCtaOptimizer:
             end_time = time_range[1]
             for i in range(total_groups):
                 k = i
-                thisGrp = self.fixed_params.copy()  #复制固定参数
-                endix = ''
+                values = dict()
                 for name in param_names:
                     cnt = len(param_values[name])
-                    curVal = param_values[name][k%cnt]
-                    tname = type(curVal)
-                    if tname.__name__ == "list":
-                        val_str  = ''
-                        for item in curVal:
-                            val_str += str(item)
-                            val_str += "_"
-
-                        val_str = val_str[:-1]
-                        thisGrp[name] = curVal
-                        endix += name 
-                        endix += "_"
-                        endix += val_str
-                        endix += "_"
-                    else:
-                        thisGrp[name] = curVal
-                        endix += name 
-                        endix += "_"
-                        endix += str(curVal)
-                        endix += "_"
+                    values[name] = param_values[name][k%cnt]
                     k = math.floor(k / cnt)
 
-                endix = endix[:-1]
-                straName = self.name_prefix + endix
-                straName += "_%d_%d" % (start_time, end_time)
-                thisGrp["name"] = straName
-                thisGrp["start_time"] = start_time
-                thisGrp["end_time"] = end_time
-                stra_names[straName] = thisGrp
+                thisGrp = self.__make_group__(values, start_time, end_time)
+                stra_names[thisGrp["name"]] = thisGrp
                 param_groups.append(thisGrp)
         
         # 将每一组参数和对应的策略ID落地到文件中，方便后续的分析
@@ -222,27 +654,34 @@ class WtCtaOptimizer:
         f.close()
         return param_groups
 
-    def __ayalyze_result__(self, strName:str, time_range:tuple, params:dict):
-        folder = "./outputs_bt/%s/" % (strName)
-        df_closes = pd.read_csv(folder + "closes.csv")
-        df_funds = pd.read_csv(folder + "funds.csv")
+    def __ayalyze_result__(self, strName:str, time_range:tuple, params:dict) -> dict:
+        '''
+        分析单个回测结果\n
+        回测引擎输出的closes和funds读进来以后全部在内存中用向量化的方式计算，设置了二进制输出格式时优先读取二进制文件\n
 
-        df_wins = df_closes[df_closes["profit"]>0]
-        df_loses = df_closes[df_closes["profit"]<=0]
+        @strName    策略名\n
+        @time_range 回测区间\n
+        @params     参数\n
+        @return     汇总结果，如果设置了dump_summary，会同时写入summary.json
+        '''
+        folder = "./outputs_bt/%s/" % (strName)
+        df_closes = read_output(folder, "closes", usecols=["profit","openbarno","closebarno"])
+        df_funds = read_output(folder, "funds", usecols=["fee"])
 
-        ay_WinnerBarCnts = df_wins["closebarno"]-df_wins["openbarno"]
-        ay_LoserBarCnts = df_loses["closebarno"]-df_loses["openbarno"]
+        profits = df_closes["profit"].values
+        barcnts = (df_closes["closebarno"]-df_closes["openbarno"]).values
+        flags = profits > 0
 
-        total_winbarcnts = ay_WinnerBarCnts.sum()
-        total_losebarcnts = ay_LoserBarCnts.sum()
+        total_winbarcnts = barcnts[flags].sum()
+        total_losebarcnts = barcnts[~flags].sum()
 
-        total_fee = df_funds.iloc[-1]["fee"]
+        total_fee = df_funds["fee"].values[-1]
 
-        totaltimes = len(df_closes) # 总交易次数
-        wintimes = len(df_wins)     # 盈利次数
-        losetimes = len(df_loses)   # 亏损次数
-        winamout = df_wins["profit"].sum()      #毛盈利
-        loseamount = df_loses["profit"].sum()   #毛亏损
+        totaltimes = len(profits)   # 总交易次数
+        wintimes = int(flags.sum()) # 盈利次数
+        losetimes = totaltimes - wintimes   # 亏损次数
+        winamout = profits[flags].sum()     #毛盈利
+        loseamount = profits[~flags].sum()  #毛亏损
         trdnetprofit = winamout + loseamount    #交易净盈亏
         accnetprofit = trdnetprofit - total_fee #账户净盈亏
         winrate = wintimes / totaltimes if totaltimes>0 else 0      # 胜率
@@ -257,19 +696,15 @@ class WtCtaOptimizer:
         avg_bars_in_winner = total_winbarcnts/wintimes if wintimes>0 else "N/A"
         avg_bars_in_loser = total_losebarcnts/losetimes if losetimes>0 else "N/A"
 
-        consecutive_wins = 0
-        consecutive_loses = 0
-        for idx, row in df_closes.iterrows():
-            profit = row["profit"]
-            if profit > 0:
-                consecutive_wins += 1
-                consecutive_loses = 0
-            else:
-                consecutive_wins = 0
-                consecutive_loses += 1
-            
-            max_consecutive_wins = max(max_consecutive_wins, consecutive_wins)
-            max_consecutive_loses = max(max_consecutive_loses, consecutive_loses)
+        if totaltimes > 0:
+            # 盈亏状态每变化一次就是一段新的连续区间，按区间编号统计长度
+            run_ids = np.concatenate(([0], np.cumsum(flags[1:] != flags[:-1])))
+            run_lens = np.bincount(run_ids)
+            run_flags = flags[np.concatenate(([0], np.flatnonzero(flags[1:] != flags[:-1]) + 1))]
+            if run_flags.any():
+                max_consecutive_wins = int(run_lens[run_flags].max())
+            if not run_flags.all():
+                max_consecutive_loses = int(run_lens[~run_flags].max())
 
         summary = params.copy()
         summary["开始时间"] = time_range[0]
@@ -281,27 +716,29 @@ class WtCtaOptimizer:
         summary["毛亏损"] = float(loseamount)
         summary["交易净盈亏"] = float(trdnetprofit)
         summary["胜率"] = winrate*100
-        summary["单次平均盈亏"] = avgprof
-        summary["单次盈利均值"] = avgprof_win
-        summary["单次亏损均值"] = avgprof_lose
-        summary["单次盈亏均值比"] = winloseratio
+        summary["单次平均盈亏"] = float(avgprof)
+        summary["单次盈利均值"] = float(avgprof_win)
+        summary["单次亏损均值"] = float(avgprof_lose)
+        summary["单次盈亏均值比"] = winloseratio if winloseratio == "N/A" else float(winloseratio)
         summary["最大连续盈利次数"] = max_consecutive_wins
         summary["最大连续亏损次数"] = max_consecutive_loses
-        summary["平均盈利周期"] = avg_bars_in_winner
-        summary["平均亏损周期"] = avg_bars_in_loser
-        summary["平均账户收益率"] = accnetprofit/totaltimes
+        summary["平均盈利周期"] = avg_bars_in_winner if wintimes == 0 else float(avg_bars_in_winner)
+        summary["平均亏损周期"] = avg_bars_in_loser if losetimes == 0 else float(avg_bars_in_loser)
+        summary["平均账户收益率"] = float(accnetprofit/totaltimes) if totaltimes>0 else 0
 
-        f = open(folder+"summary.json", mode="w")
-        f.write(json.dumps(obj=summary, indent=4))
-        f.close()
+        if self.dump_summary:
+            f = open(folder+"summary.json", mode="w")
+            f.write(json.dumps(obj=summary, indent=4))
+            f.close()
 
-        return
+        return summary
 
-    def __execute_task__(self, params:dict):
+    def __execute_task__(self, params:dict, result_queue:multiprocessing.Queue = None):
         '''
         执行单个回测任务\n
 
-        @params kv形式的参数
+        @params kv形式的参数\n
+        @result_queue   结果队列，回测结束以后将(策略名, 汇总结果)投递回主进程
         '''
         name = params["name"]
         f = open("logcfg_tpl.json", "r")
@@ -312,6 +749,7 @@ class WtCtaOptimizer:
         engine.init(self.env_params["deps_dir"], self.env_params["cfgfile"])
         engine.configBacktest(params["start_time"], params["end_time"])
         engine.configBTStorage(mode=self.env_params["storage_type"], path=self.env_params["storage_path"], dbcfg=self.env_params["db_config"])
+        engine.set_output_format(self.output_format)
 
         time_range = (params["start_time"], params["end_time"])
 
@@ -330,77 +768,390 @@ class WtCtaOptimizer:
         engine.run_backtest()
         engine.release_backtest()
 
-        self.__ayalyze_result__(name, time_range, params)
+        summary = self.__ayalyze_result__(name, time_range, params)
+        if result_queue is not None:
+            result_queue.put((name, summary))
 
-    def __start_task__(self, params:dict):
+    def __start_task__(self, params:dict, result_queue:multiprocessing.Queue = None):
         '''
         启动单个回测任务\n
         这里用线程启动子进程的目的是为了可以控制总的工作进程个数\n
         可以在线程中join等待子进程结束，再更新running_worker变量\n
         如果在__execute_task__中修改running_worker，因为在不同进程中，数据并不同步\n
 
-        @params kv形式的参数
+        @params kv形式的参数\n
+        @result_queue   结果队列
         '''
-        p = multiprocessing.Process(target=self.__execute_task__, args=(params,))
+        p = multiprocessing.Process(target=self.__execute_task__, args=(params, result_queue))
         p.start()
         p.join()
         self.running_worker -= 1
         print("工作进程%d个" % (self.running_worker))
 
-    def go(self, interval:float = 0.2, out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv"):
+    def __worker_proc__(self, worker_id:int, task_queue:multiprocessing.Queue, done_queue:multiprocessing.Queue, current):
         '''
-        启动优化器\n
-        @interval   时间间隔，单位秒
-        @markerfile 标记文件名，回测完成以后分析会用到
+        常驻工作进程\n
+        引擎在进程内只初始化一次，然后循环从任务队列中取参数执行回测，直到取到None为止\n
+        基础文件、配置和已经加载的历史数据都可以在多次回测之间复用\n
+
+        @worker_id  工作进程编号\n
+        @task_queue 任务队列，每一项为(任务序号, 参数)\n
+        @done_queue 完成通知队列，每完成一个任务投递一次(任务序号, 策略名, 汇总结果)\n
+        @current    共享数组，记录每个工作进程正在执行的任务序号，-1表示空闲\n
+                    写入是同步的，进程在底层崩溃时主进程也能知道丢失的是哪个任务
+        '''
+        # 日志只能在引擎初始化时配置一次，所以常驻模式下按工作进程命名
+        f = open("logcfg_tpl.json", "r")
+        content =f.read()
+        f.close()
+        content = content.replace("$NAME$", "%sworker_%d" % (self.name_prefix, worker_id))
+        engine = WtBtEngine(eType=EngineType.ET_CTA, logCfg=content, isFile=False)
+        engine.init(self.env_params["deps_dir"], self.env_params["cfgfile"])
+        engine.configBTStorage(mode=self.env_params["storage_type"], path=self.env_params["storage_path"], dbcfg=self.env_params["db_config"])
+        engine.set_output_format(self.output_format)
+
+        while True:
+            task = task_queue.get()
+            if task is None:
+                break
+
+            seq, params = task
+            current[worker_id] = seq
+            name = params["name"]
+            time_range = (params.pop("start_time"), params.pop("end_time"))
+            summary = None
+            try:
+                # 配置只能提交一次，第一个任务提交配置，后面的任务只修改回测区间
+                if not engine.__cfg_commited__:
+                    engine.configBacktest(time_range[0], time_range[1])
+                    engine.commitBTConfig()
+                else:
+                    engine.set_time_range(time_range[0], time_range[1])
+
+                straInfo = self.strategy_type(**params)
+                engine.set_cta_strategy(straInfo)
+                engine.run_backtest()
+
+                summary = self.__ayalyze_result__(name, time_range, params)
+            except Exception as e:
+                print("回测任务%s执行出错：%s" % (name, e))
+
+            done_queue.put((seq, name, summary))
+            current[worker_id] = -1
+
+        engine.release_backtest()
+
+    def __start_pool__(self, task_num:int):
+        '''
+        启动常驻工作进程\n
+        @task_num   任务数，工作进程数不会超过任务数
+        '''
+        task_queue = multiprocessing.Queue()
+        done_queue = multiprocessing.Queue()
+        worker_num = max(1, min(self.worker_num, task_num))
+        current = multiprocessing.Array("q", [-1]*worker_num)
+        self.__pool__ = ([None]*worker_num, task_queue, done_queue, current)
+        for i in range(worker_num):
+            self.__spawn_worker__(i)
+        self.running_worker = worker_num
+        print("工作进程%d个" % (self.running_worker))
+
+    def __spawn_worker__(self, worker_id:int):
+        '''
+        启动(或者重新启动)一个常驻工作进程
+        '''
+        workers, task_queue, done_queue, current = self.__pool__
+        current[worker_id] = -1
+        p = multiprocessing.Process(target=self.__worker_proc__, args=(worker_id, task_queue, done_queue, current))
+        p.start()
+        workers[worker_id] = p
+
+    def __stop_pool__(self):
         '''
-        self.tasks = self.__gen_tasks__(out_marker_file)
+        通知常驻工作进程退出，并等待全部结束
+        '''
+        if self.__pool__ is None:
+            return
+
+        workers, task_queue, done_queue, current = self.__pool__
+        for p in workers:
+            task_queue.put(None)
+
+        for p in workers:
+            if p is not None:
+                p.join()
+        self.__pool__ = None
         self.running_worker = 0
-        total_task = len(self.tasks)
+
+    def __run_persistent__(self, tasks:list, interval:float = 0.2) -> dict:
+        '''
+        将任务交给常驻工作进程执行，并等待这一批任务全部完成\n
+
+        @tasks      任务列表\n
+        @interval   检查工作进程状态的时间间隔，单位秒\n
+        @return     策略名到汇总结果的dict
+        '''
+        workers, task_queue, done_queue, current = self.__pool__
+        pending = set()
+        for params in tasks:
+            seq = self.__task_seq__
+            self.__task_seq__ += 1
+            pending.add(seq)
+            task_queue.put((seq, params))
+
+        results = dict()
+        while len(pending) > 0:
+            try:
+                seq, name, summary = done_queue.get(timeout=interval)
+            except queue.Empty:
+                self.__check_workers__(pending)
+                if self.running_worker == 0 and len(pending) > 0:
+                    print("工作进程已全部退出，还有%d个任务未完成" % (len(pending)))
+                    break
+                continue
+
+            if seq not in pending:
+                continue
+            pending.discard(seq)
+            if summary is not None:
+                results[name] = summary
+                self.__on_result__(name, summary)
+            print("剩余任务%d个" % (len(pending)))
+
+        return results
+
+    def __check_workers__(self, pending:set):
+        '''
+        检查常驻工作进程，进程在底层崩溃时不会有完成通知\n
+        崩溃进程正在执行的任务记为失败，并重新启动一个工作进程继续执行剩下的任务\n
+        进程没有拿到任务就退出了(比如引擎初始化失败)，说明重启也没有用，不再重启\n
+
+        @pending    还没有完成的任务序号，失败的任务会从中移除
+        '''
+        workers, task_queue, done_queue, current = self.__pool__
+        for i, p in enumerate(workers):
+            if p is None or p.is_alive():
+                continue
+
+            seq = current[i]
+            workers[i] = None
+            if seq < 0:
+                continue
+
+            if seq in pending:
+                pending.discard(seq)
+                print("工作进程%d异常退出，任务%d执行失败，剩余任务%d个" % (i, seq, len(pending)))
+
+            # 常驻进程池会被后续批次复用，崩溃的进程总是补上
+            self.__spawn_worker__(i)
+
+        alive = len([p for p in workers if p is not None])
+        if alive != self.running_worker:
+            self.running_worker = alive
+            print("工作进程%d个" % (self.running_worker))
+
+    def __run_isolated__(self, tasks:list, interval:float = 0.2) -> dict:
+        '''
+        每个任务启动一个独立的进程执行\n
+
+        @tasks      任务列表\n
+        @interval   时间间隔，单位秒\n
+        @return     策略名到汇总结果的dict
+        '''
+        result_queue = multiprocessing.Queue()
+        results = dict()
+
+        def drain():
+            while True:
+                try:
+                    name, summary = result_queue.get_nowait()
+                    results[name] = summary
+                    self.__on_result__(name, summary)
+                except queue.Empty:
+                    break
+
+        total_task = len(tasks)
         left_task = total_task
         while True:
             if left_task == 0:
                 break
 
             if self.running_worker < self.worker_num:
-                params = self.tasks[total_task-left_task]
+                params = tasks[total_task-left_task]
                 left_task -= 1
                 print("剩余任务%d个" % (left_task))
-                p = threading.Thread(target=self.__start_task__, args=(params,))
+                p = threading.Thread(target=self.__start_task__, args=(params, result_queue))
                 p.start()
                 self.running_worker += 1
                 print("工作进程%d个" % (self.running_worker))
             else:
+                drain()
                 time.sleep(interval)
 
         #最后，全部任务都已经启动完了，再等待所有工作进程结束
         while True:
+            drain()
             if self.running_worker == 0:
                 break
             else:
                 time.sleep(interval)
 
-        #开始汇总回测结果
-        f = open(out_marker_file, "r")
-        content = f.read()
-        f.close()
+        drain()
+        return results
 
-        obj_stras = json.loads(content)
-        total_summary = list()
-        for straName in obj_stras:
-            filename = "./outputs_bt/%s/summary.json" % (straName)
-            if not os.path.exists(filename):
-                print("%s不存在，请检查数据" % (filename))
-                continue
-                
-            f = open(filename, "r")
-            content = f.read()
+    def __run_tasks__(self, tasks:list, interval:float = 0.2) -> dict:
+        if self.__pool__ is not None:
+            return self.__run_persistent__(tasks, interval)
+        else:
+            return self.__run_isolated__(tasks, interval)
+
+    def set_objective(self, key:str = "交易净盈亏", bMaximize:bool = True):
+        '''
+        设置参数搜索的优化目标\n
+        @key        汇总结果中的字段名，如交易净盈亏、胜率等\n
+        @bMaximize  是否越大越好
+        '''
+        self.objective = key
+        self.maximize = bMaximize
+
+    def __score__(self, summary:dict) -> float:
+        if summary is None:
+            return float("-inf")
+
+        val = summary.get(self.objective)
+        if not isinstance(val, (int, float)) or math.isnan(val):
+            return float("-inf")
+
+        return val if self.maximize else -val
+
+    def __search__(self, searcher:BaseSearcher, interval:float, out_marker_file:str) -> list:
+        '''
+        按照搜索器逐批生成参数并回测\n
+        同一组参数在同一个区间上只会回测一次，搜索器再次给出的时候直接复用结果\n
+        @return     全部回测过的汇总结果，按回测顺序排列
+        '''
+        searcher.init(self.__gen_param_space__(), self.env_params["time_ranges"])
+        evaluated = dict()
+        stra_names = dict()
+        batch_no = 0
+        while True:
+            batch = searcher.next_batch()
+            if len(batch) == 0:
+                break
+
+            batch_no += 1
+            names = list()
+            tasks = list()
+            for values, time_range in batch:
+                thisGrp = self.__make_group__(values, time_range[0], time_range[1])
+                straName = thisGrp["name"]
+                names.append(straName)
+                if straName in evaluated or straName in stra_names:
+                    continue
+                stra_names[straName] = thisGrp
+                tasks.append(thisGrp.copy())
+
+            cached, tasks = self.__load_cached__(tasks)
+            evaluated.update(cached)
+            print("第%d批参数%d组，新增回测任务%d个" % (batch_no, len(batch), len(tasks)))
+            f = open(out_marker_file, "w")
+            f.write(json.dumps(obj=stra_names, sort_keys=True, indent=4))
             f.close()
-            obj_summary = json.loads(content)
-            total_summary.append(obj_summary)
+
+            if len(tasks) > 0:
+                if self.__pool__ is None and self.cpp_stra_module is None and self.__persistent__:
+                    self.__start_pool__(self.worker_num)
+                evaluated.update(self.__run_tasks__(tasks, interval))
+
+            trials = list()
+            for (values, time_range), straName in zip(batch, names):
+                trials.append((values, time_range, self.__score__(evaluated.get(straName))))
+            searcher.feed(trials)
+
+        return [evaluated[name] for name in stra_names if name in evaluated]
+
+    def __best_params__(self, df_summary:df) -> dict:
+        '''
+        从汇总结果中挑选目标最优的参数\n
+        只比较在完整回测区间上的结果，逐次减半搜索前几轮在截短区间上的结果不能和完整区间的放在一起比较\n
+        有多个回测区间时，按参数分组取各区间的平均值，和搜索器的打分方式一致\n
+        @return     最优的一组参数和目标的平均值，没有可比较的结果时为None
+        '''
+        if len(df_summary) == 0 or self.objective not in df_summary.columns:
+            return None
+
+        full_ranges = set([(int(item[0]), int(item[1])) for item in self.env_params["time_ranges"]])
+        ranges = zip(df_summary["开始时间"].astype(int), df_summary["结束时间"].astype(int))
+        df_full = df_summary[[item in full_ranges for item in ranges]].copy()
+        df_full[self.objective] = pd.to_numeric(df_full[self.objective], errors="coerce")
+        df_full = df_full[df_full[self.objective].notna()]
+        if len(df_full) == 0:
+            return None
+
+        keys = [key for key in self.mutable_params.keys() if key in df_full.columns]
+        if len(keys) == 0:
+            scores = df_full[self.objective]
+            best = scores.idxmax() if self.maximize else scores.idxmin()
+            return df_full.loc[best].to_dict()
+
+        scores = df_full.groupby(keys)[self.objective].mean()
+        best = scores.idxmax() if self.maximize else scores.idxmin()
+        values = best if isinstance(best, tuple) else [best]
+        ret = {key: (val.item() if hasattr(val, "item") else val) for key, val in zip(keys, values)}
+        ret[self.objective] = float(scores.loc[best])
+        return ret
+
+    def go(self, interval:float = 0.2, out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv", 
+            bPersistent:bool = True, bDumpSummary:bool = False, searcher:BaseSearcher = None) -> df:
+        '''
+        启动优化器\n
+        @interval   时间间隔，单位秒
+        @markerfile 标记文件名，回测完成以后分析会用到
+        @out_summary_file   汇总结果文件，为None则不落地
+        @bPersistent    是否使用常驻工作进程，默认为True，每个工作进程只初始化一次引擎，循环执行多个回测任务\n
+                        CPP策略的参数要通过配置提交，只能使用每个任务一个进程的方式
+        @bDumpSummary   是否将每一组参数的汇总结果写入各自目录下的summary.json，默认不写\n
+        @searcher   参数搜索器，默认为None，即遍历全部参数组合，也可以传入RandomSearcher、HalvingSearcher、EvolutionSearcher等\n
+                    搜索器按照set_objective设置的目标挑选参数
+        @return     汇总结果DataFrame，工作进程通过队列直接把汇总结果传回来，不再读取summary.json
+        '''
+        self.running_worker = 0
+        self.dump_summary = bDumpSummary
+        self.__persistent__ = bPersistent
+        try:
+            if searcher is None:
+                self.tasks = self.__gen_tasks__(out_marker_file)
+                results, tasks = self.__load_cached__(self.tasks)
+                if len(tasks) > 0:
+                    if bPersistent and self.cpp_stra_module is None:
+                        self.__start_pool__(len(tasks))
+                    results.update(self.__run_tasks__(tasks, interval))
+
+                #开始汇总回测结果，按照任务生成的顺序输出
+                total_summary = list()
+                for params in self.tasks:
+                    straName = params["name"]
+                    if straName not in results:
+                        print("%s没有回测结果，请检查数据" % (straName))
+                        continue
+                    total_summary.append(results[straName])
+            else:
+                total_summary = self.__search__(searcher, interval, out_marker_file)
+        finally:
+            self.__stop_pool__()
+            self.__task_keys__.clear()
+            if self.result_store is not None:
+                self.result_store.close()
 
         df_summary = df(total_summary)
         # df_summary = df_summary.drop(labels=["name"], axis='columns')
-        df_summary.to_csv(out_summary_file, encoding='utf-8-sig')
+        if searcher is not None:
+            best = self.__best_params__(df_summary)
+            if best is not None:
+                print("最优参数：%s" % (best))
+        if out_summary_file is not None:
+            df_summary.to_csv(out_summary_file, encoding='utf-8-sig')
+        return df_summary
 
     def analyze(self, out_marker_file:str = "strategies.json", out_summary_file:str = "total_summary.csv"):
         #开始汇总回测结果
@@ -412,19 +1163,13 @@ class WtCtaOptimizer:
         obj_stras = json.loads(content)
         for straName in obj_stras:
             params = obj_stras[straName]
-            filename = "./outputs_bt/%s/summary.json" % (straName)
-            if not os.path.exists(filename):
-                print("%s不存在，请检查数据" % (filename))
+            folder = "./outputs_bt/%s/" % (straName)
+            if find_output(folder, "closes")[0] is None:
+                print("%s不存在，请检查数据" % (folder + "closes.csv"))
                 continue
                 
             time_range = (params["start_time"],params["end_time"])
-            self.__ayalyze_result__(straName, time_range, params)
-            
-            f = open(filename, "r")
-            content = f.read()
-            f.close()
-            obj_summary = json.loads(content)
-            total_summary.append(obj_summary)
+            total_summary.append(self.__ayalyze_result__(straName, time_range, params))
 
         df_summary = df(total_summary)
         df_summary = df_summary.drop(labels=["name"], axis='columns')
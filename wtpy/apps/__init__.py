@@ -1,5 +1,5 @@
 from .WtBtAnalyst import WtBtAnalyst
-from .WtCtaOptimizer import WtCtaOptimizer
+from .WtCtaOptimizer import WtCtaOptimizer, GridSearcher, RandomSearcher, HalvingSearcher, EvolutionSearcher, OptResultStore
 from .WtHotPicker import WtHotPicker, WtCacheMonExchg, WtCacheMonSS, WtMailNotifier, WtCacheMon
 
-__all__ = ["WtBtAnalyst","WtCtaOptimizer", "WtHotPicker", "WtCacheMonExchg", "WtCacheMonSS", "WtMailNotifier", "WtCacheMon"]
\ No newline at end of file
+__all__ = ["WtBtAnalyst","WtCtaOptimizer", "GridSearcher", "RandomSearcher", "HalvingSearcher", "EvolutionSearcher", "OptResultStore", "WtHotPicker", "WtCacheMonExchg", "WtCacheMonSS", "WtMailNotifier", "WtCacheMon"]
\ No newline at end of file
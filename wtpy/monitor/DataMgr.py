@@ -3,6 +3,7 @@ import os
 import sqlite3
 import hashlib
 import datetime
+import threading
 from .WtLogger import WtLogger
 
 def backup_file(filename):
@@ -19,10 +20,269 @@ def backup_file(filename):
     import shutil
     shutil.copy(filename, target)
 
+def get_file_sig(filepath:str) -> tuple:
+    '''
+    获取文件的签名，用于判断文件是否变化\n
+    @return (修改时间, 文件大小)，文件不存在则为None
+    '''
+    try:
+        st = os.stat(filepath)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def build_stra_positions(straid:str, json_data:dict) -> list:
+    ret = list()
+    for pItem in json_data["positions"]:
+        tag = "volumn" if "volume" not in pItem else "volume"
+        if pItem[tag] == 0.0:
+            continue
+
+        for dItem in pItem["details"]:
+            dItem["code"] = pItem["code"]
+            dItem["strategy"] = straid
+            if "volumn" in dItem:
+                dItem["volume"] = dItem["volumn"]
+                dItem.pop("volumn")
+            ret.append(dItem)
+    return ret
+
+def build_channel_positions(chnlid:str, json_data:dict) -> list:
+    ret = list()
+    for pItem in json_data["positions"]:
+        pItem["channel"] = chnlid
+        ret.append(pItem)
+    return ret
+
+def build_group_positions(json_data:dict) -> list:
+    ret = list()
+    for pItem in json_data["positions"]:
+        if pItem["volume"] == 0:
+            continue
+
+        for dItem in pItem["details"]:
+            dItem["code"] = pItem["code"]
+            ret.append(dItem)
+    return ret
+
+def build_group_performances(json_data:dict) -> dict:
+    perf = dict()
+    for pItem in json_data["positions"]:
+        code = pItem['code']
+        ay = code.split(".")
+        pid = code
+        if len(ay) > 2:
+            if ay[1] not in ['IDX','STK','ETF']:
+                pid = ay[0] + "." + ay[1]
+            else:
+                pid = ay[0] + "." + ay[2]
+
+        if pid not in perf:
+            perf[pid] = {
+                'closeprofit':0,
+                'dynprofit':0
+            }
+
+        perf[pid]['closeprofit'] += pItem['closeprofit']
+        perf[pid]['dynprofit'] += pItem['dynprofit']
+    return perf
+
+class CsvTailReader:
+    '''
+    增量读取不断追加的csv文件\n
+    记录已经读到的字节偏移和文件的inode，每次只解析新追加的完整行\n
+    文件变小视为被截断，inode变化视为被轮换，两种情况都从头重新读取
+    '''
+    def __init__(self, filepath:str, parser, encoding:str = "utf-8", errors:str = "strict"):
+        '''
+        @filepath   文件路径\n
+        @parser     行解析函数，传入按逗号拆分的列，返回数据项，返回None则跳过该行\n
+        @encoding   文件编码\n
+        @errors     解码出错时的处理方式，同bytes.decode
+        '''
+        self.file = filepath
+        self.parser = parser
+        self.encoding = encoding
+        self.errors = errors
+        self.items = list()
+        self.generation = 0     #每次重新读取都会加1，用于判断items是否被重置
+        self.reset()
+
+    def reset(self):
+        self.items = list()
+        self.generation += 1
+        self.__offset__ = 0
+        self.__inode__ = None
+        self.__need_header__ = True
+
+    def read(self) -> list:
+        '''
+        读取新追加的数据\n
+        @return 本次新增的数据项，全部数据项在items中
+        '''
+        try:
+            st = os.stat(self.file)
+        except OSError:
+            self.reset()
+            return []
+
+        if st.st_ino != self.__inode__ or st.st_size < self.__offset__:
+            self.reset()
+            self.__inode__ = st.st_ino
+
+        if st.st_size == self.__offset__:
+            return []
+
+        f = open(self.file, "rb")
+        f.seek(self.__offset__)
+        data = f.read(st.st_size - self.__offset__)
+        f.close()
+
+        # 最后一行可能还没写完，只处理到最后一个换行符，剩下的下次再读
+        end = data.rfind(b"\n")
+        if end < 0:
+            return []
+        data = data[:end+1]
+        self.__offset__ += len(data)
+
+        lines = data.decode(self.encoding, self.errors).splitlines()
+        if self.__need_header__:
+            lines = lines[1:]
+            self.__need_header__ = False
+
+        newItems = list()
+        for line in lines:
+            if len(line) == 0:
+                continue
+
+            try:
+                item = self.parser(line.split(","))
+            except (ValueError, IndexError):
+                item = None
+
+            if item is not None:
+                newItems.append(item)
+
+        self.items.extend(newItems)
+        return newItems
+
+def parse_trade(straid:str, cells:list) -> dict:
+    if len(cells) > 10:
+        return None
+
+    tItem = {
+        "strategy":straid,
+        "code": cells[0],
+        "time": int(cells[1]),
+        "direction": cells[2],
+        "offset": cells[3],
+        "price": float(cells[4]),
+        "volume": float(cells[5]),
+        "tag": cells[6],
+        "fee": 0
+    }
+
+    if len(cells) > 7:
+        tItem["fee"] = float(cells[7])
+    return tItem
+
+def parse_fund(straid:str, cells:list) -> dict:
+    if len(cells) > 10:
+        return None
+
+    tItem = {
+        "strategy":straid,
+        "date": int(cells[0]),
+        "closeprofit": float(cells[1]),
+        "dynprofit": float(cells[2]),
+        "dynbalance": float(cells[3]),
+        "fee": 0
+    }
+
+    if len(cells) > 4:
+        tItem["fee"] = float(cells[4])
+    return tItem
+
+def parse_signal(straid:str, cells:list) -> dict:
+    return {
+        "strategy":straid,
+        "code": cells[0],
+        "target": float(cells[1]),
+        "sigprice": float(cells[2]),
+        "gentime": cells[3],
+        "tag": cells[4]
+    }
+
+def parse_round(straid:str, cells:list) -> dict:
+    return {
+        "strategy":straid,
+        "code": cells[0],
+        "direct": cells[1],
+        "opentime": int(cells[2]),
+        "openprice": float(cells[3]),
+        "closetime": int(cells[4]),
+        "closeprice": float(cells[5]),
+        "qty": float(cells[6]),
+        "profit": float(cells[7]),
+        "entertag": cells[9],
+        "exittag": cells[10]
+    }
+
+def parse_channel_order(chnlid:str, cells:list) -> dict:
+    return {
+        "channel":chnlid,
+        "localid":int(cells[0]),
+        "time":int(cells[2]),
+        "code": cells[3],
+        "action": cells[4],
+        "total": float(cells[5]),
+        "traded": float(cells[6]),
+        "price": float(cells[7]),
+        "orderid": cells[8],
+        "canceled": cells[9],
+        "remark": cells[10]
+    }
+
+def parse_channel_trade(chnlid:str, cells:list) -> dict:
+    return {
+        "channel":chnlid,
+        "localid":int(cells[0]),
+        "time":int(cells[2]),
+        "code": cells[3],
+        "action": cells[4],
+        "volume": float(cells[5]),
+        "price": float(cells[6]),
+        "tradeid": cells[7],
+        "orderid": cells[8]
+    }
+
+def parse_group_fund(cells:list) -> dict:
+    return {
+        "date": int(cells[0]),
+        "predynbalance": float(cells[1]),
+        "prebalance": float(cells[2]),
+        "balance": float(cells[3]),
+        "closeprofit": float(cells[4]),
+        "dynprofit": float(cells[5]),
+        "fee": float(cells[6]),
+        "maxdynbalance": float(cells[7]),
+        "maxtime": float(cells[8]),
+        "mindynbalance": float(cells[9]),
+        "mintime": float(cells[10]),
+        "mdmaxbalance": float(cells[11]),
+        "mdmaxdate": float(cells[12]),
+        "mdminbalance": float(cells[13]),
+        "mdmindate": float(cells[14])
+    }
+
 class DataMgr:
 
     def __init__(self, datafile:str="mondata.db", logger:WtLogger=None):
         self.__grp_cache__ = dict()
+        self.__readers__ = dict()   #按文件路径缓存的增量读取器，不随组合缓存一起重置
+        self.__json_cache__ = dict()    #按文件路径缓存的json解析结果，文件签名变化时才重新读取
+        self.__feed_cursors__ = dict()  #变化推送的游标，(组合ID, 文件路径)到上次推送的位置，(组合ID,)标记组合已经推送过
+        self.__io_lock__ = threading.RLock()    #http查询和变化推送会在不同的线程读取同一个文件
         self.__logger__ = logger
 
         self.__db_conn__ = sqlite3.connect(datafile, check_same_thread=False)
@@ -147,56 +407,196 @@ class DataMgr:
             self.__db_conn__.commit()
 
     def __check_cache__(self, grpid, grpInfo):
-        now = datetime.datetime.now()
-        if grpid not in self.__grp_cache__:
-            self.__grp_cache__[grpid] = dict()
-            self.__grp_cache__[grpid]["cachetime"] = None
-        else:
-            cache_time = self.__grp_cache__[grpid]["cachetime"]
-            bNeedReset = False
-            if cache_time is None:
-                bNeedReset = True
-            else:
-                td = now - cache_time
-                if td.total_seconds() >= 60:# 上次缓存时间超过60s，则重新读取
-                    bNeedReset = True
+        '''
+        检查组合缓存\n
+        只有marker.json的修改时间或大小变化(包括组合目录变化)时才重新加载，否则一直使用内存中的数据
+        '''
+        filepath = "./generated/marker.json"
+        filepath = os.path.join(grpInfo["path"], filepath)
+        sig = get_file_sig(filepath)
+        if grpid in self.__grp_cache__:
+            grpCache = self.__grp_cache__[grpid]
+            if grpCache["markerfile"] == filepath and grpCache["markersig"] == sig:
+                return
+
+        grpCache = {
+            "strategies":[],
+            "channels":[],
+            "executers":[],
+            "markerfile":filepath,
+            "markersig":sig
+        }
 
-            if bNeedReset:
-                self.__grp_cache__[grpid] = dict()
-                self.__grp_cache__[grpid]["cachetime"] = None
+        if sig is not None:
+            try:
+                f = open(filepath, "r")
+                content = f.read()
+                f.close()
+                marker = json.loads(content)
+
+                grpCache["strategies"] = marker["marks"]
+                grpCache["channels"] = marker["channels"]
+                if "executers" in marker:
+                    grpCache["executers"] = marker["executers"]
+            except:
+                # 文件可能正在写入，下次签名变化时再重新读取
+                pass
+
+        grpCache["strategies"].sort()
+        grpCache["channels"].sort()
+        grpCache["executers"].sort()
+        self.__grp_cache__[grpid] = grpCache
+
+    def __load_json__(self, filepath:str, builder = None, tag:str = ""):
+        '''
+        读取json文件，按文件路径和标签缓存结果，文件签名不变时直接返回缓存\n
+        @filepath   文件路径\n
+        @builder    对解析后的json做进一步处理的函数，为None则直接缓存json\n
+        @tag        缓存标签，同一个文件使用不同的builder时用于区分\n
+        @return 处理结果，文件不存在或者解析失败则为None
+        '''
+        sig = get_file_sig(filepath)
+        if sig is None:
+            return None
+
+        key = (filepath, tag)
+        with self.__io_lock__:
+            if key in self.__json_cache__ and self.__json_cache__[key][0] == sig:
+                return self.__json_cache__[key][1]
+
+            try:
+                f = open(filepath, "r")
+                content = f.read()
+                f.close()
+                ret = json.loads(content)
+                if builder is not None:
+                    ret = builder(ret)
+            except:
+                ret = None
+
+            self.__json_cache__[key] = (sig, ret)
+            return ret
+
+    def __tail_delta__(self, grpid:str, filepath:str, parser, bInit:bool = False) -> tuple:
+        '''
+        获取csv文件自上次推送以来新增的数据\n
+        组合第一次推送时只记录游标，不返回数据，初始数据由客户端通过http查询\n
+        之后才出现的文件(包括新加入的策略)从空游标开始，文件中的数据全部推送\n
+        @bInit  是否是组合的第一次推送\n
+        @return (是否重置, 数据)，重置时数据为文件的全部数据
+        '''
+        key = (grpid, filepath)
+        items = self.__read_tail__(filepath, parser)
+        if items is None:
+            # 文件还不存在，记录一个空游标，文件生成以后从头推送
+            with self.__io_lock__:
+                self.__feed_cursors__[key] = (None, 0)
+            return False, []
+
+        with self.__io_lock__:
+            reader = self.__readers__[filepath]
+            cursor = self.__feed_cursors__.get(key)
+            self.__feed_cursors__[key] = (reader.generation, len(items))
+
+        if cursor is None:
+            if bInit:
+                return False, []
+            cursor = (None, 0)
+
+        if cursor[0] is not None and cursor[0] != reader.generation:
+            return True, items[:]
+        return False, items[cursor[1]:]
+
+    def __json_delta__(self, grpid:str, filepath:str, builder, tag:str, bInit:bool = False):
+        '''
+        获取json快照的变化，文件没有变化时返回None，否则返回新的快照\n
+        组合第一次推送时只记录游标，不返回数据，之后新出现的快照直接返回\n
+        @bInit  是否是组合的第一次推送
+        '''
+        data = self.__load_json__(filepath, builder, tag)
+        key = (grpid, filepath, tag)
+        with self.__io_lock__:
+            bFirst = key not in self.__feed_cursors__
+            last = self.__feed_cursors__.get(key)
+            self.__feed_cursors__[key] = data
+
+        if (bFirst and bInit) or last is data or data is None:
+            return None
+        return data
+
+    def get_group_changes(self, grpid:str) -> list:
+        '''
+        获取组合自上次调用以来的数据变化，用于主动推送\n
+        包括各策略新增的成交、信号、资金、平仓和持仓快照，以及组合资金和组合持仓快照\n
+        @return 变化列表，每一项包含datatype、reset、data，策略数据还有strategy
+        '''
+        if grpid not in self.__config__["groups"]:
+            return []
 
-        if "strategies" not in self.__grp_cache__[grpid]:
-            filepath = "./generated/marker.json"
+        grpInfo = self.__config__["groups"][grpid]
+        self.__check_cache__(grpid, grpInfo)
+
+        # 组合级别的标记，没有标记说明是订阅以后的第一次推送
+        with self.__io_lock__:
+            bInit = (grpid,) not in self.__feed_cursors__
+            self.__feed_cursors__[(grpid,)] = True
+
+        changes = list()
+        outputs = [
+            ("trades", "trades.csv", parse_trade),
+            ("signals", "signals.csv", parse_signal),
+            ("funds", "funds.csv", parse_fund),
+            ("rounds", "closes.csv", parse_round)
+        ]
+        for straid in self.__grp_cache__[grpid]["strategies"]:
+            for datatype, fname, parser in outputs:
+                filepath = "./generated/outputs/%s/%s" % (straid, fname)
+                filepath = os.path.join(grpInfo["path"], filepath)
+                bReset, items = self.__tail_delta__(grpid, filepath, lambda cells, parser=parser, straid=straid: parser(straid, cells), bInit)
+                if bReset or len(items) > 0:
+                    changes.append({"datatype":datatype, "strategy":straid, "reset":bReset, "data":items})
+
+            filepath = "./generated/stradata/%s.json" % (straid)
             filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                try:
-                    f = open(filepath, "r")
-                    content = f.read()
-                    marker = json.loads(content)
-                    f.close()
-
-                    self.__grp_cache__[grpid] = {
-                        "strategies":marker["marks"],
-                        "channels":marker["channels"]
-                    } 
-
-                    if "executers" in marker:
-                        self.__grp_cache__[grpid]["executers"] = marker["executers"]
-                    else:
-                        self.__grp_cache__[grpid]["executers"] = []
-
-                except:
-                    self.__grp_cache__[grpid] = {
-                        "strategies":[],
-                        "channels":[],
-                        "executers":[]
-                    } 
-            self.__grp_cache__[grpid]["strategies"].sort()
-            self.__grp_cache__[grpid]["channels"].sort()
-            self.__grp_cache__[grpid]["executers"].sort()
-            self.__grp_cache__[grpid]["cachetime"] = now
+            positions = self.__json_delta__(grpid, filepath, lambda json_data, straid=straid: build_stra_positions(straid, json_data), "positions", bInit)
+            if positions is not None:
+                changes.append({"datatype":"positions", "strategy":straid, "reset":True, "data":positions})
+
+        filepath = os.path.join(grpInfo["path"], "./generated/portfolio/funds.csv")
+        bReset, items = self.__tail_delta__(grpid, filepath, parse_group_fund, bInit)
+        if bReset or len(items) > 0:
+            changes.append({"datatype":"grpfunds", "reset":bReset, "data":items})
+
+        filepath = os.path.join(grpInfo["path"], "./generated/portfolio/datas.json")
+        positions = self.__json_delta__(grpid, filepath, build_group_positions, "positions", bInit)
+        if positions is not None:
+            changes.append({"datatype":"grppositions", "reset":True, "data":positions})
+
+        return changes
+
+    def reset_group_feed(self, grpid:str):
+        '''
+        清除组合的推送游标，组合没有订阅者时调用
+        '''
+        with self.__io_lock__:
+            for key in list(self.__feed_cursors__.keys()):
+                if key[0] == grpid:
+                    self.__feed_cursors__.pop(key)
+
+    def __read_tail__(self, filepath:str, parser, encoding:str = "utf-8", errors:str = "strict") -> list:
+        '''
+        增量读取csv文件，返回文件中的全部数据项\n
+        文件不存在时返回None
+        '''
+        with self.__io_lock__:
+            if filepath not in self.__readers__:
+                if not os.path.exists(filepath):
+                    return None
+                self.__readers__[filepath] = CsvTailReader(filepath, parser, encoding, errors)
+
+            reader = self.__readers__[filepath]
+            reader.read()
+            return reader.items
 
     def get_groups(self, tpfilter:str=''):
         ret = []
@@ -403,52 +803,13 @@ class DataMgr:
         if straid not in self.__grp_cache__[grpid]["strategies"]:
             return []
 
-        if "trades" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["trades"] = dict()
-        
-        if straid not in self.__grp_cache__[grpid]["trades"]:
-            filepath = "./generated/outputs/%s/trades.csv" % (straid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["trades"] = list()
-                self.__grp_cache__[grpid]["trades"][straid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["trades"][straid]
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-            if len(cells) > 10:
-                continue
-
-            tItem = {
-                "strategy":straid,
-                "code": cells[0],
-                "time": int(cells[1]),
-                "direction": cells[2],
-                "offset": cells[3],
-                "price": float(cells[4]),
-                "volume": float(cells[5]),
-                "tag": cells[6],
-                "fee": 0
-            }
-
-            if len(cells) > 7:
-                tItem["fee"] = float(cells[7])
+        filepath = "./generated/outputs/%s/trades.csv" % (straid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        items = self.__read_tail__(filepath, lambda cells: parse_trade(straid, cells))
+        if items is None:
+            return []
 
-            trdCache["trades"].append(tItem)
-            trdCache["lastrow"] += 1
-        
-        return trdCache["trades"][-limit:]
+        return items[-limit:]
 
     def get_funds(self, grpid:str, straid:str):
         if grpid not in self.__config__["groups"]:
@@ -460,50 +821,13 @@ class DataMgr:
         if straid not in self.__grp_cache__[grpid]["strategies"]:
             return []
 
-        if "funds" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["funds"] = dict()
-        
-        if straid not in self.__grp_cache__[grpid]["funds"]:
-            filepath = "./generated/outputs/%s/funds.csv" % (straid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["funds"] = list()
-                self.__grp_cache__[grpid]["funds"][straid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["funds"][straid]
-
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-            if len(cells) > 10:
-                continue
-
-            tItem = {
-                "strategy":straid,
-                "date": int(cells[0]),
-                "closeprofit": float(cells[1]),
-                "dynprofit": float(cells[2]),
-                "dynbalance": float(cells[3]),
-                "fee": 0
-            }
-
-            if len(cells) > 4:
-                tItem["fee"] = float(cells[4])
+        filepath = "./generated/outputs/%s/funds.csv" % (straid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        items = self.__read_tail__(filepath, lambda cells: parse_fund(straid, cells))
+        if items is None:
+            return []
 
-            trdCache["funds"].append(tItem)
-            trdCache["lastrow"] += 1
-        
-        return trdCache["funds"]
+        return items
 
     def get_signals(self, grpid:str, straid:str, limit:int = 200):
         if grpid not in self.__config__["groups"]:
@@ -515,45 +839,13 @@ class DataMgr:
         if straid not in self.__grp_cache__[grpid]["strategies"]:
             return []
 
-        if "signals" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["signals"] = dict()
-        
-        if straid not in self.__grp_cache__[grpid]["signals"]:
-            filepath = "./generated/outputs/%s/signals.csv" % (straid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["signals"] = list()
-                self.__grp_cache__[grpid]["signals"][straid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["signals"][straid]
-
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
-                "strategy":straid,
-                "code": cells[0],
-                "target": float(cells[1]),
-                "sigprice": float(cells[2]),
-                "gentime": cells[3],
-                "tag": cells[4]
-            }
-
-            trdCache["signals"].append(tItem)
+        filepath = "./generated/outputs/%s/signals.csv" % (straid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        items = self.__read_tail__(filepath, lambda cells: parse_signal(straid, cells))
+        if items is None:
+            return []
 
-        trdCache["lastrow"] += len(lines)        
-        return trdCache["signals"][-limit:]
+        return items[-limit:]
 
     def get_rounds(self, grpid:str, straid:str, limit:int = 200):
         if grpid not in self.__config__["groups"]:
@@ -565,49 +857,13 @@ class DataMgr:
         if straid not in self.__grp_cache__[grpid]["strategies"]:
             return []
 
-        if "rounds" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["rounds"] = dict()
-        
-        if straid not in self.__grp_cache__[grpid]["rounds"]:
-            filepath = "./generated/outputs/%s/closes.csv" % (straid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["rounds"] = list()
-                self.__grp_cache__[grpid]["rounds"][straid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["rounds"][straid]
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
-                "strategy":straid,
-                "code": cells[0],
-                "direct": cells[1],
-                "opentime": int(cells[2]),
-                "openprice": float(cells[3]),
-                "closetime": int(cells[4]),
-                "closeprice": float(cells[5]),
-                "qty": float(cells[6]),
-                "profit": float(cells[7]),
-                "entertag": cells[9],
-                "exittag": cells[10]
-            }
+        filepath = "./generated/outputs/%s/closes.csv" % (straid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        items = self.__read_tail__(filepath, lambda cells: parse_round(straid, cells))
+        if items is None:
+            return []
 
-            trdCache["rounds"].append(tItem)
-        trdCache["lastrow"] += len(lines)
-        
-        return trdCache["rounds"][-limit:]
+        return items[-limit:]
 
     def get_positions(self, grpid:str, straid:str):
         if grpid not in self.__config__["groups"]:
@@ -620,63 +876,19 @@ class DataMgr:
         if straid != "all":
             if straid not in self.__grp_cache__[grpid]["strategies"]:
                 return []
-            
-            filepath = "./generated/stradata/%s.json" % (straid)
+            straids = [straid]
+        else:
+            straids = self.__grp_cache__[grpid]["strategies"]
+
+        for sid in straids:
+            filepath = "./generated/stradata/%s.json" % (sid)
             filepath = os.path.join(grpInfo["path"], filepath)
             if not os.path.exists(filepath):
                 return []
-            
-            f = open(filepath, "r")
-            try:
-                content = f.read()
-                json_data = json.loads(content)
-
-                positions = json_data["positions"]
-                for pItem in positions:
-                    tag = "volumn" if "volume" not in pItem else "volume"
-                    if pItem[tag] == 0.0:
-                        continue
-
-                    for dItem in pItem["details"]:
-                        dItem["code"] = pItem["code"]
-                        dItem["strategy"] = straid
-                        if "volumn" in dItem:
-                            dItem["volume"] = dItem["volumn"]
-                            dItem.pop("volumn")
-                        ret.append(dItem)
-            except:
-                pass
 
-            f.close()
-        else:
-            for straid in self.__grp_cache__[grpid]["strategies"]:
-                filepath = "./generated/stradata/%s.json" % (straid)
-                filepath = os.path.join(grpInfo["path"], filepath)
-                if not os.path.exists(filepath):
-                    return []
-                
-                f = open(filepath, "r")
-                try:
-                    content = f.read()
-                    json_data = json.loads(content)
-
-                    positions = json_data["positions"]
-                    for pItem in positions:
-                        tag = "volumn" if "volume" not in pItem else "volume"
-                        if pItem[tag] == 0.0:
-                            continue
-
-                        for dItem in pItem["details"]:
-                            dItem["code"] = pItem["code"]
-                            dItem["strategy"] = straid
-                            if "volumn" in dItem:
-                                dItem["volume"] = dItem["volumn"]
-                                dItem.pop("volumn")
-                            ret.append(dItem)
-                except:
-                    pass
-
-                f.close()
+            positions = self.__load_json__(filepath, lambda json_data: build_stra_positions(sid, json_data), "positions")
+            if positions is not None:
+                ret.extend(positions)
         return ret
 
     def get_channel_orders(self, grpid:str, chnlid:str, limit:int = 200):
@@ -689,49 +901,13 @@ class DataMgr:
         if chnlid not in self.__grp_cache__[grpid]["channels"]:
             return []
 
-        if "corders" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["corders"] = dict()
-        
-        if chnlid not in self.__grp_cache__[grpid]["corders"]:
-            filepath = "./generated/traders/%s/orders.csv" % (chnlid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["corders"] = list()
-                self.__grp_cache__[grpid]["corders"][chnlid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["corders"][chnlid]
-
-        f = open(trdCache["file"], "r",encoding="gb2312",errors="ignore")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
-                "channel":chnlid,
-                "localid":int(cells[0]),
-                "time":int(cells[2]),
-                "code": cells[3],
-                "action": cells[4],
-                "total": float(cells[5]),
-                "traded": float(cells[6]),
-                "price": float(cells[7]),
-                "orderid": cells[8],
-                "canceled": cells[9],
-                "remark": cells[10]
-            }
+        filepath = "./generated/traders/%s/orders.csv" % (chnlid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        items = self.__read_tail__(filepath, lambda cells: parse_channel_order(chnlid, cells), encoding="gb2312", errors="ignore")
+        if items is None:
+            return []
 
-            trdCache["corders"].append(tItem)
-        
-        return trdCache["corders"][-limit:]
+        return items[-limit:]
 
     def get_channel_trades(self, grpid:str, chnlid:str, limit:int = 200):
         if grpid not in self.__config__["groups"]:
@@ -743,47 +919,13 @@ class DataMgr:
         if chnlid not in self.__grp_cache__[grpid]["channels"]:
             return []
 
-        if "ctrades" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["ctrades"] = dict()
-        
-        if chnlid not in self.__grp_cache__[grpid]["ctrades"]:
-            filepath = "./generated/traders/%s/trades.csv" % (chnlid)
-            filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                return []
-            else:
-                trdCache = dict()
-                trdCache["file"] = filepath
-                trdCache["lastrow"] = 0
-                trdCache["ctrades"] = list()
-                self.__grp_cache__[grpid]["ctrades"][chnlid] = trdCache
-
-        trdCache = self.__grp_cache__[grpid]["ctrades"][chnlid]
-
-        f = open(trdCache["file"], "r",encoding="gb2312")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
-                "channel":chnlid,
-                "localid":int(cells[0]),
-                "time":int(cells[2]),
-                "code": cells[3],
-                "action": cells[4],
-                "volume": float(cells[5]),
-                "price": float(cells[6]),
-                "tradeid": cells[7],
-                "orderid": cells[8]
-            }
+        filepath = "./generated/traders/%s/trades.csv" % (chnlid)
+        filepath = os.path.join(grpInfo["path"], filepath)
+        items = self.__read_tail__(filepath, lambda cells: parse_channel_trade(chnlid, cells), encoding="gb2312")
+        if items is None:
+            return []
 
-            trdCache["ctrades"].append(tItem)
-        
-        return trdCache["ctrades"][-limit:]
+        return items[-limit:]
 
     def get_channel_positions(self, grpid:str, chnlid:str):
         if self.__config__ is None:
@@ -814,19 +956,9 @@ class DataMgr:
             if not os.path.exists(filepath):
                 return []
             
-            f = open(filepath, "r")
-            try:
-                content = f.read()
-                json_data = json.loads(content)
-
-                positions = json_data["positions"]
-                for pItem in positions:
-                    pItem["channel"] = cid
-                    ret.append(pItem)
-            except:
-                pass
-
-            f.close()
+            positions = self.__load_json__(filepath, lambda json_data: build_channel_positions(cid, json_data), "positions")
+            if positions is not None:
+                ret.extend(positions)
         return ret
 
     def get_channel_funds(self, grpid:str, chnlid:str):
@@ -856,20 +988,9 @@ class DataMgr:
             
             filepath = "./generated/traders/%s/rtdata.json" % (cid)
             filepath = os.path.join(grpInfo["path"], filepath)
-            if not os.path.exists(filepath):
-                continue
-            
-            f = open(filepath, "r")
-            try:
-                content = f.read()
-                json_data = json.loads(content)
-
-                funds = json_data["funds"]
-                ret[cid] = funds
-            except:
-                pass
-
-            f.close()
+            json_data = self.__load_json__(filepath)
+            if json_data is not None and "funds" in json_data:
+                ret[cid] = json_data["funds"]
         print(ret)
         return ret
 
@@ -897,53 +1018,13 @@ class DataMgr:
         grpInfo = self.__config__["groups"][grpid]
         self.__check_cache__(grpid, grpInfo)
 
-        if "grpfunds" not in self.__grp_cache__[grpid]:
-            self.__grp_cache__[grpid]["grpfunds"] = dict()
-        
         filepath = "./generated/portfolio/funds.csv"
         filepath = os.path.join(grpInfo["path"], filepath)
-        if not os.path.exists(filepath):
+        items = self.__read_tail__(filepath, parse_group_fund)
+        if items is None:
             return []
-        else:
-            trdCache = dict()
-            trdCache["file"] = filepath
-            trdCache["lastrow"] = 0
-            trdCache["funds"] = list()
-            self.__grp_cache__[grpid]["grpfunds"]["cache"] = trdCache
 
-        trdCache = self.__grp_cache__[grpid]["grpfunds"]['cache']
-
-        f = open(trdCache["file"], "r")
-        last_row = trdCache["lastrow"]
-        lines = f.readlines()
-        f.close()
-        lines = lines[1+last_row:]
-
-        for line in lines:
-            cells = line.split(",")
-
-            tItem = {
-                "date": int(cells[0]),
-                "predynbalance": float(cells[1]),
-                "prebalance": float(cells[2]),
-                "balance": float(cells[3]),
-                "closeprofit": float(cells[4]),
-                "dynprofit": float(cells[5]),
-                "fee": float(cells[6]),
-                "maxdynbalance": float(cells[7]),
-                "maxtime": float(cells[8]),
-                "mindynbalance": float(cells[9]),
-                "mintime": float(cells[10]),
-                "mdmaxbalance": float(cells[11]),
-                "mdmaxdate": float(cells[12]),
-                "mdminbalance": float(cells[13]),
-                "mdmindate": float(cells[14])
-            }
-
-            trdCache["funds"].append(tItem)
-            trdCache["lastrow"] += 1
-        
-        return trdCache["funds"]
+        return items
 
     def get_group_positions(self, grpid:str):
         if grpid not in self.__config__["groups"]:
@@ -954,28 +1035,10 @@ class DataMgr:
         
         filepath = "./generated/portfolio/datas.json"
         filepath = os.path.join(grpInfo["path"], filepath)
-        if not os.path.exists(filepath):
+        ret = self.__load_json__(filepath, build_group_positions, "positions")
+        if ret is None:
             return []
-        else:
-            ret = list()
-            f = open(filepath, "r")
-            try:
-                content = f.read()
-                json_data = json.loads(content)
-
-                positions = json_data["positions"]
-                for pItem in positions:
-                    if pItem["volume"] == 0:
-                        continue
-
-                    for dItem in pItem["details"]:
-                        dItem["code"] = pItem["code"]
-                        ret.append(dItem)
-            except:
-                pass
-
-            f.close()
-            return ret
+        return ret
 
     def get_group_performances(self, grpid:str):
         if grpid not in self.__config__["groups"]:
@@ -986,40 +1049,10 @@ class DataMgr:
         
         filepath = "./generated/portfolio/datas.json" 
         filepath = os.path.join(grpInfo["path"], filepath)
-        if not os.path.exists(filepath):
+        perf = self.__load_json__(filepath, build_group_performances, "performances")
+        if perf is None:
             return {}
-        else:
-            perf = dict()
-            f = open(filepath, "r")
-            try:
-                content = f.read()
-                json_data = json.loads(content)
-
-                positions = json_data["positions"]
-                for pItem in positions:
-                    code = pItem['code']
-                    ay = code.split(".")
-                    pid = code
-                    if len(ay) > 2:
-                        if ay[1] not in ['IDX','STK','ETF']:
-                            pid = ay[0] + "." + ay[1]
-                        else:
-                            pid = ay[0] + "." + ay[2]
-
-                    if pid not in perf:
-                        perf[pid] = {
-                            'closeprofit':0,
-                            'dynprofit':0
-                        }
-
-                    perf[pid]['closeprofit'] += pItem['closeprofit']
-                    perf[pid]['dynprofit'] += pItem['dynprofit']
-                    
-            except:
-                pass
-
-            f.close()
-            return perf
+        return perf
 
     def get_group_filters(self, grpid:str):
         if grpid not in self.__config__["groups"]:
@@ -0,0 +1,187 @@
+import math
+
+class RunningStd:
+    '''
+    在线计算样本标准差(Welford算法)，和pandas的std(ddof=1)一致
+    '''
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, val:float):
+        self.count += 1
+        delta = val - self.mean
+        self.mean += delta/self.count
+        self.m2 += delta*(val - self.mean)
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2/(self.count-1))
+
+class PerfTracker:
+    '''
+    回测绩效增量统计器\n
+    每收到一条逐日资金或者平仓记录，以O(1)的代价更新绩效指标\n
+    资金指标的口径和WtBtAnalyst的逐日资金分析一致，回测进行中即可得到实时绩效，不需要重新读取文件
+    '''
+    def __init__(self, capital:float, rf:float = 0.02, annual_days:int = 240):
+        '''
+        @capital        初始资金\n
+        @rf             无风险收益率\n
+        @annual_days    年交易日天数
+        '''
+        self.capital = capital
+        self.rf = rf
+        self.annual_days = annual_days
+        self.reset()
+
+    def reset(self):
+        # 资金统计
+        self.__last_date__ = 0
+        self.__days__ = 0
+        self.__win_days__ = 0
+        self.__balance__ = self.capital
+        self.__netval__ = 1.0
+        self.__max_netval__ = 1.0
+        self.__min_netval__ = 1.0
+        self.__max_falldown__ = 0.0
+        self.__max_riseup__ = 0.0
+        self.__returns__ = RunningStd()
+        self.__down_returns__ = RunningStd()
+
+        self.reset_trading()
+
+    def reset_trading(self):
+        '''
+        只重置平仓统计
+        '''
+        self.__trades__ = 0
+        self.__win_trades__ = 0
+        self.__total_profit__ = 0.0
+        self.__streak__ = 0
+        self.__max_win_streak__ = 0
+        self.__max_lose_streak__ = 0
+
+    def on_fund(self, fundInfo:dict) -> bool:
+        '''
+        处理一条逐日资金记录，字段和funds.csv一致\n
+        日期不晚于上一条记录的数据会被忽略\n
+        @fundInfo   资金记录，至少包含date和dynbalance\n
+        @return 是否更新了指标
+        '''
+        curDate = int(fundInfo["date"])
+        if curDate <= self.__last_date__:
+            return False
+        self.__last_date__ = curDate
+
+        preBal = self.__balance__
+        curBal = float(fundInfo["dynbalance"]) + self.capital
+        self.__balance__ = curBal
+        self.__days__ += 1
+        if curBal > preBal:
+            self.__win_days__ += 1
+
+        ret = curBal/preBal - 1 if preBal != 0 else 0.0
+        self.__returns__.update(ret)
+        if ret < 0:
+            self.__down_returns__.update(ret)
+
+        preNV = self.__netval__
+        curNV = curBal/self.capital
+        self.__netval__ = curNV
+        if self.__days__ == 1:
+            # 第一天只作为回撤统计的起点
+            self.__max_netval__ = curNV
+            self.__min_netval__ = curNV
+            return True
+
+        self.__max_netval__ = max(self.__max_netval__, curNV)
+        self.__min_netval__ = min(self.__min_netval__, curNV)
+        if curNV <= preNV:
+            falldown = abs((curNV - self.__max_netval__)/self.__max_netval__)
+            self.__max_falldown__ = max(self.__max_falldown__, falldown)
+        else:
+            riseup = abs((curNV - self.__min_netval__)/self.__min_netval__)
+            self.__max_riseup__ = max(self.__max_riseup__, riseup)
+        return True
+
+    def on_close(self, closeInfo:dict):
+        '''
+        处理一条平仓记录，字段和closes.csv一致\n
+        @closeInfo  平仓记录，至少包含profit
+        '''
+        profit = float(closeInfo["profit"])
+        self.__trades__ += 1
+        self.__total_profit__ += profit
+        if profit > 0:
+            self.__win_trades__ += 1
+            self.__streak__ = self.__streak__ + 1 if self.__streak__ > 0 else 1
+            self.__max_win_streak__ = max(self.__max_win_streak__, self.__streak__)
+        else:
+            self.__streak__ = self.__streak__ - 1 if self.__streak__ < 0 else -1
+            self.__max_lose_streak__ = max(self.__max_lose_streak__, -self.__streak__)
+
+    @property
+    def days(self) -> int:
+        return self.__days__
+
+    @property
+    def summary(self) -> dict:
+        '''
+        资金概要指标，字段和WtBtAnalyst的summary.json一致
+        '''
+        days = self.__days__
+        if days == 0:
+            return {
+                "days": 0,
+                "total_return": 0,
+                "annual_return": 0,
+                "win_rate": 0,
+                "max_falldown": 0,
+                "max_profratio": 0,
+                "std": 0,
+                "down_std": 0,
+                "sharpe_ratio": 0,
+                "sortino_ratio": 0,
+                "calmar_ratio": 0
+            }
+
+        netval = self.__netval__
+        ar = math.pow(netval, self.annual_days/days) - 1 if netval > 0 else -1.0
+        delta = self.__returns__.std*math.pow(self.annual_days, 0.5)
+        down_delta = self.__down_returns__.std*math.pow(self.annual_days, 0.5)
+        mdd = self.__max_falldown__
+
+        return {
+            "days": days,
+            "total_return": (netval-1)*100,
+            "annual_return": ar*100,
+            "win_rate": (self.__win_days__/days)*100,
+            "max_falldown": mdd*100,
+            "max_profratio": self.__max_riseup__*100,
+            "std": delta*100,
+            "down_std": down_delta*100,
+            "sharpe_ratio": (ar-self.rf)/delta if delta != 0.0 else 9999.0,
+            "sortino_ratio": (ar-self.rf)/down_delta if down_delta != 0.0 else 0.0,
+            "calmar_ratio": ar/mdd if mdd != 0.0 else 999999.0
+        }
+
+    @property
+    def trading(self) -> dict:
+        '''
+        平仓统计指标
+        '''
+        trades = self.__trades__
+        return {
+            "trades": trades,
+            "win_trades": self.__win_trades__,
+            "win_rate": (self.__win_trades__/trades)*100 if trades > 0 else 0,
+            "total_profit": self.__total_profit__,
+            "avg_profit": self.__total_profit__/trades if trades > 0 else 0,
+            "cur_streak": self.__streak__,
+            "max_win_streak": self.__max_win_streak__,
+            "max_lose_streak": self.__max_lose_streak__
+        }
@@ -6,10 +6,12 @@ Date: 2021-08-05 18:49:24
 LastEditors: Wesley
 LastEditTime: 2021-08-16 14:01:24
 '''
-from flask_socketio import SocketIO, emit
-from flask import session, sessions
+from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask import session, sessions, request
+import threading
 
 from .WtLogger import WtLogger
+from wtpy.WtWebServer import ConcurrencyLimiter
 
 def get_param(json_data, key:str, type=str, defVal = ""):
     if key not in json_data:
@@ -26,6 +28,12 @@ class PushServer:
         self.dataMgr = dataMgr
         self.logger = logger
 
+        self.__rooms__ = dict()     #组合ID到订阅连接的映射，每个组合一个room
+        self.__sid_group__ = dict() #连接到组合ID的映射
+        self.__lock__ = threading.Lock()
+        self.__feed_started__ = False
+        self.feed_interval = 1
+
         @sockio.on('connect', namespace='/')
         def on_connect():
             # emit('my response', {'data': 'Connected'})
@@ -36,6 +44,7 @@ class PushServer:
 
         @sockio.on('disconnect', namespace='/')
         def on_disconnect():
+            self.__leave_group__(request.sid)
             usrInfo = session.get("userinfo")
             if usrInfo is not None:
                 self.logger.info("%s disconnected" % usrInfo["loginid"])
@@ -47,9 +56,85 @@ class PushServer:
                 emit('setgroup', {"result":-2, "message":"组合ID不能为空"})
             else:
                 session["groupid"] = groupid
-                
+                self.__join_group__(request.sid, groupid)
+
+
+    def __join_group__(self, sid:str, groupid:str):
+        '''
+        连接加入组合的room，之前订阅的组合会先退出
+        '''
+        self.__leave_group__(sid)
+        join_room(groupid)
+        with self.__lock__:
+            self.__sid_group__[sid] = groupid
+            if groupid not in self.__rooms__:
+                self.__rooms__[groupid] = set()
+            self.__rooms__[groupid].add(sid)
+
+    def __leave_group__(self, sid:str):
+        with self.__lock__:
+            if sid not in self.__sid_group__:
+                return
+            groupid = self.__sid_group__.pop(sid)
+            members = self.__rooms__.get(groupid)
+            if members is not None:
+                members.discard(sid)
+                if len(members) == 0:
+                    self.__rooms__.pop(groupid)
+                    # 没有订阅者以后不再跟踪，下次订阅重新从当前位置开始推送
+                    self.dataMgr.reset_group_feed(groupid)
+        try:
+            leave_room(groupid)
+        except:
+            pass
+
+    def __feed_proc__(self):
+        '''
+        变化推送任务\n
+        定时检查有订阅者的组合，只把新增的数据推送到组合的room，多个客户端共享一次文件读取
+        '''
+        while True:
+            self.sockio.sleep(self.feed_interval)
+            with self.__lock__:
+                groups = list(self.__rooms__.keys())
 
-    def run(self, port:int, host:str):
+            for groupid in groups:
+                try:
+                    changes = self.dataMgr.get_group_changes(groupid)
+                except Exception as e:
+                    if self.logger is not None:
+                        self.logger.error("checking changes of group %s failed: %s" % (groupid, e))
+                    continue
+
+                for item in changes:
+                    self.notifyGrpData(groupid, item)
+
+    def start_feed(self, interval:float = 1):
+        '''
+        启动变化推送\n
+        @interval   检查间隔，单位秒
+        '''
+        self.feed_interval = interval
+        if self.__feed_started__:
+            return
+        self.__feed_started__ = True
+        self.sockio.start_background_task(self.__feed_proc__)
+
+    def run(self, port:int, host:str, backend:str = "werkzeug", workers:int = 16, timeout:float = 60, maxPending:int = 64):
+        '''
+        运行服务，由socketio自己的服务运行，每个连接一个线程(或者协程)\n
+        socket.io的长轮询和websocket会一直占用所在的线程，所以不能用固定线程池\n
+        @backend    werkzeug-不限制并发，pooled-限制socket.io以外的请求的并发数，见WtWebServer.ConcurrencyLimiter\n
+        @workers    同时处理的请求数\n
+        @timeout    排队等待的超时时间，单位秒\n
+        @maxPending 允许排队的请求数
+        '''
+        if backend == "pooled":
+            self.app.wsgi_app = ConcurrencyLimiter(self.app.wsgi_app, workers, timeout, maxPending, ["/socket.io"])
+        elif backend != "werkzeug":
+            raise Exception("unsupported serve backend: %s" % (backend))
+
+        self.start_feed(self.feed_interval)
         self.sockio.run(self.app, host, port)
 
     def notifyGrpLog(self, groupid, tag:str, time:int, message):
@@ -59,4 +144,13 @@ class PushServer:
         self.sockio.emit("notify", {"type":"gpevt", "groupid":groupid, "evttype":evttype}, broadcast=True)
 
     def notifyGrpChnlEvt(self, groupid, chnlid, evttype, data):
-        self.sockio.emit("notify", {"type":"chnlevt", "groupid":groupid, "channel":chnlid, "data":data, "evttype":evttype}, broadcast=True)
\ No newline at end of file
+        self.sockio.emit("notify", {"type":"chnlevt", "groupid":groupid, "channel":chnlid, "data":data, "evttype":evttype}, broadcast=True)
+
+    def notifyGrpData(self, groupid, change:dict):
+        '''
+        推送组合数据变化，只推送到订阅了该组合的连接\n
+        @change DataMgr.get_group_changes返回的变化项
+        '''
+        msg = {"type":"gpdata", "groupid":groupid}
+        msg.update(change)
+        self.sockio.emit("notify", msg, room=groupid)
\ No newline at end of file
@@ -18,10 +18,32 @@ import shutil
 import json
 import threading
 import time
+import pandas as pd
 
 from wtpy import WtDtServo
+from wtpy.WtBtOutputs import read_output
 from .WtLogger import WtLogger
 from .EventReceiver import BtEventReceiver, BtEventSink
+from .PerfTracker import PerfTracker
+from .DataMgr import CsvTailReader
+
+def parse_bt_round(cells:list) -> dict:
+    '''
+    解析回测输出的closes.csv中的一行，列顺序和实盘的不同\n
+    code,direct,opentime,openprice,closetime,closeprice,qty,profit,maxprofit,maxloss,totalprofit,entertag,exittag
+    '''
+    return {
+        "code": cells[0],
+        "direct": cells[1],
+        "opentime": int(cells[2]),
+        "openprice": float(cells[3]),
+        "closetime": int(cells[4]),
+        "closeprice": float(cells[5]),
+        "qty": float(cells[6]),
+        "profit": float(cells[7]),
+        "entertag": cells[11],
+        "exittag": cells[12]
+    }
 
 def isWindows():
     if "windows" in platform.system().lower():
@@ -63,7 +85,8 @@ class WtBtTask(BtEventSink):
     '''
     回测任务类
     '''
-    def __init__(self, user:str, straid:str, btid:str, folder:str, logger:WtLogger = None, sink:BtTaskSink = None):
+    def __init__(self, user:str, straid:str, btid:str, folder:str, logger:WtLogger = None, sink:BtTaskSink = None, 
+                capital:float = 0, rf:float = 0.02, annual_days:int = 240):
         self.user = user
         self.straid = straid
         self.btid = btid
@@ -77,6 +100,10 @@ class WtBtTask(BtEventSink):
         self._state = 0
         self._procid = None
         self._evt_receiver = None
+        self._tracker = PerfTracker(capital, rf, annual_days) if capital > 0 else None
+        # 平仓明细没有单独的事件通知，每次收到资金推送时增量读取closes.csv
+        closeFile = os.path.join(folder, "outputs_bt", btid, "closes.csv")
+        self._closes = CsvTailReader(closeFile, parse_bt_round)
 
     def __check__(self):
          while True:
@@ -153,12 +180,48 @@ class WtBtTask(BtEventSink):
 
         return True
 
+    @property
+    def perform(self) -> dict:
+        '''
+        回测进行中的实时绩效，没有初始资金时为None
+        '''
+        if self._tracker is None:
+            return None
+        return self._tracker.summary
+
+    @property
+    def trading(self) -> dict:
+        '''
+        回测进行中的平仓统计，包括胜率和连续盈亏次数，没有初始资金时为None
+        '''
+        if self._tracker is None:
+            return None
+        return self._tracker.trading
+
+    def __feed_closes__(self):
+        if self._tracker is None:
+            return
+
+        generation = self._closes.generation
+        newItems = self._closes.read()
+        if self._closes.generation != generation:
+            # 文件被重写过，平仓统计要从头算
+            self._tracker.reset_trading()
+            newItems = self._closes.items
+
+        for item in newItems:
+            self._tracker.on_close(item)
+
     def on_begin(self):
+        if self._tracker is not None:
+            self._tracker.reset()
+        self._closes.reset()
+
         if self.sink is not None:
             self.sink.on_start(self.user, self.straid, self.btid)
 
     def on_finish(self):
-        pass
+        self.__feed_closes__()
 
     def on_state(self, statInfo:dict):
         if self.sink is not None:
@@ -166,6 +229,10 @@ class WtBtTask(BtEventSink):
         print(statInfo)
 
     def on_fund(self, fundInfo:dict):
+        if self._tracker is not None:
+            self._tracker.on_fund(fundInfo)
+        self.__feed_closes__()
+
         if self.sink is not None:
             self.sink.on_fund(self.user, self.straid, self.btid, fundInfo)
         print(fundInfo)
@@ -386,7 +453,10 @@ class WtBtMon(BtTaskSink):
 
             self.__save_user_data__(user)
 
-    def get_bt_funds(self, user:str, straid:str, btid:str) -> list:
+    def __get_bt_folder__(self, user:str, straid:str, btid:str) -> str:
+        '''
+        获取回测输出目录，回测不存在则返回None
+        '''
         if user not in self.user_bts:
             bSucc = self.__load_user_data__(user)
 
@@ -397,167 +467,93 @@ class WtBtMon(BtTaskSink):
         if btid not in thisBts:
             return None
 
-        filename = "%s/%s/backtests/%s/outputs_bt/%s/funds.csv" % (user, straid, btid, btid)
-        filename = os.path.join(self.path, filename)
-        if not os.path.exists(filename):
-            return None
+        folder = "%s/%s/backtests/%s/outputs_bt/%s/" % (user, straid, btid, btid)
+        return os.path.join(self.path, folder)
 
-        f = open(filename, "r")
-        lines = f.readlines()
-        f.close()
-        lines = lines[1:]
-
-        funds = list()
-        for line in lines:
-            cells = line.split(",")
-            if len(cells) > 10:
-                continue
-
-            tItem = {
-                "date": int(cells[0]),
-                "closeprofit": float(cells[1]),
-                "dynprofit": float(cells[2]),
-                "dynbalance": float(cells[3]),
-                "fee": 0
-            }
+    def get_bt_funds(self, user:str, straid:str, btid:str) -> list:
+        folder = self.__get_bt_folder__(user, straid, btid)
+        if folder is None:
+            return None
 
-            if len(cells) > 4:
-                tItem["fee"] = float(cells[4])
+        df_funds = read_output(folder, "funds")
+        if df_funds is None:
+            return None
 
-            funds.append(tItem)
-        
-        return funds
+        # 按列的位置读取，兼容不同版本的表头
+        ncols = df_funds.shape[1]
+        df_items = pd.DataFrame({
+            "date": df_funds.iloc[:,0].astype(int),
+            "closeprofit": df_funds.iloc[:,1].astype(float),
+            "dynprofit": df_funds.iloc[:,2].astype(float),
+            "dynbalance": df_funds.iloc[:,3].astype(float),
+            "fee": df_funds.iloc[:,4].astype(float) if ncols > 4 else 0.0
+        })
+        return df_items.to_dict("records")
 
     def get_bt_trades(self, user:str, straid:str, btid:str) -> list:
-        if user not in self.user_bts:
-            bSucc = self.__load_user_data__(user)
-
-            if not bSucc:
-                return None
-
-        thisBts = self.user_bts[user]
-        if btid not in thisBts:
+        folder = self.__get_bt_folder__(user, straid, btid)
+        if folder is None:
             return None
 
-        filename = "%s/%s/backtests/%s/outputs_bt/%s/trades.csv" % (user, straid, btid, btid)
-        filename = os.path.join(self.path, filename)
-        if not os.path.exists(filename):
+        df_trades = read_output(folder, "trades")
+        if df_trades is None:
             return None
 
-        f = open(filename, "r")
-        lines = f.readlines()
-        f.close()
-        lines = lines[1:]
-
-        items = list()
-        for line in lines:
-            cells = line.split(",")
-            if len(cells) > 10:
-                continue
-
-            item = {
-                "code": cells[0],
-                "time": int(cells[1]),
-                "direction": cells[2],
-                "offset": cells[3],
-                "price": float(cells[4]),
-                "volume": float(cells[5]),
-                "tag": cells[6],
-                "fee": 0
-            }
-
-            if len(cells) > 7:
-                item["fee"] = float(cells[7])
-
-            if len(cells) > 4:
-                item["fee"] = float(cells[4])
-
-            items.append(item)
-        
-        return items
+        ncols = df_trades.shape[1]
+        df_items = pd.DataFrame({
+            "code": df_trades.iloc[:,0].astype(str),
+            "time": df_trades.iloc[:,1].astype(int),
+            "direction": df_trades.iloc[:,2].astype(str),
+            "offset": df_trades.iloc[:,3].astype(str),
+            "price": df_trades.iloc[:,4].astype(float),
+            "volume": df_trades.iloc[:,5].astype(float),
+            "tag": df_trades.iloc[:,6].fillna("").astype(str),
+            "fee": df_trades.iloc[:,7].astype(float) if ncols > 7 else 0.0
+        })
+        return df_items.to_dict("records")
 
     def get_bt_rounds(self, user:str, straid:str, btid:str) -> list:
-        if user not in self.user_bts:
-            bSucc = self.__load_user_data__(user)
-
-            if not bSucc:
-                return None
-
-        thisBts = self.user_bts[user]
-        if btid not in thisBts:
+        folder = self.__get_bt_folder__(user, straid, btid)
+        if folder is None:
             return None
 
-        filename = "%s/%s/backtests/%s/outputs_bt/%s/closes.csv" % (user, straid, btid, btid)
-        filename = os.path.join(self.path, filename)
-        if not os.path.exists(filename):
+        df_closes = read_output(folder, "closes")
+        if df_closes is None:
             return None
 
-        f = open(filename, "r")
-        lines = f.readlines()
-        f.close()
-        lines = lines[1:]
-
-        items = list()
-        for line in lines:
-            cells = line.split(",")
-
-            item = {
-                "code": cells[0],
-                "direct": cells[1],
-                "opentime": int(cells[2]),
-                "openprice": float(cells[3]),
-                "closetime": int(cells[4]),
-                "closeprice": float(cells[5]),
-                "qty": float(cells[6]),
-                "profit": float(cells[7]),
-                "maxprofit": float(cells[8]),
-                "maxloss": float(cells[9]),
-                "entertag": cells[11],
-                "exittag": cells[12]
-            }
-
-            items.append(item)
-        
-        return items
+        df_items = pd.DataFrame({
+            "code": df_closes.iloc[:,0].astype(str),
+            "direct": df_closes.iloc[:,1].astype(str),
+            "opentime": df_closes.iloc[:,2].astype(int),
+            "openprice": df_closes.iloc[:,3].astype(float),
+            "closetime": df_closes.iloc[:,4].astype(int),
+            "closeprice": df_closes.iloc[:,5].astype(float),
+            "qty": df_closes.iloc[:,6].astype(float),
+            "profit": df_closes.iloc[:,7].astype(float),
+            "maxprofit": df_closes.iloc[:,8].astype(float),
+            "maxloss": df_closes.iloc[:,9].astype(float),
+            "entertag": df_closes.iloc[:,11].fillna("").astype(str),
+            "exittag": df_closes.iloc[:,12].fillna("").astype(str)
+        })
+        return df_items.to_dict("records")
 
     def get_bt_signals(self, user:str, straid:str, btid:str) -> list:
-        if user not in self.user_bts:
-            bSucc = self.__load_user_data__(user)
-
-            if not bSucc:
-                return None
-
-        thisBts = self.user_bts[user]
-        if btid not in thisBts:
+        folder = self.__get_bt_folder__(user, straid, btid)
+        if folder is None:
             return None
 
-        filename = "%s/%s/backtests/%s/outputs_bt/%s/signals.csv" % (user, straid, btid, btid)
-        filename = os.path.join(self.path, filename)
-        if not os.path.exists(filename):
+        df_signals = read_output(folder, "signals")
+        if df_signals is None:
             return None
 
-        f = open(filename, "r")
-        lines = f.readlines()
-        f.close()
-        lines = lines[1:]
-
-        items = list()
-        for line in lines:
-            cells = line.split(",")
-            if len(cells) > 10:
-                continue
-
-            item = {
-                "code": cells[0],
-                "target": float(cells[1]),
-                "sigprice": float(cells[2]),
-                "gentime": cells[3],
-                "tag": cells[4]
-            }
-
-            items.append(item)
-        
-        return items
+        df_items = pd.DataFrame({
+            "code": df_signals.iloc[:,0].astype(str),
+            "target": df_signals.iloc[:,1].astype(float),
+            "sigprice": df_signals.iloc[:,2].astype(float),
+            "gentime": df_signals.iloc[:,3].astype(str),
+            "tag": df_signals.iloc[:,4].fillna("").astype(str)
+        })
+        return df_items.to_dict("records")
 
     def get_bt_summary(self, user:str, straid:str, btid:str) -> list:
         if user not in self.user_bts:
@@ -684,7 +680,7 @@ class WtBtMon(BtTaskSink):
 
         return thisBts[btid]["kline"]
 
-    def run_backtest(self, user:str, straid:str, fromTime:int, endTime:int, capital:float, slippage:int=0) -> dict:
+    def run_backtest(self, user:str, straid:str, fromTime:int, endTime:int, capital:float, slippage:int=0, rf:float=0.02, annual_days:int=240) -> dict:
         if user not in self.user_bts:
             self.__load_user_data__(user)
 
@@ -737,6 +733,8 @@ class WtBtMon(BtTaskSink):
         content = content.replace("$STRAID$", btid)
         content = content.replace("$CAPITAL$", str(capital))
         content = content.replace("$SLIPPAGE$", str(slippage))
+        content = content.replace("$RF$", str(rf))
+        content = content.replace("$ANNUALDAYS$", str(annual_days))
 
         f = open(new_path, "w", encoding="UTF-8")
         f.write(content)
@@ -745,6 +743,8 @@ class WtBtMon(BtTaskSink):
         btInfo = {
             "id":btid,
             "capital":capital,
+            "rf":rf,
+            "annual_days":annual_days,
             "runtime":datetime.datetime.now().strftime("%Y.%m.%d %H:%M:%S"),
             "state":{
                 "code": "",
@@ -774,7 +774,7 @@ class WtBtMon(BtTaskSink):
         self.__save_user_data__(user)
 
         # 添加
-        btTask = WtBtTask(user, straid, btid, folder, self.logger, sink=self)
+        btTask = WtBtTask(user, straid, btid, folder, self.logger, sink=self, capital=capital, rf=rf, annual_days=annual_days)
         btTask.run()
 
         self.task_map[btid] = btTask
@@ -831,6 +831,14 @@ class WtBtMon(BtTaskSink):
         for btid in task_infos:
             tInfo = task_infos[btid].copy()
             tInfo["logger"] = self.logger
+            user = tInfo["user"]
+            if user not in self.user_bts:
+                self.__load_user_data__(user)
+            if user in self.user_bts and btid in self.user_bts[user]:
+                btInfo = self.user_bts[user][btid]
+                tInfo["capital"] = btInfo["capital"]
+                tInfo["rf"] = btInfo.get("rf", 0.02)
+                tInfo["annual_days"] = btInfo.get("annual_days", 240)
             btTask = WtBtTask(**tInfo)
 
             if btTask.is_running(pids):
@@ -854,4 +862,12 @@ class WtBtMon(BtTaskSink):
         self.user_bts[user][btid]["state"] = statInfo
 
     def on_fund(self, user:str, straid:str, btid:str, fundInfo:dict):
-        pass
\ No newline at end of file
+        # 回测进行中用增量统计的绩效刷新摘要，回测结束后会被summary.json覆盖
+        if btid not in self.task_map:
+            return
+
+        btTask = self.task_map[btid]
+        perform = btTask.perform
+        if perform is not None:
+            self.user_bts[user][btid]["perform"] = perform
+            self.user_bts[user][btid]["trading"] = btTask.trading
\ No newline at end of file
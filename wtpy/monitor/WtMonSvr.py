@@ -8,6 +8,7 @@ import sys
 import base64
 import chardet
 import pytz
+import threading
 
 from .WtLogger import WtLogger
 from .DataMgr import DataMgr, backup_file
@@ -39,22 +40,136 @@ def get_param(json_data, key:str, type=str, defVal = ""):
     else:
         return type(json_data[key])
 
+class LogTailReader:
+    '''
+    日志文件尾部读取器\n
+    从文件末尾按块反向扫描二进制数据，直到找到足够的换行符\n
+    每个文件缓存最近一次读到的尾部数据和偏移，文件追加后只读取新增的部分
+    '''
+    def __init__(self, blocksize:int = 8192):
+        self.blocksize = blocksize
+        self.__cache__ = dict()
+        self.__lock__ = threading.Lock()
+
+    def __scan__(self, f, end:int, N:int) -> int:
+        '''
+        从end往前扫描，返回最后N行的起始偏移
+        '''
+        pos = end
+        count = 0
+        while pos > 0:
+            readsize = min(self.blocksize, pos)
+            pos -= readsize
+            f.seek(pos)
+            block = f.read(readsize)
+            idx = len(block)
+            # end处是换行符，不算一行
+            if pos + readsize == end:
+                idx -= 1
+            while True:
+                idx = block.rfind(b"\n", 0, idx)
+                if idx < 0:
+                    break
+                count += 1
+                if count == N:
+                    return pos + idx + 1
+        return 0
+
+    @staticmethod
+    def __last_lines__(data:bytes, N:int) -> int:
+        '''
+        返回data中最后N行的起始位置，data以换行符结尾
+        '''
+        idx = len(data) - 1
+        for i in range(N):
+            idx = data.rfind(b"\n", 0, idx)
+            if idx < 0:
+                return 0
+        return idx + 1
+
+    def read(self, filename:str, N:int = 100, encoding:str = "GBK", offset:int = None) -> tuple:
+        '''
+        读取文件最后N行\n
+        只返回完整的行，最后一行如果还没有写完，下次再返回\n
+        @filename   文件名\n
+        @N          行数\n
+        @encoding   文件编码\n
+        @offset     上次返回的偏移，不为None时只返回该偏移之后新增的行(最多N行)，偏移超过文件大小视为文件被截断或者轮换\n
+        @return (内容, 行数, 偏移)，偏移用于下一次增量查询
+        '''
+        st = os.stat(filename)
+        with self.__lock__:
+            f = open(filename, "rb")
+            try:
+                cache = self.__cache__.get(filename)
+                if cache is not None and (cache["ino"] != st.st_ino or st.st_size < cache["end"]):
+                    cache = None
+
+                if cache is not None and st.st_size > cache["end"]:
+                    # 文件有追加，只读取新增的完整行
+                    f.seek(cache["end"])
+                    newdata = f.read(st.st_size - cache["end"])
+                    idx = newdata.rfind(b"\n")
+                    if idx >= 0:
+                        newdata = newdata[:idx+1]
+                        cache["data"] += newdata
+                        cache["end"] += len(newdata)
+
+                if cache is not None and cache["start"] > 0 and cache["data"].count(b"\n") < N:
+                    # 缓存的行数不够，需要重新扫描
+                    cache = None
+
+                if cache is None:
+                    end = st.st_size
+                    if end > 0:
+                        # 定位到最后一个换行符之后
+                        start = max(0, end - self.blocksize)
+                        while True:
+                            f.seek(start)
+                            idx = f.read(end - start).rfind(b"\n")
+                            if idx >= 0:
+                                end = start + idx + 1
+                                break
+                            if start == 0:
+                                end = 0
+                                break
+                            end = start
+                            start = max(0, start - self.blocksize)
+
+                    start = self.__scan__(f, end, N)
+                    f.seek(start)
+                    cache = {
+                        "ino": st.st_ino,
+                        "start": start,
+                        "end": end,
+                        "data": f.read(end - start)
+                    }
+            finally:
+                f.close()
+
+            # 只保留最后N行，避免缓存无限增长
+            idx = self.__last_lines__(cache["data"], N) if len(cache["data"]) > 0 else 0
+            cache["data"] = cache["data"][idx:]
+            cache["start"] += idx
+            self.__cache__[filename] = cache
+
+            data = cache["data"]
+            if offset is not None and cache["start"] <= offset <= cache["end"]:
+                data = data[offset-cache["start"]:]
+
+            content = data.decode(encoding, errors="replace").replace("\r\n", "\n")
+            return content, data.count(b"\n"), cache["end"]
+
+log_reader = LogTailReader()
+
 #获取文件最后N行的函数
-def get_tail(filename, N:int = 100, encoding="GBK") :
-    filesize = os.path.getsize(filename)
-    blocksize = 10240
-    dat_file = open(filename, 'r', encoding=encoding)
-    last_line = ""
-    if filesize > blocksize :
-        maxseekpoint = (filesize // blocksize)
-        dat_file.seek((maxseekpoint-1)*blocksize)
-    elif filesize :
-        dat_file.seek(0, 0)
-    lines =  dat_file.readlines()
-    if lines :
-        last_line = lines[-N:]
-    dat_file.close()
-    return ''.join(last_line), len(last_line)
+def get_tail(filename, N:int = 100, encoding="GBK", offset:int = None) -> tuple:
+    '''
+    获取文件最后N行\n
+    @offset 上次查询返回的偏移，不为None时只返回新增的行\n
+    @return (内容, 行数, 偏移)
+    '''
+    return log_reader.read(filename, N, encoding, offset)
 
 def check_auth():
     usrInfo = session.get("userinfo")
@@ -235,6 +350,12 @@ class WtMonSvr(WatcherSink):
 
         self.__bt_mon__:WtBtMon = None
         self.__dt_servo__:WtDtServo = None
+        self.__serve_opts__ = {
+            "backend": "werkzeug",
+            "workers": 16,
+            "timeout": 60,
+            "maxPending": 64
+        }
 
         # 看门狗模块，主要用于调度各个组合启动关闭
         self._dog = WatchDog(sink=self, db=self.__data_mgr__.get_db(), logger=self.logger)
@@ -854,6 +975,8 @@ class WtMonSvr(WatcherSink):
             endtime = get_param(json_data, "etime", int, defVal=curDt)
             capital = get_param(json_data, "capital", float, defVal=500000)
             slippage = get_param(json_data, "slippage", int, defVal=0)
+            rf = get_param(json_data, "rf", float, defVal=0.02)
+            annual_days = get_param(json_data, "annual_days", int, defVal=240)
             if len(straid) == 0:
                 ret = {
                     "result":-2,
@@ -879,7 +1002,7 @@ class WtMonSvr(WatcherSink):
                         "message":"策略不存在"
                     }
                 else:
-                    btInfo = self.__bt_mon__.run_backtest(user,straid,fromtime,endtime,capital,slippage)
+                    btInfo = self.__bt_mon__.run_backtest(user,straid,fromtime,endtime,capital,slippage,rf,annual_days)
                     ret = {
                         "result":0,
                         "message":"OK",
@@ -1523,12 +1646,18 @@ class WtMonSvr(WatcherSink):
 
                     targets.sort()
                     filename = os.path.join(logfolder, targets[-1])
-                    content,lines = get_tail(filename, 100)
+                    # 日志文件已经换了，增量偏移失效
+                    offset = get_param(json_data, "offset", int, None)
+                    if get_param(json_data, "file") != targets[-1]:
+                        offset = None
+                    content,lines,offset = get_tail(filename, 100, offset=offset)
                     ret = {
                         "result":0,
                         "message":"Ok",
                         "content":content,
-                        "lines":lines
+                        "lines":lines,
+                        "file":targets[-1],
+                        "offset":offset
                     }
                 except:
                     ret = {
@@ -2009,12 +2138,14 @@ class WtMonSvr(WatcherSink):
                 return pack_rsp(adminInfo)
             
             filename = os.getcwd() + "/logs/WtMonSvr.log"
-            content,lines = get_tail(filename, 100, "UTF-8")
+            offset = get_param(json_data, "offset", int, None)
+            content,lines,offset = get_tail(filename, 100, "UTF-8", offset)
             ret = {
                 "result":0,
                 "message":"Ok",
                 "content":content,
-                "lines":lines
+                "lines":lines,
+                "offset":offset
             }
 
             return pack_rsp(ret)
@@ -2213,9 +2344,25 @@ class WtMonSvr(WatcherSink):
             return pack_rsp(ret)
             
     
+    def setServeOptions(self, backend:str = "werkzeug", workers:int = 16, timeout:float = 60, maxPending:int = 64):
+        '''
+        设置web服务的运行后端，在run之前调用\n
+        推送服务的socket.io连接会一直占用线程，所以始终是每个连接一个线程\n
+        @backend    werkzeug-不限制并发，pooled-限制socket.io以外的请求的并发数\n
+        @workers    同时处理的请求数\n
+        @timeout    排队等待的超时时间，单位秒\n
+        @maxPending 允许排队的请求数
+        '''
+        self.__serve_opts__ = {
+            "backend": backend,
+            "workers": workers,
+            "timeout": timeout,
+            "maxPending": maxPending
+        }
+
     def __run_impl__(self, port:int, host:str):
         self._dog.run()
-        self.push_svr.run(port = port, host = host)
+        self.push_svr.run(port = port, host = host, **self.__serve_opts__)
     
     def run(self, port:int = 8080, host="0.0.0.0", bSync:bool = True):
         if bSync:
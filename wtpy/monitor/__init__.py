@@ -9,5 +9,6 @@ LastEditTime: 2021-08-16 17:29:42
 from .WtMonSvr import WtMonSvr
 from .WtBtMon import WtBtMon
 from .WtLogger import WtLogger
+from .PerfTracker import PerfTracker
 
-__all__ = ["WtMonSvr","WtBtMon","WtLogger"]
\ No newline at end of file
+__all__ = ["WtMonSvr","WtBtMon","WtLogger","PerfTracker"]
\ No newline at end of file
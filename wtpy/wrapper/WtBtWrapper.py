@@ -5,9 +5,15 @@ from wtpy.WtCoreDefs import CB_HFTSTRA_ORDQUE, CB_HFTSTRA_ORDDTL, CB_HFTSTRA_TRA
 from wtpy.WtCoreDefs import CHNL_EVENT_READY, CHNL_EVENT_LOST, CB_ENGINE_EVENT
 from wtpy.WtCoreDefs import EVENT_ENGINE_INIT, EVENT_SESSION_BEGIN, EVENT_SESSION_END, EVENT_ENGINE_SCHDL, EVENT_BACKTEST_END
 from wtpy.WtCoreDefs import WTSTickStruct, WTSBarStruct, WTSOrdQueStruct, WTSOrdDtlStruct, WTSTransStruct
+from wtpy.WtCoreDefs import BAR_DTYPE, KLINE_DTYPE, read_struct_array
+from wtpy.WtCoreDefs import TICK_DTYPE, TRANS_DTYPE, ORDQUE_DTYPE, ORDDTL_DTYPE, to_hft_records
+from wtpy.WtCoreDefs import HFT_TICK_DTYPE, HFT_TRANS_DTYPE, HFT_ORDQUE_DTYPE, HFT_ORDDTL_DTYPE
 from .PlatformHelper import PlatformHelper as ph
 from wtpy.WtUtilDefs import singleton
+from wtpy.WtDataDefs import WtTickData
+import numpy as np
 import os
+import sys
 
 # Python对接C接口的库
 @singleton
@@ -25,6 +31,9 @@ class WtBtWrapper:
     # 构造函数，传入动态库名
     def __init__(self, engine):
         self._engine = engine
+        self._light_tick = False   #是否使用轻量级的tick对象
+        self._str_cache = dict()    #C字符串到python字符串的缓存，避免每次回调都decode
+        self._key_cache = dict()    #(代码,周期)到K线缓存key的映射
         paths = os.path.split(__file__)
         dllname = ph.getModule("WtBtPorter")
         a = (paths[:-1] + (dllname,))
@@ -76,6 +85,37 @@ class WtBtWrapper:
         self.api.set_time_range.argtype = [c_uint64, c_uint64]
         self.api.enable_tick.argtype = [c_bool]
 
+    def __decode__(self, raw:bytes) -> str:
+        '''
+        解码C接口传过来的代码、周期等字符串\n
+        这类字符串取值有限，缓存起来以后每次回调只需要一次dict查找
+        '''
+        ret = self._str_cache.get(raw)
+        if ret is None:
+            ret = sys.intern(bytes.decode(raw))
+            self._str_cache[raw] = ret
+        return ret
+
+    def __bar_key__(self, rawCode:bytes, rawPeriod:bytes) -> tuple:
+        '''
+        获取解码后的代码、周期以及K线缓存的key，结果会缓存起来\n
+        @return (stdCode, period, key)
+        '''
+        ret = self._key_cache.get((rawCode, rawPeriod))
+        if ret is None:
+            stdCode = self.__decode__(rawCode)
+            period = self.__decode__(rawPeriod)
+            ret = (stdCode, period, sys.intern("%s#%s" % (stdCode, period)))
+            self._key_cache[(rawCode, rawPeriod)] = ret
+        return ret
+
+    def enable_light_tick(self, bEnabled:bool = True):
+        '''
+        是否启用轻量级的tick对象\n
+        启用以后on_tick收到的是WtTickData，字段在访问时才解析，不再每笔都构造dict
+        '''
+        self._light_tick = bEnabled
+
     def on_engine_event(self, evtid:int, evtDate:int, evtTime:int):
         engine = self._engine
         if evtid == EVENT_ENGINE_INIT:
@@ -112,6 +152,11 @@ class WtBtWrapper:
         ctx = engine.get_context(id)
 
         realTick = newTick.contents
+        if self._light_tick:
+            if ctx is not None:
+                ctx.on_tick(self.__decode__(stdCode), WtTickData(realTick))
+            return
+
         tick = dict()
         tick["time"] = realTick.action_date * 1000000000 + realTick.action_time
         tick["open"] = realTick.open
@@ -144,7 +189,7 @@ class WtBtWrapper:
                 tick["askqty"].append(realTick.ask_qty[i])
 
         if ctx is not None:
-            ctx.on_tick(bytes.decode(stdCode), tick)
+            ctx.on_tick(self.__decode__(stdCode), tick)
         return
 
     def on_stra_calc(self, id:int, curDate:int, curTime:int):
@@ -162,7 +207,7 @@ class WtBtWrapper:
         return
 
     def on_stra_bar(self, id:int, stdCode:str, period:str, newBar:POINTER(WTSBarStruct)):
-        period = bytes.decode(period)
+        stdCode, period, key = self.__bar_key__(stdCode, period)
         engine = self._engine
         ctx = engine.get_context(id)
         newBar = newBar.contents
@@ -178,7 +223,7 @@ class WtBtWrapper:
         curBar["close"] = newBar.close
         curBar["volume"] = newBar.vol
         if ctx is not None:
-            ctx.on_bar(bytes.decode(stdCode), period, curBar)
+            ctx.on_bar(stdCode, period, curBar, key)
         return
 
 
@@ -193,86 +238,48 @@ class WtBtWrapper:
         '''
         engine = self._engine
         ctx = engine.get_context(id)
-        period = bytes.decode(period)
-
-        bsSize = sizeof(WTSBarStruct)
-        addr = addressof(curBar.contents) # 获取内存地址
-        bars = [None]*count # 预先分配list的长度
-        for i in range(count):
-            realBar = WTSBarStruct.from_address(addr)   # 从内存中直接解析成WTSBarStruct
-            bar = dict()
-            if period[0] == 'd':
-                bar["time"] = realBar.date
-            else:
-                bar["time"] = 1990*100000000 + realBar.time
-            bar["bartime"] = bar["time"]
-            bar["open"] = realBar.open
-            bar["high"] = realBar.high
-            bar["low"] = realBar.low
-            bar["close"] = realBar.close
-            bar["volume"] = realBar.vol
-            bars[i] = bar
-            addr += bsSize
+        period = self.__decode__(period)
+
+        # 整块拷贝C接口传过来的K线数据，再按列向量化转换，避免逐条构造dict
+        rawBars = read_struct_array(addressof(curBar.contents), count, BAR_DTYPE)
+        bars = np.empty(count, dtype=KLINE_DTYPE)
+        if period[0] == 'd':
+            bars["bartime"] = rawBars["date"]
+        else:
+            bars["bartime"] = rawBars["time"].astype(np.int64) + 1990*100000000
+        bars["open"] = rawBars["open"]
+        bars["high"] = rawBars["high"]
+        bars["low"] = rawBars["low"]
+        bars["close"] = rawBars["close"]
+        bars["volume"] = rawBars["vol"]
 
         if ctx is not None:
-            ctx.on_getbars(bytes.decode(stdCode), period, bars, isLast)
+            ctx.on_getbars(self.__decode__(stdCode), period, bars, isLast)
 
     def on_stra_get_tick(self, id:int, stdCode:str, curTick:POINTER(WTSTickStruct), count:int, isLast:bool):
         '''
-        获取Tick回调，该回调函数因为是python主动发起的，需要同步执行，所以不走事件推送
-        @id         策略id
-        @stdCode       合约代码
-        @curTick    最新一笔Tick
+        获取Tick回调，该回调函数因为是python主动发起的，需要同步执行，所以不走事件推送\n
+        @id         策略id\n
+        @stdCode       合约代码\n
+        @curTick    最新一笔Tick\n
         @isLast     是否是最后一条
         '''
-
         engine = self._engine
         ctx = engine.get_context(id)
 
-        tsSize = sizeof(WTSTickStruct)
-        addr = addressof(curTick.contents) # 获取内存地址
-        ticks = [None]*count # 预先分配list的长度
-        for idx in range(count):
-            realTick = WTSTickStruct.from_address(addr)   # 从内存中直接解析成WTSTickStruct
-            tick = dict()
-            tick["time"] = realTick.action_date * 1000000000 + realTick.action_time
-            tick["open"] = realTick.open
-            tick["high"] = realTick.high
-            tick["low"] = realTick.low
-            tick["price"] = realTick.price
-
-            tick["bidprice"] = list()
-            tick["bidqty"] = list()
-            tick["askprice"] = list()
-            tick["askqty"] = list()
-            
-            tick["total_volume"] = realTick.total_volume
-            tick["volume"] = realTick.volume
-            tick["total_turnover"] = realTick.total_turnover
-            tick["turn_over"] = realTick.turn_over
-            tick["open_interest"] = realTick.open_interest
-            tick["diff_interest"] = realTick.diff_interest
-
-            for i in range(10):
-                if realTick.bid_qty[i] != 0:
-                    tick["bidprice"].append(realTick.bid_prices[i])
-                    tick["bidqty"].append(realTick.bid_qty[i])
-
-                if realTick.ask_qty[i] != 0:
-                    tick["askprice"].append(realTick.ask_prices[i])
-                    tick["askqty"].append(realTick.ask_qty[i])
-
-            ticks[idx] = tick
-            addr += tsSize
+        # 直接在C接口传过来的整块内存上按列转换
+        rawTicks = read_struct_array(addressof(curTick.contents), count, TICK_DTYPE, False)
+        ticks = to_hft_records(rawTicks, HFT_TICK_DTYPE)
 
         if ctx is not None:
-            ctx.on_getticks(bytes.decode(stdCode), ticks, isLast)
+            ctx.on_getticks(self.__decode__(stdCode), ticks, isLast)
+        return
 
     def on_stra_get_position(self, id:int, stdCode:str, qty:float, isLast:bool):
         engine = self._engine
         ctx = engine.get_context(id)
         if ctx is not None:
-            ctx.on_getpositions(bytes.decode(stdCode), qty, isLast)
+            ctx.on_getpositions(self.__decode__(stdCode), qty, isLast)
 
     def on_hftstra_channel_evt(self, id:int, trader:str, evtid:int):
         engine = self._engine
@@ -284,21 +291,21 @@ class WtBtWrapper:
             ctx.on_channel_lost()
 
     def on_hftstra_order(self, id:int, localid:int, stdCode:str, isBuy:bool, totalQty:float, leftQty:float, price:float, isCanceled:bool, userTag:str):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         userTag = bytes.decode(userTag)
         engine = self._engine
         ctx = engine.get_context(id)
         ctx.on_order(localid, stdCode, isBuy, totalQty, leftQty, price, isCanceled, userTag)
 
     def on_hftstra_trade(self, id:int, localid:int, stdCode:str, isBuy:bool, qty:float, price:float, userTag:str):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         userTag = bytes.decode(userTag)
         engine = self._engine
         ctx = engine.get_context(id)
         ctx.on_trade(localid, stdCode, isBuy, qty, price, userTag)
 
     def on_hftstra_entrust(self, id:int, localid:int, stdCode:str, bSucc:bool, message:str, userTag:str):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         message = bytes.decode(message, "gbk")
         userTag = bytes.decode(userTag)
         engine = self._engine
@@ -306,7 +313,7 @@ class WtBtWrapper:
         ctx.on_entrust(localid, stdCode, bSucc, message, userTag)
 
     def on_hftstra_order_queue(self, id:int, stdCode:str, newOrdQue:POINTER(WTSOrdQueStruct)):
-        stdCode = bytes.decode(stdCode)
+        stdCode = self.__decode__(stdCode)
         engine = self._engine
         ctx = engine.get_context(id)
         newOrdQue = newOrdQue.contents
@@ -330,30 +337,11 @@ class WtBtWrapper:
     def on_hftstra_get_order_queue(self, id:int, stdCode:str, newOrdQue:POINTER(WTSOrdQueStruct), count:int, isLast:bool):
         engine = self._engine
         ctx = engine.get_context(id)
-        szItem = sizeof(WTSOrdQueStruct)
-        addr = addressof(newOrdQue)
-        item_list = [None]*count
-        for i in range(count):
-            realOrdQue = WTSOrdQueStruct.from_address(addr)
-            curOrdQue = dict()
-            curOrdQue["time"] = realOrdQue.action_date * 1000000000 + realOrdQue.action_time
-            curOrdQue["side"] = realOrdQue.side
-            curOrdQue["price"] = realOrdQue.price
-            curOrdQue["order_items"] = realOrdQue.order_items
-            curOrdQue["qsize"] = realOrdQue.qsize
-            curOrdQue["volumes"] = list()
-
-            for i in range(50):
-                if realOrdQue.volumes[i] == 0:
-                    break
-                else:
-                    curOrdQue["volumes"].append(realOrdQue.volumes[i])
-
-            item_list[i] = curOrdQue
-            addr += szItem
+        rawItems = read_struct_array(addressof(newOrdQue.contents), count, ORDQUE_DTYPE, False)
+        items = to_hft_records(rawItems, HFT_ORDQUE_DTYPE)
             
         if ctx is not None:
-            ctx.on_get_order_queue(bytes.decode(stdCode), item_list, isLast)
+            ctx.on_get_order_queue(self.__decode__(stdCode), items, isLast)
 
     def on_hftstra_order_detail(self, id:int, stdCode:str, newOrdDtl:POINTER(WTSOrdDtlStruct)):
         engine = self._engine
@@ -369,29 +357,16 @@ class WtBtWrapper:
         curOrdDtl["otype"] = newOrdDtl.otype
         
         if ctx is not None:
-            ctx.on_order_detail(stdCode, curOrdDtl)
+            ctx.on_order_detail(self.__decode__(stdCode), curOrdDtl)
 
     def on_hftstra_get_order_detail(self, id:int, stdCode:str, newOrdDtl:POINTER(WTSOrdDtlStruct), count:int, isLast:bool):
         engine = self._engine
         ctx = engine.get_context(id)
-        szItem = sizeof(WTSOrdDtlStruct)
-        addr = addressof(newOrdDtl)
-        item_list = [None]*count
-        for i in range(count):
-            realOrdDtl = WTSOrdDtlStruct.from_address(addr)
-            curOrdDtl = dict()
-            curOrdDtl["time"] = realOrdDtl.action_date * 1000000000 + realOrdDtl.action_time
-            curOrdDtl["index"] = realOrdDtl.index
-            curOrdDtl["side"] = realOrdDtl.side
-            curOrdDtl["price"] = realOrdDtl.price
-            curOrdDtl["volume"] = realOrdDtl.volume
-            curOrdDtl["otype"] = realOrdDtl.otype
-
-            item_list[i] = curOrdDtl
-            addr += szItem
+        rawItems = read_struct_array(addressof(newOrdDtl.contents), count, ORDDTL_DTYPE, False)
+        items = to_hft_records(rawItems, HFT_ORDDTL_DTYPE)
             
         if ctx is not None:
-            ctx.on_get_order_detail(bytes.decode(stdCode), item_list, isLast)
+            ctx.on_get_order_detail(self.__decode__(stdCode), items, isLast)
 
     def on_hftstra_transaction(self, id:int, stdCode:str, newTrans:POINTER(WTSTransStruct)):
         engine = self._engine
@@ -409,30 +384,16 @@ class WtBtWrapper:
         curTrans["bidorder"] = newTrans.bidorder
         
         if ctx is not None:
-            ctx.on_transaction(stdCode, curTrans)
+            ctx.on_transaction(self.__decode__(stdCode), curTrans)
         
     def on_hftstra_get_transaction(self, id:int, stdCode:str, newTrans:POINTER(WTSTransStruct), count:int, isLast:bool):
         engine = self._engine
         ctx = engine.get_context(id)
-        szTrans = sizeof(WTSTransStruct)
-        addr = addressof(newTrans)
-        trans_list = [None]*count
-        for i in range(count):
-            realTrans = WTSTransStruct.from_address(addr)
-            curTrans = dict()
-            curTrans["time"] = realTrans.action_date * 1000000000 + realTrans.action_time
-            curTrans["index"] = realTrans.index
-            curTrans["ttype"] = realTrans.ttype
-            curTrans["side"] = realTrans.side
-            curTrans["price"] = realTrans.price
-            curTrans["volume"] = realTrans.volume
-            curTrans["askorder"] = realTrans.askorder
-            curTrans["bidorder"] = realTrans.bidorder
-            trans_list[i] = curTrans
-            addr += szTrans
+        rawItems = read_struct_array(addressof(newTrans.contents), count, TRANS_DTYPE, False)
+        items = to_hft_records(rawItems, HFT_TRANS_DTYPE)
             
         if ctx is not None:
-            ctx.on_get_transaction(bytes.decode(stdCode), trans_list, isLast)
+            ctx.on_get_transaction(self.__decode__(stdCode), items, isLast)
 
     def write_log(self, level, message:str, catName:str = ""):
         self.api.write_log(level, bytes(message, encoding = "utf8").decode('utf-8').encode('gbk'), bytes(catName, encoding = "utf8"))
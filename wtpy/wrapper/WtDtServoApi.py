@@ -12,6 +12,7 @@ from wtpy.wrapper.PlatformHelper import PlatformHelper as ph
 from wtpy.WtUtilDefs import singleton
 
 import os
+import threading
 
 CB_GET_BAR = CFUNCTYPE(c_void_p,  POINTER(WTSBarStruct), c_uint32, c_bool)
 CB_GET_TICK = CFUNCTYPE(c_void_p,  POINTER(WTSTickStruct), c_uint32, c_bool)
@@ -43,6 +44,9 @@ class WtDtServoApi:
         self.api.get_bars_by_count.argtypes = [c_char_p, c_char_p, c_uint32, c_uint64, CB_GET_BAR]
         self.api.get_ticks_by_count.argtypes = [c_char_p, c_uint32, c_uint64, CB_GET_TICK]
 
+        # 底层数据缓存不是线程安全的，多线程读取时要串行调用
+        self.__lock__ = threading.Lock()
+
     def initialize(self, cfgfile:str, isFile:bool):
         self.api.initialize(bytes(cfgfile, encoding = "utf8"), isFile)
 
@@ -55,10 +59,11 @@ class WtDtServoApi:
         @endTime    结束时间，日线数据格式yyyymmdd，分钟线数据为格式为yyyymmddHHMM，为0则读取到最后一条
         '''
         bar_cache = BarList()
-        if fromTime is not None:
-            ret = self.api.get_bars_by_range(bytes(stdCode, encoding="utf8"), bytes(period,'utf8'), fromTime, endTime, CB_GET_BAR(bar_cache.on_read_bar))
-        else:
-            ret = self.api.get_bars_by_count(bytes(stdCode, encoding="utf8"), bytes(period,'utf8'), dataCount, endTime, CB_GET_BAR(bar_cache.on_read_bar))
+        with self.__lock__:
+            if fromTime is not None:
+                ret = self.api.get_bars_by_range(bytes(stdCode, encoding="utf8"), bytes(period,'utf8'), fromTime, endTime, CB_GET_BAR(bar_cache.on_read_bar))
+            else:
+                ret = self.api.get_bars_by_count(bytes(stdCode, encoding="utf8"), bytes(period,'utf8'), dataCount, endTime, CB_GET_BAR(bar_cache.on_read_bar))
 
         if ret == 0:
             return None
@@ -73,10 +78,11 @@ class WtDtServoApi:
         @endTime    结束时间，格式为yyyymmddHHMM，为0则读取到最后一条
         '''
         tick_cache = TickList()
-        if fromTime is not None:
-            ret = self.api.get_ticks_by_range(bytes(stdCode, encoding="utf8"), fromTime, endTime, CB_GET_TICK(tick_cache.on_read_tick))
-        else:
-            ret = self.api.get_ticks_by_count(bytes(stdCode, encoding="utf8"), dataCount, endTime, CB_GET_TICK(tick_cache.on_read_tick))
+        with self.__lock__:
+            if fromTime is not None:
+                ret = self.api.get_ticks_by_range(bytes(stdCode, encoding="utf8"), fromTime, endTime, CB_GET_TICK(tick_cache.on_read_tick))
+            else:
+                ret = self.api.get_ticks_by_count(bytes(stdCode, encoding="utf8"), dataCount, endTime, CB_GET_TICK(tick_cache.on_read_tick))
 
         if ret == 0:
             return None